@@ -0,0 +1,97 @@
+"""Autosave: frame times while the scenario is saved, synchronously vs on the autosave thread.
+
+Builds a grid network, fills it with cars and runs 60 FPS frames (sim steps,
+then a sleep for the rest of the frame, like clock.tick). A save is requested
+after one second. Reports the main-thread cost of the request, how long the
+file took to write, and the median / 99th percentile / worst frame time over
+the frames from the request until the save finished (at least one second).
+
+    python benchmarks/bench_autosave.py [--size 60] [--cars 500] [--steps 2]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import sim  # noqa: E402
+import config as cfg  # noqa: E402
+import autosave  # noqa: E402
+
+LINK = 200.0
+FRAME = 1 / 60.0
+
+
+def grid_config(size):
+    segs, juncs = [], []
+    for r in range(size):
+        for c in range(size):
+            segs.append({'id': f'h{r}.{c}', 'start': [c * LINK, r * LINK], 'end': [(c + 1) * LINK, r * LINK], 'speed_limit': 13.9})
+            segs.append({'id': f'v{r}.{c}', 'start': [c * LINK, r * LINK], 'end': [c * LINK, (r + 1) * LINK], 'speed_limit': 13.9})
+    for r in range(size):
+        for c in range(size):
+            # each node (r, c+1) / (r+1, c) on a torus: both incoming roads feed both outgoing ones
+            node = ((r + (c + 1) // size) % size, (c + 1) % size)
+            juncs.append({'id': f'j{r}.{c}', 'inputs': [f'h{r}.{c}', f'v{(node[0] - 1) % size}.{node[1]}'],
+                          'outputs': [f'h{node[0]}.{node[1]}', f'v{node[0]}.{node[1]}'], 'mode': 'random'})
+    state = {'segments': segs, 'junctions': juncs, 'seed': 1, 'view': {'zoom': 0.1, 'pan_x': 0, 'pan_y': 0}}
+    return {'current_state': state, 'default_state': state}
+
+
+def run(config, mode, cars, steps, path):
+    sim.reset_clock()
+    sim.build_from_config(config)
+    segs = list(sim.segments)
+    for i in range(cars):
+        sim.spawn_into(segs[i * len(segs) // cars])
+    saver = autosave.AutoSaver(config, path=path)
+    frames, request_ms, save_s = [], 0.0, 0.0
+    start = time.perf_counter()
+    saved_at = None
+    while True:
+        t0 = time.perf_counter()
+        if saved_at is None and t0 - start >= 1.0:
+            saved_at = t0
+            if mode == 'sync':
+                sim.update_config_current_state(config)
+                cfg.save_config(config, path)
+                save_s = time.perf_counter() - t0
+            elif mode == 'background':
+                saver.request()
+                request_ms = saver.last_snapshot_ms
+        for _ in range(steps):
+            sim.step()
+        t1 = time.perf_counter()
+        if saved_at is not None:
+            frames.append((t1 - t0) * 1000.0)
+            if mode == 'background' and not saver.busy():
+                save_s = saver.last_duration
+            if t1 - saved_at >= 1.0 and not saver.busy():
+                break
+        time.sleep(max(0.0, FRAME - (t1 - t0)))
+    frames.sort()
+    return request_ms, save_s, statistics.median(frames), frames[int(len(frames) * 0.99)], frames[-1]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--size', type=int, default=60, help='grid nodes per side (2 segments per node)')
+    ap.add_argument('--cars', type=int, default=500)
+    ap.add_argument('--steps', type=int, default=2, help='sim steps per frame')
+    args = ap.parse_args()
+
+    config = grid_config(args.size)
+    print(f'{2 * args.size ** 2} segments, {args.size ** 2} junctions')
+    print(f'{"mode":<12}{"request ms":>12}{"save s":>9}{"median ms":>11}{"p99 ms":>9}{"max ms":>9}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ('none', 'sync', 'background'):
+            request_ms, save_s, med, p99, worst = run(config, mode, args.cars, args.steps, os.path.join(tmp, 'config.json'))
+            print(f'{mode:<12}{request_ms:>12.1f}{save_s:>9.2f}{med:>11.1f}{p99:>9.1f}{worst:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Emissions: tick time with and without the batched emissions lookup (emissions.py).
+
+Runs the same ring scenario (a mix of petrol cars, diesel trucks and electric
+cars) with the 'emissions' section off and on, for the default segment update
+and for the per-car sim.update_cars loop. Reports ms per tick of both runs and,
+since whole-run timings are noisy on busy machines, also the time spent in
+EmissionsMonitor.on_tick and its share of the tick. The emissions run keeps
+its totals in memory only.
+
+    python benchmarks/bench_emissions.py [--segments 200] [--cars 40] [--ticks 1000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import sim  # noqa: E402
+
+LINK = 500.0
+CLASSES = {'car': {'share': 0.8}, 'truck': {'share': 0.1, 'length': 12.0, 'a_max': 1.0, 'emissions': 'diesel_truck'},
+           'ev': {'share': 0.1, 'emissions': 'electric_car'}}
+
+
+def ring_config(n_segments, emissions):
+    segs, juncs = [], []
+    for i in range(n_segments):
+        segs.append({'id': f's{i}', 'start': [i * LINK, 0], 'end': [(i + 1) * LINK, 0], 'speed_limit': 13.9})
+        juncs.append({'id': f'j{i}', 'inputs': [f's{i}'], 'outputs': [f's{(i + 1) % n_segments}'], 'mode': 'priority'})
+    state = {'segments': segs, 'junctions': juncs, 'seed': 1, 'vehicle_classes': CLASSES}
+    if emissions:
+        state['emissions'] = {'enabled': True, 'path': None}
+    return {'current_state': state}
+
+
+def run(config, cars_per_segment, ticks, python_loop):
+    sim.reset_clock()
+    sim.build_from_config(config)
+    sim.USE_KERNEL = not python_loop
+    spacing = LINK / cars_per_segment
+    for i, seg in enumerate(sim.segments.values()):
+        for k in range(cars_per_segment):
+            car = sim.spawn_into(seg.id)
+            car.pos = k * spacing + (i % 7)
+            car.v = 5.0 + (k % 5)
+    in_monitor = 0.0
+    if sim.emissions is not None:
+        on_tick = sim.emissions.on_tick
+
+        def timed(*args):
+            nonlocal in_monitor
+            t = time.perf_counter()
+            on_tick(*args)
+            in_monitor += time.perf_counter() - t
+        sim.emissions.on_tick = timed
+    t0 = time.perf_counter()
+    for _ in range(ticks):
+        sim.step()
+    elapsed = time.perf_counter() - t0
+    sim.USE_KERNEL = True
+    totals = sim.emissions.totals if sim.emissions is not None else None
+    return elapsed / ticks * 1000, in_monitor / ticks * 1000, totals
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--segments', type=int, default=200)
+    ap.add_argument('--cars', type=int, default=40, help='cars per segment')
+    ap.add_argument('--ticks', type=int, default=1000)
+    args = ap.parse_args()
+
+    print(f'{args.segments * args.cars} cars, {args.ticks} ticks')
+    print(f'{"update":<20}{"off ms/tick":>13}{"on ms/tick":>12}{"on_tick ms":>12}{"share":>8}')
+    for label, python_loop in (('kernel/batched', False), ('update_cars loop', True)):
+        off, _, _ = run(ring_config(args.segments, False), args.cars, args.ticks, python_loop)
+        on, monitor, totals = run(ring_config(args.segments, True), args.cars, args.ticks, python_loop)
+        print(f'{label:<20}{off:>13.2f}{on:>12.2f}{monitor:>12.3f}{monitor / (on - monitor) * 100:>7.1f}%')
+    seconds = args.ticks * sim.STEP
+    print(f'network per hour: {totals[0] * 3600 / seconds:.1f} L fuel, {totals[1] * 3600 / seconds:.1f} kWh, '
+          f'{totals[2] * 3600 / seconds:.1f} kg CO2, {totals[3] * 3600 / seconds:.1f} g NOx')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Gridlock: tick time of a deadlocked ring with and without sleeping blocked segments (gridlock.py).
+
+Fills a ring of segments with more cars than its junctions let through, so
+every segment ends up waiting for the next one. Runs it with the 'gridlock'
+section off, and on with resolution 'none' (detection and sleeping only).
+Reports ms per tick over the whole run and over its last quarter, when the
+ring has locked up, and when the gridlock was reported.
+
+    python benchmarks/bench_gridlock.py [--segments 200] [--cars 13] [--ticks 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import sim  # noqa: E402
+
+LINK = 100.0
+
+
+def ring_config(n_segments, gridlock):
+    segs, juncs = [], []
+    for i in range(n_segments):
+        segs.append({'id': f's{i}', 'start': [i * LINK, 0], 'end': [(i + 1) * LINK, 0], 'speed_limit': 13.9})
+        juncs.append({'id': f'j{i}', 'inputs': [f's{i}'], 'outputs': [f's{(i + 1) % n_segments}'], 'mode': 'priority'})
+    state = {'segments': segs, 'junctions': juncs, 'seed': 1, 'spawn_rate': 0}
+    if gridlock:
+        state['gridlock'] = {'enabled': True, 'path': None, 'resolve': 'none'}
+    return {'current_state': state}
+
+
+def run(config, cars_per_segment, ticks):
+    sim.reset_clock()
+    sim.build_from_config(config)
+    spacing = LINK / cars_per_segment
+    for seg in sim.segments.values():
+        for k in range(cars_per_segment):
+            car = sim.spawn_into(seg.id)
+            car.pos = LINK - 1 - k * spacing
+            car.v = 8.0
+    t0 = time.perf_counter()
+    for i in range(ticks):
+        if i == ticks * 3 // 4:
+            t1 = time.perf_counter()
+        sim.step()
+    end = time.perf_counter()
+    reported = sim.gridlock.recent[0]['time'] if sim.gridlock is not None and sim.gridlock.recent else None
+    return (end - t0) / ticks * 1000, (end - t1) / (ticks - ticks * 3 // 4) * 1000, reported
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--segments', type=int, default=200)
+    ap.add_argument('--cars', type=int, default=13, help='cars per segment')
+    ap.add_argument('--ticks', type=int, default=2000)
+    args = ap.parse_args()
+
+    print(f'{args.segments * args.cars} cars, {args.ticks} ticks')
+    print(f'{"gridlock":<10}{"ms/tick":>10}{"last quarter":>14}{"reported at":>13}')
+    for label, on in (('off', False), ('on', True)):
+        total, last, reported = run(ring_config(args.segments, on), args.cars, args.ticks)
+        print(f'{label:<10}{total:>10.2f}{last:>14.2f}{"" if reported is None else f"{reported:.1f} s":>13}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Compiled kernel vs pure Python: parity check and benchmark.
+
+Runs the same scenario twice from identical starting states, once through
+sim.update_cars and once through the Numba kernel (kernels.update_segment),
+checks that car states agree, and reports ms per tick for both paths.
+
+    python benchmarks/bench_kernel.py [--segments 200] [--cars 40] [--ticks 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import sim  # noqa: E402
+import kernels  # noqa: E402
+
+LINK = 500.0
+
+
+def ring_config(n_segments):
+    segs, juncs = [], []
+    for i in range(n_segments):
+        segs.append({'id': f's{i}', 'start': [i * LINK, 0], 'end': [(i + 1) * LINK, 0], 'speed_limit': 13.9})
+        juncs.append({'id': f'j{i}', 'inputs': [f's{i}'], 'outputs': [f's{(i + 1) % n_segments}'], 'mode': 'priority'})
+    return {'current_state': {'segments': segs, 'junctions': juncs}}
+
+
+def setup(n_segments, cars_per_segment):
+    sim.reset_clock()
+    sim.build_from_config(ring_config(n_segments))
+    spacing = LINK / cars_per_segment
+    for i, seg in enumerate(sim.segments.values()):
+        for k in range(cars_per_segment):
+            car = sim.spawn_into(seg.id)
+            car.pos = k * spacing + (i % 7)   # slightly uneven so waves form
+            car.v = 5.0 + (k % 5)
+
+
+def run(n_segments, cars_per_segment, ticks, use_kernel):
+    setup(n_segments, cars_per_segment)
+    sim.USE_KERNEL = use_kernel
+    t0 = time.perf_counter()
+    for _ in range(ticks):
+        sim.step()
+    elapsed = time.perf_counter() - t0
+    state = {c.id: (c.segment.id, c.pos, c.v, c.risk, c.colliding, c.car_meta)
+             for seg in sim.segments.values() for c in seg.cars}
+    return elapsed, state
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--segments', type=int, default=200)
+    ap.add_argument('--cars', type=int, default=40, help='cars per segment')
+    ap.add_argument('--ticks', type=int, default=2000)
+    args = ap.parse_args()
+
+    py_elapsed, py_state = run(args.segments, args.cars, args.ticks, use_kernel=False)
+    n_cars = len(py_state)
+    print(f' python: {py_elapsed / args.ticks * 1000:.2f} ms/tick ({n_cars} cars)')
+    if not kernels.AVAILABLE:
+        print('kernel: numba not installed, only the Python path was run')
+        return
+
+    # first call compiles, or loads the on-disk cache
+    t0 = time.perf_counter()
+    setup(1, 2)
+    kernels.update_segment(next(iter(sim.segments.values())), sim.STEP, sim.MARGIN, sim.get_leader)
+    print(f' kernel: warm-up {time.perf_counter() - t0:.2f}s (compile or cache load)')
+
+    k_elapsed, k_state = run(args.segments, args.cars, args.ticks, use_kernel=True)
+    print(f' kernel: {k_elapsed / args.ticks * 1000:.2f} ms/tick, speedup {py_elapsed / k_elapsed:.2f}x')
+
+    max_dpos = max_dv = 0.0
+    mismatches = 0
+    for cid, (sid, pos, v, risk, colliding, meta) in py_state.items():
+        k = k_state.get(cid)
+        if k is None or k[0] != sid or k[3] != risk or k[4] != colliding or k[5].keys() != meta.keys():
+            mismatches += 1
+            continue
+        max_dpos = max(max_dpos, abs(k[1] - pos))
+        max_dv = max(max_dv, abs(k[2] - v))
+    ok = mismatches == 0 and len(k_state) == n_cars and max_dpos < 1e-6 and max_dv < 1e-6
+    print(f'parity: {"OK" if ok else "FAILED"} (max |dpos| {max_dpos:.2e} m, max |dv| {max_dv:.2e} m/s, '
+          f'{mismatches} segment/risk/collision/car_meta mismatches)')
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
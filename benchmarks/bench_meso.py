@@ -0,0 +1,95 @@
+"""Hybrid meso/micro benchmark.
+
+Runs the same scenario in full IDM (micro) mode and in hybrid mode, where
+quiet segments are advanced by the meso queue model, and reports the speedup
+and the error of the hybrid run in flow and travel time metrics.
+
+The network is a set of parallel corridors fed by OD demand; every corridor
+has a slow section near its end, so there is a queue upstream of it that
+stays microscopic while the rest of the corridor runs mesoscopically.
+
+    python benchmarks/bench_meso.py [--corridors 10] [--length 40] [--duration 900]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import sim  # noqa: E402
+
+LINK = 200.0
+
+
+def corridors_config(n_corridors, n_links, rate, hybrid):
+    segs, juncs, demand = [], [], []
+    for k in range(n_corridors):
+        y = k * 100.0
+        for i in range(n_links):
+            slow = i == n_links - 3
+            segs.append({'id': f'c{k}_{i}', 'start': [i * LINK, y], 'end': [(i + 1) * LINK, y],
+                         'speed_limit': 6.0 if slow else 13.9})
+        for i in range(n_links - 1):
+            juncs.append({'id': f'j{k}_{i}', 'inputs': [f'c{k}_{i}'], 'outputs': [f'c{k}_{i + 1}'], 'mode': 'priority'})
+        demand.append({'origin': f'c{k}_0', 'destination': f'c{k}_{n_links - 1}', 'rate': rate})
+    return {'current_state': {'segments': segs, 'junctions': juncs, 'demand': demand, 'meso': hybrid}}
+
+
+def run(args, hybrid):
+    sim.reset_clock()
+    sim.build_from_config(corridors_config(args.corridors, args.length, args.rate, hybrid))
+    ticks = int(args.duration / sim.STEP)
+    meso_share = 0
+    t0 = time.perf_counter()
+    for _ in range(ticks):
+        sim.step()
+        if hybrid and sim.sim_tick % 200 == 0:
+            meso_share += sum(1 for s in sim.segments.values() if s.meso)
+    elapsed = time.perf_counter() - t0
+    per_seg = {sid: (s.exits, s.travel_time_total / s.exits if s.exits else 0.0) for sid, s in sim.segments.items()}
+    checks = max(1, ticks // 200)
+    return {
+        'elapsed': elapsed,
+        'ticks': ticks,
+        'arrived': sim.arrived,
+        'trip': sim.arrived_time_total / sim.arrived if sim.arrived else 0.0,
+        'per_seg': per_seg,
+        'meso_share': meso_share / checks / len(sim.segments) if hybrid else 0.0,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--corridors', type=int, default=10)
+    ap.add_argument('--length', type=int, default=40, help='links per corridor')
+    ap.add_argument('--rate', type=float, default=0.1, help='demand per corridor (veh/s)')
+    ap.add_argument('--duration', type=float, default=900.0, help='simulated seconds')
+    args = ap.parse_args()
+
+    micro = run(args, hybrid=False)
+    hybrid = run(args, hybrid=True)
+
+    flow_err, tt_err, n = 0.0, 0.0, 0
+    for sid, (exits, tt) in micro['per_seg'].items():
+        h_exits, h_tt = hybrid['per_seg'][sid]
+        if exits == 0:
+            continue
+        flow_err += abs(h_exits - exits) / exits
+        tt_err += abs(h_tt - tt) / tt if tt > 0 else 0.0
+        n += 1
+    n = max(1, n)
+
+    for name, r in (('micro', micro), ('hybrid', hybrid)):
+        print(f"{name:>7}: {r['ticks']} ticks in {r['elapsed']:.2f}s ({r['elapsed'] / r['ticks'] * 1000:.2f} ms/tick), "
+              f"{r['arrived']} arrived, mean trip {r['trip']:.1f}s")
+    print(f"speedup: {micro['elapsed'] / hybrid['elapsed']:.2f}x "
+          f"(segments in meso mode on average: {hybrid['meso_share'] * 100:.0f}%)")
+    print(f"hybrid vs micro: arrivals {(hybrid['arrived'] - micro['arrived']) / max(1, micro['arrived']) * 100:+.1f}%, "
+          f"mean trip time {(hybrid['trip'] - micro['trip']) / max(1e-9, micro['trip']) * 100:+.1f}%, "
+          f"per-segment flow error {flow_err / n * 100:.1f}%, per-segment travel time error {tt_err / n * 100:.1f}%")
+
+
+if __name__ == '__main__':
+    main()
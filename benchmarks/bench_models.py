@@ -0,0 +1,79 @@
+"""Car-following models: ms per tick of each batched kernel (models.py).
+
+Runs the same ring scenario once per registered model (every car on that
+model), once with the cars split evenly over all models, and once through
+the per-car sim.update_cars loop for reference. Reports ms per tick, us per
+car-tick, mean speed and collisions at the end of each run.
+
+    python benchmarks/bench_models.py [--segments 200] [--cars 40] [--ticks 1000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import sim  # noqa: E402
+import models  # noqa: E402
+
+LINK = 500.0
+
+
+def ring_config(n_segments, car_params=None, vehicle_classes=None):
+    segs, juncs = [], []
+    for i in range(n_segments):
+        segs.append({'id': f's{i}', 'start': [i * LINK, 0], 'end': [(i + 1) * LINK, 0], 'speed_limit': 13.9})
+        juncs.append({'id': f'j{i}', 'inputs': [f's{i}'], 'outputs': [f's{(i + 1) % n_segments}'], 'mode': 'priority'})
+    state = {'segments': segs, 'junctions': juncs, 'seed': 1, 'car_params': car_params or {}}
+    if vehicle_classes:
+        state['vehicle_classes'] = vehicle_classes
+    return {'current_state': state}
+
+
+def run(config, cars_per_segment, ticks, python_loop=False):
+    sim.reset_clock()
+    sim.build_from_config(config)
+    if python_loop:
+        sim.car_models = False
+        sim.USE_KERNEL = False
+    else:
+        # an all-IDM network would otherwise go through kernels.py, not models.py
+        sim.car_models = True
+    spacing = LINK / cars_per_segment
+    for i, seg in enumerate(sim.segments.values()):
+        for k in range(cars_per_segment):
+            car = sim.spawn_into(seg.id)
+            car.pos = k * spacing + (i % 7)   # slightly uneven so waves form
+            car.v = 5.0 + (k % 5)
+    t0 = time.perf_counter()
+    for _ in range(ticks):
+        sim.step()
+    elapsed = time.perf_counter() - t0
+    sim.USE_KERNEL = True
+    sim.car_models = False
+    cars = [c for seg in sim.segments.values() for c in seg.cars]
+    return elapsed, len(cars), sum(c.v for c in cars) / len(cars), sim.collisions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--segments', type=int, default=200)
+    ap.add_argument('--cars', type=int, default=40, help='cars per segment')
+    ap.add_argument('--ticks', type=int, default=1000)
+    args = ap.parse_args()
+
+    share = {name: {'share': 1.0, 'model': name} for name in models.MODELS}
+    runs = [('idm (update_cars loop)', ring_config(args.segments), True)]
+    runs += [(name, ring_config(args.segments, {'model': name}), False) for name in models.MODELS]
+    runs += [('mixed (all models)', ring_config(args.segments, vehicle_classes=share), False)]
+    print(f'{"model":<24}{"ms/tick":>10}{"us/car-tick":>13}{"mean v":>9}{"collisions":>12}')
+    for label, config, python_loop in runs:
+        elapsed, n, mean_v, collisions = run(config, args.cars, args.ticks, python_loop)
+        ms = elapsed / args.ticks * 1000
+        print(f'{label:<24}{ms:>10.2f}{ms * 1000 / n:>13.2f}{mean_v:>9.2f}{collisions:>12}')
+
+
+if __name__ == '__main__':
+    main()
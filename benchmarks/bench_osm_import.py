@@ -0,0 +1,81 @@
+"""OSM import: time to read and convert a synthetic city grid, serial and parallel.
+
+Writes a grid of --size x --size intersections as OSM XML (blocks of about
+100 m with shape nodes, buildings and driveways that the importer must skip),
+then times osm_import.read_network with one and with --jobs processes and
+build_state on the result.
+
+    python benchmarks/bench_osm_import.py [--size 200] [--jobs 4]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import osm_import  # noqa: E402
+
+BLOCK = 100.0 / 111195.0  # degrees of latitude per 100 m
+
+
+def write_grid(path, size, seed=1):
+    rng = random.Random(seed)
+    coords = {}
+    ways = []
+
+    def node(lat, lon):
+        coords[len(coords) + 1] = (lat, lon)
+        return len(coords)
+
+    dlon = BLOCK / 0.61
+    corner = {(r, c): node(52.5 - r * BLOCK, 13.4 + c * dlon) for r in range(size) for c in range(size)}
+    for (r, c), a in corner.items():
+        for (r2, c2), tags in (((r, c + 1), {'highway': 'primary' if r % 5 == 0 else 'residential'}),
+                               ((r + 1, c), {'highway': 'residential', 'oneway': 'yes' if c % 3 == 1 else 'no'})):
+            b = corner.get((r2, c2))
+            if b is None:
+                continue
+            (la, lo), (lb, lob) = coords[a], coords[b]
+            shape = [node(la + (lb - la) * t / 4 + rng.uniform(-1e-7, 1e-7), lo + (lob - lo) * t / 4) for t in (1, 2, 3)]
+            ways.append(([a] + shape + [b], tags))
+        house = [node(coords[a][0] - 0.2 * BLOCK + i * 1e-5, coords[a][1] + 0.2 * dlon) for i in range(4)]
+        ways.append((house + house[:1], {'building': 'yes'}))
+        ways.append(([a, house[0]], {'highway': 'service', 'service': 'driveway'}))
+    with open(path, 'w') as f:
+        f.write("<?xml version='1.0' encoding='UTF-8'?>\n<osm version='0.6'>\n")
+        for i, (lat, lon) in coords.items():
+            f.write(f'  <node id="{i}" version="1" lat="{lat:.7f}" lon="{lon:.7f}"/>\n')
+        for w, (refs, tags) in enumerate(ways, 1):
+            f.write(f'  <way id="{w}" version="1">\n')
+            f.writelines(f'    <nd ref="{r}"/>\n' for r in refs)
+            f.writelines(f'    <tag k="{k}" v="{v}"/>\n' for k, v in tags.items())
+            f.write('  </way>\n')
+        f.write('</osm>\n')
+    return len(coords), len(ways)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--size', type=int, default=200, help='intersections per side')
+    ap.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'grid.osm')
+        nodes, ways = write_grid(path, args.size)
+        print(f'{nodes} nodes, {ways} ways, {os.path.getsize(path) / 1e6:.0f} MB of XML')
+        for jobs in sorted({1, args.jobs}):
+            t0 = time.perf_counter()
+            result = osm_import.read_network(path, jobs, log=lambda *_: None)
+            print(f'read with {jobs} job(s): {time.perf_counter() - t0:.1f} s')
+        t0 = time.perf_counter()
+        state = osm_import.build_state(*result)
+        print(f"build_state: {time.perf_counter() - t0:.1f} s, {len(state['segments'])} segments, "
+              f"{len(state['junctions'])} junctions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Signal corridor benchmark.
+
+Builds a straight corridor of N signalised junctions (each with a side street
+feeding in), coordinated as a green wave, and times the simulation with and
+without the signals.
+
+    python benchmarks/bench_signals.py [--signals 500] [--duration 300]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import sim  # noqa: E402
+
+BLOCK = 150.0        # corridor segment length (m)
+SIDE = 100.0         # side street length (m)
+PROGRESSION = 12.0   # green wave speed (m/s)
+
+
+def corridor_config(n, with_signals=True):
+    segs, juncs = [], []
+    for i in range(n + 1):
+        x = i * BLOCK
+        segs.append({'id': f'main_{i}', 'start': [x, 0], 'end': [x + BLOCK, 0], 'speed_limit': 13.9})
+    for i in range(n):
+        x = (i + 1) * BLOCK
+        segs.append({'id': f'side_{i}', 'start': [x, -SIDE], 'end': [x, 0], 'speed_limit': 8.3})
+        j = {'id': f'sig_{i}', 'inputs': [f'main_{i}', f'side_{i}'], 'outputs': [f'main_{i + 1}'], 'mode': 'priority'}
+        if with_signals:
+            j['signal'] = {'plans': [{
+                'start': 0,
+                'offset': round(x / PROGRESSION, 2),
+                'phases': [
+                    {'green': [f'main_{i}'], 'duration': 30, 'amber': 3},
+                    {'green': [f'side_{i}'], 'duration': 8, 'amber': 3,
+                     'min_green': 6, 'max_green': 20, 'extension': 2, 'detector': 25},
+                ],
+            }]}
+        juncs.append(j)
+    return {'current_state': {'segments': segs, 'junctions': juncs, 'spawn_rate': 0.5}}
+
+
+def run(n, duration, with_signals):
+    sim.reset_clock()
+    sim.build_from_config(corridor_config(n, with_signals))
+    main_in = sim.segments['main_0']
+    ticks = int(duration / sim.STEP)
+    side_every = int(20.0 / sim.STEP)
+    t0 = time.perf_counter()
+    for tick in range(ticks):
+        if tick % 40 == 0 and (not main_in.cars or min(c.pos for c in main_in.cars) > 30):
+            sim.spawn_into('main_0')
+        if tick % side_every == 0:
+            for i in range(tick // side_every % 4, n, 4):
+                side = sim.segments[f'side_{i}']
+                if not side.cars or min(c.pos for c in side.cars) > 30:
+                    sim.spawn_into(f'side_{i}')
+        sim.step()
+    elapsed = time.perf_counter() - t0
+    cars = sum(len(s.cars) for s in sim.segments.values())
+    changes = sum(c.changes for c in sim.signal_system.controllers)
+    return elapsed, ticks, cars, changes
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--signals', type=int, default=500)
+    ap.add_argument('--duration', type=float, default=300.0, help='simulated seconds')
+    args = ap.parse_args()
+
+    for with_signals in (False, True):
+        elapsed, ticks, cars, changes = run(args.signals, args.duration, with_signals)
+        label = f'{args.signals} signals' if with_signals else 'unsignalised'
+        print(f'{label:>14}: {ticks} ticks in {elapsed:.2f}s '
+              f'({ticks / elapsed:.0f} ticks/s, {elapsed / ticks * 1000:.2f} ms/tick), '
+              f'{cars} cars at end, {changes} signal changes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Zoomed-out frame time benchmark: direct drawing vs the tile cache.
+
+Builds square grid networks of increasing size, loads them with `--cars`
+cars per segment, fits each one into a 1280x720 view (well below
+main.TILE_ZOOM) and times drawing the roads directly (render.draw_world
+without cars) against tiles.TileCache plus the congestion grid, after the
+tiles have been rendered once. Every tiled frame also recomputes the
+congestion grid (normally done once every CONGESTION_EVERY seconds), so the
+tiles column is the worst frame; the update alone is reported too.
+
+    python benchmarks/bench_tiles.py [--sizes 1000 10000 40000] [--cars 3] [--frames 30]
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame  # noqa: E402
+
+import render  # noqa: E402
+import sim  # noqa: E402
+import tiles  # noqa: E402
+
+LINK = 200.0
+ROAD_WIDTH = 40
+W, H = 1280, 720
+
+
+def grid_config(n_segments):
+    """Grid of horizontal and vertical links with about `n_segments` segments."""
+    side = max(2, int(math.sqrt(n_segments / 2)))
+    segs = []
+    for r in range(side):
+        for c in range(side):
+            segs.append({'id': f'h{r}_{c}', 'start': [c * LINK, r * LINK], 'end': [(c + 1) * LINK, r * LINK]})
+            segs.append({'id': f'v{r}_{c}', 'start': [c * LINK, r * LINK], 'end': [c * LINK, (r + 1) * LINK]})
+    return {'current_state': {'segments': segs, 'junctions': []}}
+
+
+def time_frames(fn, frames):
+    for _ in range(3):
+        fn()  # warm up (scaled tiles, font caches)
+    t0 = time.perf_counter()
+    for _ in range(frames):
+        fn()
+    return (time.perf_counter() - t0) / frames * 1000.0
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 40000])
+    p.add_argument('--cars', type=int, default=3, help='cars per segment')
+    p.add_argument('--frames', type=int, default=30)
+    args = p.parse_args()
+
+    pygame.init()
+    screen = pygame.Surface((W, H))
+    font = pygame.font.SysFont(None, 20)
+    print(f'{"segments":>9} {"cars":>7} {"zoom":>6} {"direct ms":>10} {"tiles ms":>9} {"congestion ms":>14}')
+    for n in args.sizes:
+        sim.reset_clock()
+        sim.build_from_config(grid_config(n))
+        for i, seg in enumerate(sim.segments.values()):
+            for k in range(args.cars):
+                car = sim.spawn_into(seg.id)
+                car.pos = (k + 0.5) * LINK / args.cars
+                car.v = (i + k) % 14   # a spread of speeds, so cells get different colours
+        sim.step()   # fills the per-segment speed arrays the congestion grid reads
+        n_cars = sum(len(seg.cars) for seg in sim.segments.values())
+        zoom, pan_x, pan_y = render.fit_view(sim.segments, W, H)
+
+        def world_to_screen(pt):
+            return (int(pt[0] * zoom + pan_x), int(pt[1] * zoom + pan_y))
+
+        def direct():
+            screen.fill(tiles.BACKGROUND)
+            render.draw_world(screen, world_to_screen, zoom, font, font, ROAD_WIDTH, sim.CAR_LENGTH,
+                              show_labels=False, show_cars=False)
+
+        cache = tiles.TileCache(ROAD_WIDTH)
+        cache.max_tiles = 10000  # keep the whole view cached for a steady-state number
+        minimap = tiles.Minimap()
+        minimap.update(sim.segments, 0.0)
+
+        # render every visible tile once; the timed frames are the steady state
+        while True:
+            before = cache.rendered
+            cache.draw(screen, sim.segments, zoom, pan_x, pan_y)
+            if cache.rendered == before:
+                break
+
+        grid = minimap.congestion
+        clock = [0.0]
+
+        def congestion():
+            clock[0] += tiles.CONGESTION_EVERY
+            grid.update(sim.segments, clock[0])
+
+        def tiled():
+            screen.fill(tiles.BACKGROUND)
+            cache.draw(screen, sim.segments, zoom, pan_x, pan_y)
+            congestion()
+            grid.draw(screen, world_to_screen((grid.bounds[0], grid.bounds[1])), zoom)
+
+        d = time_frames(direct, args.frames)
+        t = time_frames(tiled, args.frames)
+        c = time_frames(congestion, args.frames)
+        print(f'{len(sim.segments):>9} {n_cars:>7} {zoom:>6.3f} {d:>10.2f} {t:>9.2f} {c:>14.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -6,3 +6,15 @@ python3 src/main.py
 
 # # Run headless (if no display)
 # SDL_VIDEODRIVER=dummy python3 src/main.py
+
+# # Export frames / video headless
+# python3 src/export.py --seconds 600 --every 4 --out frames/
+
+# # Fit IDM parameters to observed flow/speed per segment
+# python3 src/calibrate.py fit --observed counts.csv --out fitted.json
+
+# # Replicate a scenario until the confidence intervals are within 5%
+# python3 src/ensemble.py --seconds 1800 --precision 0.05
+
+# # Import an OpenStreetMap extract as a scenario
+# python3 src/osm_import.py city.osm.pbf --out city.json --demand 20
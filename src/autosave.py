@@ -0,0 +1,130 @@
+import threading
+import time
+
+import config as cfg
+
+# Background saving of the scenario (Ctrl+S, the control command `save` and
+# periodic autosave).
+#
+# Serializing a large network to indented JSON takes seconds, so the main loop
+# only takes a snapshot: a shallow copy of the config plus sim.snapshot_state(),
+# which references immutable segment data and copies the junction lists. A
+# worker thread encodes it, converting the snapshot rows into config entries
+# as they are written, and replaces the file atomically (config.save_config).
+# The encoder pauses every PAUSE_EVERY chunks so the worker never holds the
+# GIL for long and frames stay smooth.
+#
+# When the write succeeds the worker stores the converted network back in the
+# live config (under the lock, next to the view the main thread writes).
+#
+# There is one pending slot: a request made while a save is running replaces
+# any snapshot still waiting, so a burst of requests costs at most one more
+# write, of the newest state. Set "autosave": {"interval": 300} in config.json
+# to also save every 300 s of wall time (0 or missing: only on request).
+
+PAUSE_EVERY = 500   # encoded chunks between pauses of a background save
+
+
+class _Rows(list):
+    """Snapshot rows that iterate (and encode) as config entries, converted one at a time.
+
+    The entries die as soon as they are written instead of piling up as
+    thousands of long-lived containers that trigger full garbage collections
+    on the main thread. Copying or pickling gives a plain list of entries.
+    """
+
+    def __init__(self, items, convert):
+        super().__init__(items)
+        self.convert = convert
+
+    def __iter__(self):
+        return map(self.convert, super().__iter__())
+
+    def __reduce_ex__(self, protocol):
+        return list, (list(self),)
+
+
+def snapshot(config):
+    """Copy of `config` with the live network, safe to serialize while the sim keeps running."""
+    import sim
+    snap = dict(config)
+    state = dict(config.get('current_state', {}))
+    if 'view' in state:
+        state['view'] = dict(state['view'])
+    snap['current_state'] = state
+    return snap, sim.snapshot_state()
+
+
+class AutoSaver:
+    def __init__(self, config, path=None, interval=0.0):
+        self.config = config
+        self.path = path or cfg.CONFIG_PATH
+        self.interval = float(interval or 0.0)
+        self.saves = 0
+        self.coalesced = 0          # requests replaced by a newer one before being written
+        self.failed = 0
+        self.last_duration = 0.0    # seconds the worker spent on the last save
+        self.last_snapshot_ms = 0.0  # main-thread cost of the last request
+        self.last_request = time.monotonic()
+        self._pending = None
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def due(self, now=None):
+        """True when the periodic autosave interval has passed since the last request."""
+        if self.interval <= 0:
+            return False
+        now = time.monotonic() if now is None else now
+        return now - self.last_request >= self.interval
+
+    def request(self):
+        """Snapshot the current state and queue it for writing; returns immediately."""
+        t0 = time.perf_counter()
+        with self._cond:
+            snap = snapshot(self.config)
+            self.last_snapshot_ms = (time.perf_counter() - t0) * 1000.0
+            self.last_request = time.monotonic()
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = snap
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='autosave', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def busy(self):
+        with self._cond:
+            return self._busy or self._pending is not None
+
+    def flush(self, timeout=None):
+        """Wait until queued saves are written (e.g. before exiting). Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._busy and self._pending is None, timeout)
+
+    def _run(self):
+        import sim
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None)
+                (snap, network), self._pending = self._pending, None
+                self._busy = True
+            t0 = time.perf_counter()
+            sim.apply_snapshot(snap['current_state'], network, _Rows)
+            ok = cfg.save_config(snap, self.path, pause_every=PAUSE_EVERY)
+            if ok:
+                # the live config now holds the saved network, as after a synchronous save:
+                # plain entries (the rows reference live segments), stored key by key so
+                # the view the main thread keeps updating stays as it is
+                saved = {key: list(snap['current_state'][key])
+                         for key in ('segments', 'junctions', 'events') if key in snap['current_state']}
+            with self._cond:
+                if ok:
+                    self.config.setdefault('current_state', {}).update(saved)
+                self.last_duration = time.perf_counter() - t0
+                if ok:
+                    print(f"Config saved to {self.path} ({self.last_duration:.2f} s)")
+                self.saves += ok
+                self.failed += not ok
+                self._busy = False
+                self._cond.notify_all()
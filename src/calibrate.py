@@ -0,0 +1,404 @@
+import argparse
+import csv
+import hashlib
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# IDM parameter calibration against observed detector data.
+#
+#   python src/calibrate.py fit --observed counts.csv --out fitted.json
+#   python src/calibrate.py fit --observed counts.csv --per-class --jobs 8
+#   python src/calibrate.py observe --seconds 1800 --out counts.csv
+#
+# The observed CSV has one row per segment and aggregation interval:
+#
+#   time,segment,flow,speed
+#   0,northsouth,720,24.1
+#   60,northsouth,660,22.8
+#
+# `time` is the interval start in seconds after the warm-up, `flow` is in
+# veh/h and `speed` in m/s; either may be left empty. Each candidate
+# parameter vector runs the scenario headless (same seed for every
+# candidate, so they are compared on the same random numbers) and is scored
+# by the sum of squared errors normalised by the mean observed value of each
+# measure. Reported error is sqrt(SSE / observations), the RMSNE.
+#
+# The optimiser is differential evolution (DE/rand/1/bin): a whole
+# generation of trial vectors is evaluated at once on a process pool. A
+# trial only survives if it beats the vector it would replace, and the SSE
+# only grows as a run goes on, so each run is given its parent's SSE and
+# aborted as soon as it exceeds it. Vectors are rounded to a grid before
+# they are evaluated and results are cached by the rounded vector (and on
+# disk with --cache, keyed by scenario, data and settings).
+#
+# With --per-class every class in the scenario's `vehicle_classes` gets its
+# own parameters; otherwise `car_params` is fitted for all cars.
+
+PARAMS = ('a_max', 'b_max', 'v0', 'T', 's0')
+BOUNDS = {
+    'a_max': (0.5, 5.0),   # m/s^2
+    'b_max': (1.0, 8.0),   # m/s^2
+    'v0': (10.0, 45.0),    # m/s
+    'T': (0.5, 3.0),       # s
+    's0': (0.5, 6.0),      # m
+}
+DECIMALS = 3         # grid the vectors are rounded to (cache key)
+SAMPLE_EVERY = 1.0   # s between speed samples on detector segments
+MEASURES = ('flow', 'speed')
+
+_job = None  # per worker process: the settings passed to _init_worker
+
+
+def load_observed(path):
+    """Read an observed CSV into ({(segment, interval start): {'flow': .., 'speed': ..}}, interval)."""
+    observed = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            values = {}
+            for m in MEASURES:
+                v = (row.get(m) or '').strip()
+                if v:
+                    values[m] = float(v)
+            if values:
+                observed[(row['segment'], float(row['time']))] = values
+    starts = sorted({t for _, t in observed})
+    steps = [b - a for a, b in zip(starts, starts[1:]) if b > a]
+    return observed, (min(steps) if steps else 60.0)
+
+
+def write_observed(path, measurements):
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(('time',) + ('segment',) + MEASURES)
+        for (sid, start), values in sorted(measurements.items(), key=lambda kv: (kv[0][1], kv[0][0])):
+            w.writerow([f'{start:g}', sid] + [f'{values[m]:.3f}' for m in MEASURES])
+
+
+def measure_scales(observed):
+    """Mean observed value of each measure, used to normalise its errors."""
+    scales = {}
+    for m in MEASURES:
+        vals = [v[m] for v in observed.values() if m in v]
+        scales[m] = max(1e-6, sum(vals) / len(vals)) if vals else 1.0
+    return scales
+
+
+def param_layout(config, per_class):
+    """[(class name or None, parameter name)] in vector order."""
+    if not per_class:
+        return [(None, p) for p in PARAMS]
+    state = config.get('current_state', config.get('default_state', {}))
+    classes = state.get('vehicle_classes', {})
+    if not classes:
+        raise ValueError("--per-class needs 'vehicle_classes' in the scenario")
+    return [(cls, p) for cls in classes for p in PARAMS]
+
+
+def apply_params(x, layout):
+    import sim
+    for (cls, name), value in zip(layout, x):
+        if cls is None:
+            sim.car_params[name] = value
+        else:
+            sim.vehicle_classes[cls][name] = value
+
+
+def simulate(config, x, layout, detectors, duration, interval, warmup=0.0, seed=0,
+             observed=None, scales=None, abort_above=math.inf):
+    """Run the scenario with parameter vector `x` applied.
+
+    Returns (sse, compared, aborted, measurements). Without `observed` only the
+    measurements {(segment, interval start): {'flow', 'speed'}} are collected.
+    """
+    import sim
+
+    sim.reset_clock()
+    sim.build_from_config(config)
+    sim.seed_streams(seed)
+    apply_params(x, layout)
+    for _ in range(int(round(warmup / sim.STEP))):
+        sim.spawn_default(sim.STEP)
+        sim.step()
+
+    segs = [sim.segments[sid] for sid in detectors]
+    interval_ticks = max(1, int(round(interval / sim.STEP)))
+    sample_ticks = max(1, int(round(SAMPLE_EVERY / sim.STEP)))
+    base_exits = [seg.exits for seg in segs]
+    v_sum = [0.0] * len(segs)
+    v_count = [0] * len(segs)
+    sse = 0.0
+    compared = 0
+    measurements = {}
+    for tick in range(1, int(round(duration / sim.STEP)) + 1):
+        sim.spawn_default(sim.STEP)
+        sim.step()
+        if tick % sample_ticks == 0:
+            for i, seg in enumerate(segs):
+                for car in seg.cars:
+                    v_sum[i] += car.v
+                v_count[i] += len(seg.cars)
+        if tick % interval_ticks:
+            continue
+        start = (tick // interval_ticks - 1) * interval
+        for i, seg in enumerate(segs):
+            values = {
+                'flow': (seg.exits - base_exits[i]) * 3600.0 / interval,
+                # an empty detector reads free-flow speed
+                'speed': v_sum[i] / v_count[i] if v_count[i] else seg.speed_limit,
+            }
+            base_exits[i] = seg.exits
+            v_sum[i] = 0.0
+            v_count[i] = 0
+            if observed is None:
+                measurements[(seg.id, start)] = values
+                continue
+            for m, obs in observed.get((seg.id, start), {}).items():
+                sse += ((values[m] - obs) / scales[m]) ** 2
+                compared += 1
+        if sse > abort_above:
+            return sse, compared, True, measurements
+    return sse, compared, False, measurements
+
+
+def _init_worker(job):
+    global _job
+    _job = job
+
+
+def _evaluate(args):
+    x, abort_above = args
+    sse, _, aborted, _ = simulate(_job['config'], x, _job['layout'], _job['detectors'], _job['duration'],
+                               _job['interval'], _job['warmup'], _job['seed'], _job['observed'],
+                               _job['scales'], abort_above)
+    return sse, aborted
+
+
+class Calibration:
+    """Evaluates parameter vectors on a process pool, with a result cache."""
+
+    def __init__(self, job, jobs=None, cache_path=None):
+        self.job = job
+        self.layout = job['layout']
+        self.lo = [BOUNDS[name][0] for _, name in self.layout]
+        self.hi = [BOUNDS[name][1] for _, name in self.layout]
+        self.cache = {}  # rounded vector -> (sse, aborted)
+        self.evaluations = 0
+        self.cache_hits = 0
+        self.aborted = 0
+        self.observations = sum(len(v) for v in job['observed'].values())
+        self.fingerprint = hashlib.sha1(json.dumps(
+            [job['config'].get('current_state', job['config'].get('default_state', {})),
+             sorted((sid, t, v) for (sid, t), v in job['observed'].items()),
+             job['layout'], job['duration'], job['interval'], job['warmup'], job['seed']],
+            sort_keys=True, default=str).encode()).hexdigest()
+        self.cache_file = None
+        if cache_path:
+            self._load_cache(cache_path)
+            self.cache_file = open(cache_path, 'a')
+        self.pool = ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1, mp_context=mp.get_context('spawn'),
+                                        initializer=_init_worker, initargs=(job,))
+
+    def _load_cache(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if rec.get('fingerprint') == self.fingerprint:
+                    self._remember(tuple(rec['x']), rec['sse'], rec['aborted'])
+
+    def _remember(self, key, sse, aborted):
+        old = self.cache.get(key)
+        # a complete result is exact; of two aborted runs keep the higher lower bound
+        if old is None or (old[1] and (not aborted or sse > old[0])):
+            self.cache[key] = (sse, aborted)
+
+    def snap(self, x):
+        return tuple(round(min(hi, max(lo, v)), DECIMALS) for v, lo, hi in zip(x, self.lo, self.hi))
+
+    def evaluate(self, xs, abort_above=None):
+        """SSE for each vector; runs that exceed their abort_above entry come back as inf."""
+        abort_above = abort_above or [math.inf] * len(xs)
+        results = [None] * len(xs)
+        pending = {}
+        for i, (x, limit) in enumerate(zip(xs, abort_above)):
+            hit = self.cache.get(x)
+            if hit is not None and (not hit[1] or hit[0] > limit):
+                self.cache_hits += 1
+                results[i] = math.inf if hit[1] else hit[0]
+            else:
+                pending.setdefault((x, limit), []).append(i)
+        todo = list(pending)
+        for (x, limit), (sse, aborted) in zip(todo, self.pool.map(_evaluate, todo)):
+            self.evaluations += 1
+            self.aborted += aborted
+            self._remember(x, sse, aborted)
+            if self.cache_file is not None:
+                self.cache_file.write(json.dumps({'fingerprint': self.fingerprint, 'x': x, 'sse': sse,
+                                                  'aborted': aborted}) + '\n')
+            for i in pending[(x, limit)]:
+                results[i] = math.inf if aborted else sse
+        if self.cache_file is not None:
+            self.cache_file.flush()
+        return results
+
+    def rmsne(self, sse):
+        return math.sqrt(sse / max(1, self.observations))
+
+    def close(self):
+        self.pool.shutdown()
+        if self.cache_file is not None:
+            self.cache_file.close()
+
+
+def differential_evolution(cal, population=None, generations=30, F=0.7, CR=0.9, tol=1e-3, patience=5,
+                           seed=0, start=None, log=print):
+    """Minimise the SSE with DE/rand/1/bin; returns (best vector, best SSE)."""
+    rng = random.Random(seed)
+    dim = len(cal.layout)
+    population = population or max(8, 4 * dim)
+    pop = [cal.snap([rng.uniform(lo, hi) for lo, hi in zip(cal.lo, cal.hi)]) for _ in range(population)]
+    if start is not None:
+        pop[0] = cal.snap(start)
+    scores = cal.evaluate(pop)
+    best = min(range(population), key=scores.__getitem__)
+    log(f'gen   0  rmsne {cal.rmsne(scores[best]):.4f}  evals {cal.evaluations}')
+    stale = 0
+    for gen in range(1, generations + 1):
+        trials = []
+        for i in range(population):
+            a, b, c = rng.sample([j for j in range(population) if j != i], 3)
+            forced = rng.randrange(dim)
+            trials.append(cal.snap([pop[a][d] + F * (pop[b][d] - pop[c][d])
+                                    if d == forced or rng.random() < CR else pop[i][d] for d in range(dim)]))
+        trial_scores = cal.evaluate(trials, abort_above=scores)
+        previous = scores[best]
+        for i in range(population):
+            if trial_scores[i] <= scores[i]:
+                pop[i] = trials[i]
+                scores[i] = trial_scores[i]
+        best = min(range(population), key=scores.__getitem__)
+        log(f'gen {gen:>3}  rmsne {cal.rmsne(scores[best]):.4f}  evals {cal.evaluations}  '
+            f'cached {cal.cache_hits}  aborted {cal.aborted}')
+        stale = stale + 1 if previous - scores[best] <= tol * previous else 0
+        if stale >= patience:
+            break
+    return pop[best], scores[best]
+
+
+def fitted_state(x, layout):
+    """The fitted values as a state snippet ('car_params' or 'vehicle_classes')."""
+    out = {}
+    for (cls, name), value in zip(layout, x):
+        if cls is None:
+            out.setdefault('car_params', {})[name] = value
+        else:
+            out.setdefault('vehicle_classes', {}).setdefault(cls, {})[name] = value
+    return out
+
+
+def _defaults(config, layout):
+    import sim
+    sim.build_from_config(config)
+    x = []
+    for cls, name in layout:
+        params = sim.car_params if cls is None else dict(sim.car_params, **sim.vehicle_classes[cls])
+        x.append(params[name])
+    return x
+
+
+def main(argv=None):
+    import config as cfg
+
+    p = argparse.ArgumentParser(description='Fit IDM parameters to observed flow/speed data.')
+    sub = p.add_subparsers(dest='command', required=True)
+    fit = sub.add_parser('fit', help='calibrate against an observed CSV')
+    fit.add_argument('--observed', required=True, help='CSV with time,segment,flow,speed')
+    fit.add_argument('--interval', type=float, default=None, help='aggregation interval in s (default: from the CSV)')
+    fit.add_argument('--per-class', action='store_true', help="fit each of the scenario's vehicle_classes")
+    fit.add_argument('--jobs', type=int, default=None, help='worker processes (default: CPUs)')
+    fit.add_argument('--population', type=int, default=None, help='DE population (default: 4 x parameters)')
+    fit.add_argument('--generations', type=int, default=30)
+    fit.add_argument('--cache', default=None, help='JSON-lines file of evaluated vectors, reused between runs')
+    fit.add_argument('--out', default=None, help='write the fitted state snippet as JSON')
+    obs = sub.add_parser('observe', help='write the scenario\'s own detector data (e.g. for a synthetic test)')
+    obs.add_argument('--seconds', type=float, default=1800.0)
+    obs.add_argument('--interval', type=float, default=60.0)
+    obs.add_argument('--segments', nargs='+', default=None, help='detector segments (default: all)')
+    obs.add_argument('--out', default='observed.csv')
+    for sp in (fit, obs):
+        sp.add_argument('--config', default=None, help='scenario JSON (default: config.json)')
+        sp.add_argument('--warmup', type=float, default=120.0, help='simulated seconds before measuring')
+        sp.add_argument('--seed', type=int, default=0, help='random seed of every simulation run')
+    args = p.parse_args(argv)
+
+    config = cfg.load_config(args.config)
+    if config is None:
+        sys.exit(1)
+    config = cfg.batch_copy(config)
+
+    if args.command == 'observe':
+        import sim
+        sim.build_from_config(config)
+        detectors = args.segments or list(sim.segments)
+        layout = param_layout(config, False)
+        _, _, _, measurements = simulate(config, _defaults(config, layout), layout, detectors, args.seconds,
+                                         args.interval, args.warmup, args.seed)
+        write_observed(args.out, measurements)
+        print(f'{len(measurements)} rows -> {args.out}')
+        return
+
+    observed, interval = load_observed(args.observed)
+    interval = args.interval or interval
+    if not observed:
+        print(f'no observations in {args.observed}')
+        sys.exit(1)
+    import sim
+    sim.build_from_config(config)
+    detectors = sorted({sid for sid, _ in observed})
+    missing = [sid for sid in detectors if sid not in sim.segments]
+    if missing:
+        print(f"segments not in the scenario: {', '.join(missing)}")
+        sys.exit(1)
+    try:
+        layout = param_layout(config, args.per_class)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    duration = max(t for _, t in observed) + interval
+    job = {'config': config, 'layout': layout, 'detectors': detectors, 'duration': duration, 'interval': interval,
+           'warmup': args.warmup, 'seed': args.seed, 'observed': observed, 'scales': measure_scales(observed)}
+
+    t0 = time.perf_counter()
+    cal = Calibration(job, jobs=args.jobs, cache_path=args.cache)
+    try:
+        start = _defaults(config, layout)
+        x, sse = differential_evolution(cal, population=args.population, generations=args.generations,
+                                        seed=args.seed, start=start)
+        default_sse = cal.evaluate([cal.snap(start)])[0]
+    finally:
+        cal.close()
+
+    print(f'{"class":<10} {"param":<6} {"fitted":>8}')
+    for (cls, name), value in zip(layout, x):
+        print(f'{cls or "all":<10} {name:<6} {value:>8.3f}')
+    print(f'rmsne {cal.rmsne(sse):.4f} (scenario values {cal.rmsne(default_sse):.4f}); '
+          f'{cal.evaluations} runs, {cal.cache_hits} cached, {cal.aborted} aborted early, '
+          f'{time.perf_counter() - t0:.1f} s')
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(fitted_state(x, layout), f, indent=2)
+        print(f'fitted parameters -> {args.out}')
+
+
+if __name__ == '__main__':
+    main()
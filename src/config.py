@@ -1,29 +1,70 @@
+import copy
 import json
 import os
+import time
 
 CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.json')
+PAUSE = 0.0005   # seconds a background save_config() sleeps between chunks
 
 
-def load_config():
-    """Load configuration from config.json. Returns None if missing or unreadable."""
-    if not os.path.exists(CONFIG_PATH):
-        print(f"Config file not found at {CONFIG_PATH}")
+def load_config(path=None):
+    """Load configuration from config.json (or `path`). Returns None if missing or unreadable."""
+    path = path or CONFIG_PATH
+    if not os.path.exists(path):
+        print(f"Config file not found at {path}")
         return None
     try:
-        with open(CONFIG_PATH, 'r') as f:
+        with open(path, 'r') as f:
             return json.load(f)
     except Exception as e:
         print(f"Failed to read config file: {e}")
         return None
 
 
-def save_config(cfg):
-    """Write the provided config object back to disk."""
+def save_config(cfg, path=None, pause_every=0):
+    """Write the provided config object back to disk (config.json or `path`).
+
+    The JSON goes to a temporary file that then replaces the old one, so a
+    crash or a concurrent reader never sees a half-written config. With
+    `pause_every`, the writer sleeps briefly every that many encoded chunks so
+    a background thread leaves the GIL to the main loop. Returns True on success.
+    """
+    path = path or CONFIG_PATH
+    tmp = f'{path}.tmp'
     try:
-        with open(CONFIG_PATH, 'w') as f:
-            json.dump(cfg, f, indent=2)
+        with open(tmp, 'w') as f:
+            buf = []
+            for i, chunk in enumerate(json.JSONEncoder(indent=2).iterencode(cfg), 1):
+                buf.append(chunk)
+                if pause_every and i % pause_every == 0:
+                    f.write(''.join(buf))
+                    buf.clear()
+                    time.sleep(PAUSE)
+            f.write(''.join(buf))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return True
     except Exception as e:
         print(f"Failed to save config: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+
+
+def batch_copy(cfg):
+    """Copy of a scenario for repeated headless runs: CSV outputs (safety, jams, emissions, gridlock) are switched off."""
+    cfg = copy.deepcopy(cfg)
+    state = cfg.get('current_state', cfg.get('default_state', {}))
+    state.pop('safety', None)
+    state.pop('jams', None)
+    if 'emissions' in state:
+        state['emissions']['path'] = None  # totals are still kept for the run's metrics
+    if 'gridlock' in state:
+        state['gridlock']['path'] = None  # resolution changes the run, so the monitor stays on
+    return cfg
 
 
 # Load on import (caller can check for None and decide how to proceed)
@@ -0,0 +1,276 @@
+import asyncio
+import json
+import queue
+import threading
+
+# Remote control / telemetry server.
+#
+# Runs an asyncio loop on a background thread and speaks JSON lines over TCP
+# (or a Unix socket when `path` is given). Requests look like
+#   {"id": 1, "cmd": "set_spawn_rate", "rate": 1.5}
+# and are answered with
+#   {"id": 1, "ok": true, "result": ...}
+#
+# Commands that touch the simulation are queued and handed to the sim loop via
+# poll_commands(), which main calls between ticks, so they are always applied
+# at a tick boundary. subscribe/unsubscribe are handled on the server thread.
+#
+# Telemetry is pushed with publish(). Every client has a bounded outgoing
+# queue; when a slow client falls behind the oldest messages are dropped and
+# counted, so the simulation thread never waits on a socket.
+
+TOPICS = ('segments', 'car', 'timing')
+
+
+class _Client:
+    def __init__(self, reader, writer, queue_size):
+        self.reader = reader
+        self.writer = writer
+        self.outbox = asyncio.Queue(maxsize=queue_size)
+        self.subscriptions = {}  # topic -> publish every N ticks
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, line):
+        """Queue a line for sending, dropping the oldest one if the client is behind."""
+        if self.closed:
+            return
+        if self.outbox.full():
+            try:
+                self.outbox.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.outbox.put_nowait(line)
+
+
+class ControlServer:
+    def __init__(self, host='127.0.0.1', port=8765, path=None, queue_size=256, max_pending=1024):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.queue_size = queue_size
+        self.commands = queue.Queue(maxsize=max_pending)
+        self.clients = set()
+        self.loop = None
+        self.thread = None
+        self._server = None
+        self._ready = threading.Event()
+        # topic -> number of clients subscribed; read from the sim thread to
+        # skip building telemetry nobody asked for
+        self._subscribers = {t: 0 for t in TOPICS}
+
+    # --- lifecycle (called from the sim thread) ---
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='control-server', daemon=True)
+        self.thread.start()
+        self._ready.wait(5.0)
+
+    def stop(self):
+        if self.loop is None:
+            return
+        fut = asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        try:
+            fut.result(2.0)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(2.0)
+
+    async def _shutdown(self):
+        self._server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            if self.path:
+                coro = asyncio.start_unix_server(self._handle_client, path=self.path)
+                where = self.path
+            else:
+                coro = asyncio.start_server(self._handle_client, self.host, self.port)
+                where = f'{self.host}:{self.port}'
+            self._server = self.loop.run_until_complete(coro)
+            print(f'Control server listening on {where}')
+        except Exception as e:
+            print(f'Failed to start control server: {e}')
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self._server.close()
+            self.loop.close()
+
+    # --- sim thread API ---
+
+    def poll_commands(self):
+        """Return queued (command, reply) pairs. Call between ticks.
+        reply(result) or reply(error=...) answers the client asynchronously.
+        """
+        out = []
+        while True:
+            try:
+                client, msg = self.commands.get_nowait()
+            except queue.Empty:
+                break
+            out.append((msg, self._make_reply(client, msg.get('id'))))
+        return out
+
+    def wants(self, topic, tick):
+        """True if at least one client is due to receive `topic` at `tick`."""
+        if not self._subscribers.get(topic):
+            return False
+        for c in list(self.clients):
+            every = c.subscriptions.get(topic)
+            if every and tick % every == 0:
+                return True
+        return False
+
+    def publish(self, topic, tick, payload):
+        """Send a telemetry payload to all clients subscribed to `topic` that are due at `tick`.
+        `payload` may be a dict or a zero-arg callable building one (only invoked if needed).
+        """
+        if self.loop is None or not self.wants(topic, tick):
+            return
+        if callable(payload):
+            payload = payload()
+        line = json.dumps({'topic': topic, 'tick': tick, 'data': payload}) + '\n'
+        self.loop.call_soon_threadsafe(self._fanout, topic, tick, line)
+
+    # --- server thread ---
+
+    def _make_reply(self, client, msg_id):
+        def reply(result=None, error=None):
+            msg = {'id': msg_id, 'ok': error is None}
+            if error is None:
+                msg['result'] = result
+            else:
+                msg['error'] = error
+            self._send_threadsafe(client, msg)
+        return reply
+
+    def _send_threadsafe(self, client, msg):
+        line = json.dumps(msg) + '\n'
+        self.loop.call_soon_threadsafe(client.offer, line)
+
+    def _fanout(self, topic, tick, line):
+        for c in self.clients:
+            every = c.subscriptions.get(topic)
+            if every and tick % every == 0:
+                c.offer(line)
+
+    async def _writer(self, client):
+        try:
+            while True:
+                line = await client.outbox.get()
+                client.writer.write(line.encode('utf-8'))
+                await client.writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    async def _handle_client(self, reader, writer):
+        client = _Client(reader, writer, self.queue_size)
+        self.clients.add(client)
+        writer_task = asyncio.ensure_future(self._writer(client))
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                try:
+                    msg = json.loads(raw)
+                    if not isinstance(msg, dict) or 'cmd' not in msg:
+                        raise ValueError('expected an object with a "cmd" field')
+                except ValueError as e:
+                    client.offer(json.dumps({'id': None, 'ok': False, 'error': f'bad request: {e}'}) + '\n')
+                    continue
+                self._dispatch(client, msg)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            client.closed = True
+            for topic in client.subscriptions:
+                self._subscribers[topic] -= 1
+            self.clients.discard(client)
+            writer_task.cancel()
+            try:
+                await asyncio.gather(writer_task, return_exceptions=True)
+                writer.close()
+            except Exception:
+                pass
+
+    def _dispatch(self, client, msg):
+        cmd = msg['cmd']
+        msg_id = msg.get('id')
+        if cmd in ('subscribe', 'unsubscribe'):
+            try:
+                topics = list(msg.get('topics', TOPICS if cmd == 'subscribe' else client.subscriptions))
+                if not all(isinstance(t, str) for t in topics):
+                    raise TypeError('topics must be a list of strings')
+                every = max(1, int(msg.get('every', 1))) if cmd == 'subscribe' else None
+            except (TypeError, ValueError) as e:
+                client.offer(json.dumps({'id': msg_id, 'ok': False, 'error': f'bad request: {e}'}) + '\n')
+                return
+        if cmd == 'subscribe':
+            unknown = [t for t in topics if t not in TOPICS]
+            if unknown:
+                client.offer(json.dumps({'id': msg_id, 'ok': False, 'error': f'unknown topics: {unknown}'}) + '\n')
+                return
+            for t in topics:
+                if t not in client.subscriptions:
+                    self._subscribers[t] += 1
+                client.subscriptions[t] = every
+            client.offer(json.dumps({'id': msg_id, 'ok': True, 'result': client.subscriptions}) + '\n')
+        elif cmd == 'unsubscribe':
+            for t in topics:
+                if client.subscriptions.pop(t, None) is not None:
+                    self._subscribers[t] -= 1
+            client.offer(json.dumps({'id': msg_id, 'ok': True, 'result': client.subscriptions}) + '\n')
+        elif cmd == 'stats':
+            client.offer(json.dumps({'id': msg_id, 'ok': True, 'result': {'dropped': client.dropped}}) + '\n')
+        else:
+            try:
+                self.commands.put_nowait((client, msg))
+            except queue.Full:
+                client.offer(json.dumps({'id': msg_id, 'ok': False, 'error': 'busy'}) + '\n')
+
+
+# === TELEMETRY BUILDERS ===
+
+def segment_telemetry(segments):
+    """Per-segment aggregates: car count, mean speed, density (veh/km), stopped and red cars."""
+    out = {}
+    for seg in segments.values():
+        n = len(seg.cars)
+        mean_v = sum(c.v for c in seg.cars) / n if n else 0.0
+        out[seg.id] = {
+            'cars': n,
+            'mean_v': round(mean_v, 2),
+            'density': round(n / seg.length * 1000.0, 2) if seg.length > 0 else 0.0,
+            'stopped': sum(1 for c in seg.cars if c.v < 0.1),
+            'red': sum(1 for c in seg.cars if c.risk == 'red'),
+            'speed_limit': seg.speed_limit,
+        }
+    return out
+
+
+def car_telemetry(car):
+    if car is None:
+        return None
+    return {
+        'segment_id': car.segment.id if car.segment is not None else None,
+        'pos': round(car.pos, 2),
+        'v': round(car.v, 2),
+        'a': round(getattr(car, 'a', 0.0), 2),
+        'risk': car.risk,
+        'colliding': car.colliding,
+        'accel_state': car.accel_state,
+        'car_meta': car.car_meta,
+    }
@@ -0,0 +1,548 @@
+import heapq
+import math
+
+import meso
+import routing
+import sim
+from entities import Segment, Junction
+
+# In-app network editing with undo/redo.
+#
+# Every edit is a small command object with do()/undo() that changes the live
+# network in place: segments keep their cars (positions are scaled along a
+# moved segment), and only what the edit can affect is recomputed:
+#
+#   - geometry of the touched segments (Segment.set_geometry)
+#   - leader caches of those segments and of the segments upstream whose
+#     lookahead can reach them (within sim.LOOKAHEAD, found backwards through
+#     the route table's predecessor lists)
+#   - route table weights / links (routing.RouteTable.update_weights, relink)
+#   - sinks, safety and emissions indices, signal states of rewired inputs
+#   - segments put to sleep by the gridlock monitor are woken
+#   - render caches, through Editor.listeners: fn(changed ids, topology)
+#
+# Undo/redo replays the inverse command, so it costs the same as the edit.
+# Nothing is rebuilt from config; sim.update_config_current_state() writes the
+# edited network back out (Ctrl+S in the viewer).
+
+NODE_RADIUS = 10.0   # px, how close a click has to be to an endpoint
+MAX_UNDO = 200
+
+
+class Editor:
+    def __init__(self):
+        self.undo_stack = []
+        self.redo_stack = []
+        self.listeners = []
+
+    def apply(self, cmd):
+        cmd.do(self)
+        self.undo_stack.append(cmd)
+        del self.undo_stack[:-MAX_UNDO]
+        self.redo_stack.clear()
+        return cmd
+
+    def undo(self):
+        if not self.undo_stack:
+            return None
+        cmd = self.undo_stack.pop()
+        cmd.undo(self)
+        self.redo_stack.append(cmd)
+        return cmd
+
+    def redo(self):
+        if not self.redo_stack:
+            return None
+        cmd = self.redo_stack.pop()
+        cmd.do(self)
+        self.undo_stack.append(cmd)
+        return cmd
+
+    def clear(self):
+        """Forget the history (the network was rebuilt from config)."""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def notify(self, changed, topology):
+        if sim.gridlock is not None:
+            sim.gridlock.wake_all()
+        for fn in self.listeners:
+            fn(changed, topology)
+
+    # --- edits ---
+
+    def move_node(self, pt, new_pt, tolerance=0.5):
+        """Move every segment endpoint within `tolerance` of `pt` to `new_pt`."""
+        ends = endpoints_at(pt, tolerance)
+        if not ends:
+            return None
+        return self.apply(MoveNode(ends, pt, new_pt))
+
+    def add_segment(self, start, end, speed_limit=13.9, connect_from=None, connect_to=None):
+        """Add a segment, optionally fed by `connect_from` and feeding `connect_to` (segment ids)."""
+        seg_id = unique_id('seg')
+        cmds = [AddSegment(seg_id, start, end, speed_limit)]
+        if connect_from is not None:
+            cmds.append(connect_command(connect_from, seg_id))
+        if connect_to is not None:
+            cmds.append(connect_command(seg_id, connect_to))
+        return self.apply(cmds[0] if len(cmds) == 1 else Batch(cmds))
+
+    def split_segment(self, seg_id, world_pt):
+        """Split a segment at the point closest to `world_pt`; the original id keeps the upstream part."""
+        seg = sim.segments[seg_id]
+        t = project(seg, world_pt)
+        if seg.length * t < 1.0 or seg.length * (1 - t) < 1.0:
+            return None
+        return self.apply(SplitSegment(seg_id, t, unique_id(seg_id)))
+
+    def connect(self, from_id, to_id):
+        return self.apply(connect_command(from_id, to_id))
+
+    def disconnect(self, from_id, to_id):
+        j = junction_of(sim.segments[from_id])
+        if j is None or sim.segments[to_id] not in j.outputs:
+            return None
+        outputs = [s.id for s in j.outputs if s.id != to_id]
+        return self.apply(Rewire(j.id, [s.id for s in j.inputs], outputs))
+
+
+# --- commands ---
+
+class MoveNode:
+    def __init__(self, ends, old_pt, new_pt):
+        self.ends = ends   # [(segment id, 'start' or 'end')]
+        self.old_pt = tuple(old_pt)
+        self.new_pt = tuple(new_pt)
+
+    def do(self, editor):
+        _move_ends(editor, self.ends, self.new_pt)
+
+    def undo(self, editor):
+        _move_ends(editor, self.ends, self.old_pt)
+
+
+class AddSegment:
+    def __init__(self, seg_id, start, end, speed_limit):
+        self.seg_id = seg_id
+        self.start = tuple(start)
+        self.end = tuple(end)
+        self.speed_limit = speed_limit
+
+    def do(self, editor):
+        seg = Segment(self.seg_id, self.start, self.end, self.speed_limit, car_length=sim.CAR_LENGTH)
+        _insert_segment(seg)
+        editor.notify({seg.id}, True)
+
+    def undo(self, editor):
+        _remove_segment(sim.segments[self.seg_id])
+        editor.notify({self.seg_id}, True)
+
+
+class SplitSegment:
+    def __init__(self, seg_id, t, new_id):
+        self.seg_id = seg_id
+        self.t = t
+        self.new_id = new_id
+
+    def do(self, editor):
+        a = sim.segments[self.seg_id]
+        now = sim.sim_time
+        if a.meso:
+            meso.to_micro(a, now)
+        old_length = a.length
+        cut = (a.start[0] + (a.end[0] - a.start[0]) * self.t, a.start[1] + (a.end[1] - a.start[1]) * self.t)
+        b = Segment(self.new_id, cut, a.end, a.speed_limit, car_length=sim.CAR_LENGTH)
+        _insert_segment(b)
+
+        # b takes a's place at the downstream junction (and in its signal phases)
+        down = junction_of(a)
+        b.outputs = a.outputs
+        if down is not None:
+            down.inputs[down.inputs.index(a)] = b
+            _rename_in_signal(down, a.id, b.id)
+        b.signal_state, a.signal_state = a.signal_state, None
+        mid = Junction(unique_junction_id(f'{a.id}>{b.id}'), [a], [b], mode='priority')
+        sim.junctions.append(mid)
+        old_outputs = a.outputs
+        a.outputs = mid.outputs
+
+        # cars past the cut move to b; the others keep their position on a
+        split_at = old_length * self.t
+        for car in [c for c in a.cars if c.pos >= split_at]:
+            a.remove_car(car)
+            b.add_car(car, car.pos - split_at)
+        a.set_geometry(a.start, cut, scale_cars=False)
+
+        rt = sim.route_table
+        if rt is not None:
+            rt.relink(b, [])
+            rt.relink(a, old_outputs)
+            rt.update_weights({a.id: routing.free_flow_time(a)})
+        _update_sink(a)
+        _update_sink(b)
+        _reroute(a.cars + b.cars)
+        _refresh_leaders([a, b], {a.id: old_length})
+        editor.notify({a.id, b.id}, True)
+
+    def undo(self, editor):
+        a = sim.segments[self.seg_id]
+        b = sim.segments[self.new_id]
+        now = sim.sim_time
+        for seg in (a, b):
+            if seg.meso:
+                meso.to_micro(seg, now)
+        a_length = a.length
+        mid = junction_of(a)
+        # leader caches that reach b must be found before b is unlinked
+        affected = upstream([a, b])
+
+        a.set_geometry(a.start, b.end, scale_cars=False)
+        for car in list(b.cars):
+            b.remove_car(car)
+            a.add_car(car, car.pos + a_length)
+        a.cars.sort(key=lambda c: c.pos, reverse=True)
+
+        down = junction_of(b)
+        if down is not None:
+            down.inputs[down.inputs.index(b)] = a
+            _rename_in_signal(down, b.id, a.id)
+        a.signal_state = b.signal_state
+        if mid is not None:
+            sim.junctions.remove(mid)
+        a.outputs = b.outputs
+        b.outputs = []
+
+        rt = sim.route_table
+        if rt is not None:
+            rt.relink(a, [b])
+            rt.relink(b, a.outputs)
+            rt.update_weights({a.id: routing.free_flow_time(a)})
+        _remove_segment(b)
+        _update_sink(a)
+        _reroute(a.cars)
+        sim.rebuild_leader_cache([s for s in affected if s is not b])
+        editor.notify({a.id, b.id}, True)
+
+
+class Rewire:
+    """Set a junction's inputs and outputs (segment ids). A junction is created if
+    `junction_id` is new and removed when it is left without inputs or outputs.
+    Inputs taken from another junction are removed there.
+    """
+
+    def __init__(self, junction_id, inputs, outputs, mode='priority'):
+        self.junction_id = junction_id
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.mode = mode
+        self.saved = None
+
+    def do(self, editor):
+        j = find_junction(self.junction_id)
+        if j is None:
+            j = Junction(self.junction_id, [], [], mode=self.mode)
+        # every junction's new wiring is checked before any of them changes
+        plan = []
+        for sid in self.inputs:
+            other = junction_of(sim.segments[sid])
+            if other is not None and other is not j:
+                plan.append((other, [s.id for s in other.inputs if s.id != sid], [s.id for s in other.outputs]))
+        plan.append((j, self.inputs, self.outputs))
+        for junction, inputs, outputs in plan:
+            _check_junction(junction, inputs, outputs)
+        saved = []
+        changed = set()
+        for junction, inputs, outputs in plan:
+            saved.append((junction, [s.id for s in junction.inputs], [s.id for s in junction.outputs]))
+            changed |= _set_junction(junction, inputs, outputs)
+        self.saved = saved
+        editor.notify(changed, True)
+
+    def undo(self, editor):
+        changed = set()
+        for j, inputs, outputs in reversed(self.saved):
+            changed |= _set_junction(j, inputs, outputs)
+        editor.notify(changed, True)
+
+
+class Batch:
+    """Several commands undone and redone as one step."""
+
+    def __init__(self, cmds):
+        self.cmds = cmds
+
+    def do(self, editor):
+        for cmd in self.cmds:
+            cmd.do(editor)
+
+    def undo(self, editor):
+        for cmd in reversed(self.cmds):
+            cmd.undo(editor)
+
+
+def connect_command(from_id, to_id):
+    """Rewire that adds `to_id` to the outputs at the end of `from_id` (new junction if it has none)."""
+    seg = sim.segments.get(from_id)
+    j = junction_of(seg) if seg is not None else None
+    if j is None:
+        return Rewire(unique_junction_id(f'J_{from_id}'), [from_id], [to_id])
+    outputs = [s.id for s in j.outputs]
+    if to_id not in outputs:
+        outputs.append(to_id)
+    return Rewire(j.id, [s.id for s in j.inputs], outputs, mode=j.mode)
+
+
+# --- incremental updates ---
+
+def _move_ends(editor, ends, pt):
+    now = sim.sim_time
+    moved = []
+    old_lengths = {}
+    for sid, which in ends:
+        seg = sim.segments[sid]
+        if seg.meso:
+            meso.to_micro(seg, now)
+        old_lengths[sid] = seg.length
+        if which == 'start':
+            seg.set_geometry(pt, seg.end)
+        else:
+            seg.set_geometry(seg.start, pt)
+        moved.append(seg)
+    if sim.route_table is not None:
+        sim.route_table.update_weights({seg.id: routing.free_flow_time(seg) for seg in moved})
+    _refresh_leaders(moved, old_lengths)
+    editor.notify({seg.id for seg in moved}, False)
+
+
+def _check_junction(j, input_ids, output_ids):
+    """Raise ValueError if `j` cannot take these inputs/outputs."""
+    if j.signal is not None and not (input_ids and output_ids):
+        raise ValueError(f'junction {j.id!r} has a signal and cannot be removed')
+
+
+def _set_junction(j, input_ids, output_ids):
+    """Point `j` at new inputs/outputs and fix the links of every input involved. Returns changed ids."""
+    segments = sim.segments
+    old_inputs = list(j.inputs)
+    old_outputs = list(j.outputs)
+    _check_junction(j, input_ids, output_ids)
+    j.inputs = [segments[sid] for sid in input_ids]
+    j.outputs = [segments[sid] for sid in output_ids]
+    active = bool(j.inputs and j.outputs)
+    if active and j not in sim.junctions:
+        sim.junctions.append(j)
+    elif not active and j in sim.junctions:
+        sim.junctions.remove(j)
+
+    rt = sim.route_table
+    touched = []
+    for seg in old_inputs:
+        if seg not in j.inputs or not active:
+            prev = seg.outputs
+            seg.outputs = []
+            seg.signal_state = None
+            if rt is not None:
+                rt.relink(seg, prev)
+            touched.append(seg)
+    if active:
+        for seg in j.inputs:
+            prev = seg.outputs
+            seg.outputs = j.outputs
+            if rt is not None:
+                rt.relink(seg, prev)
+            touched.append(seg)
+    if j.signal is not None:
+        j.signal.refresh()
+    for seg in touched:
+        _update_sink(seg)
+    _reroute([c for seg in touched for c in seg.cars])
+    _refresh_leaders(touched)
+    return {seg.id for seg in touched} | {seg.id for seg in old_outputs + j.outputs}
+
+
+def upstream(segs, old_lengths=None):
+    """`segs` plus every segment whose lookahead can reach the start of one of them."""
+    old_lengths = old_lengths or {}
+    segments = sim.segments
+    pred = sim.route_table.pred if sim.route_table is not None else _pred_map()
+    found = {seg.id: seg for seg in segs}
+    best = {}
+    heap = [(0.0, p) for seg in segs for p in pred.get(seg.id, ())]
+    heapq.heapify(heap)
+    while heap:
+        d, sid = heapq.heappop(heap)
+        if sid in best or sid not in segments:
+            continue
+        best[sid] = d
+        seg = segments[sid]
+        found[sid] = seg
+        length = min(seg.length, old_lengths.get(sid, seg.length))
+        if d + length > sim.LOOKAHEAD:
+            continue
+        for p in pred.get(sid, ()):
+            if p not in best:
+                heapq.heappush(heap, (d + length, p))
+    return list(found.values())
+
+
+def _refresh_leaders(segs, old_lengths=None):
+    sim.rebuild_leader_cache(upstream(segs, old_lengths))
+
+
+def _pred_map():
+    pred = {}
+    for seg in sim.segments.values():
+        for out in seg.outputs:
+            pred.setdefault(out.id, []).append(seg.id)
+    return pred
+
+
+def _insert_segment(seg):
+    sim.segments[seg.id] = seg
+    if sim.route_table is not None:
+        sim.route_table.add_segment(seg)
+    if sim.safety is not None:
+        sim.safety.add_segment(seg.id)
+    if sim.emissions is not None:
+        sim.emissions.add_segment(seg.id)
+    _update_sink(seg)
+
+
+def _remove_segment(seg):
+    for car in seg.cars:
+        car.segment = None
+    seg.cars = []
+    if seg in sim.sinks:
+        sim.sinks.remove(seg)
+    if sim.route_table is not None:
+        sim.route_table.remove_segment(seg.id)
+    del sim.segments[seg.id]
+
+
+def _update_sink(seg):
+    is_sink = not seg.outputs and seg.id in sim.segments
+    if is_sink and seg not in sim.sinks:
+        sim.sinks.append(seg)
+    elif not is_sink and seg in sim.sinks:
+        sim.sinks.remove(seg)
+
+
+def _reroute(cars):
+    """Re-plan routed cars from where they are now."""
+    rt = sim.route_table
+    for car in cars:
+        if car.destination is None or rt is None:
+            continue
+        route = rt.route(car.segment.id, car.destination)
+        car.route = route
+        car.route_idx = 0
+
+
+def _rename_in_signal(j, old_id, new_id):
+    """Rename a segment in the signal's phases, on copies: the plans are shared with the config."""
+    signal = j.signal
+    if signal is None:
+        return
+    plans = []
+    for plan in signal.plans:
+        phases = [dict(phase, green=[new_id if sid == old_id else sid for sid in phase['green']])
+                  if old_id in phase.get('green', ()) else phase for phase in plan['phases']]
+        plans.append(dict(plan, phases=phases))
+    if signal.plan is not None:
+        signal.plan = plans[next(i for i, plan in enumerate(signal.plans) if plan is signal.plan)]
+    signal.plans = plans
+    signal.config = dict(signal.config, plans=plans)
+    signal.refresh()
+
+
+# --- lookups ---
+
+def junction_of(seg):
+    """The junction `seg` feeds into, or None."""
+    for j in sim.junctions:
+        if seg in j.inputs:
+            return j
+    return None
+
+
+def find_junction(junction_id):
+    for j in sim.junctions:
+        if j.id == junction_id:
+            return j
+    return None
+
+
+def endpoints_at(pt, tolerance):
+    ends = []
+    for seg in sim.segments.values():
+        if math.hypot(seg.start[0] - pt[0], seg.start[1] - pt[1]) <= tolerance:
+            ends.append((seg.id, 'start'))
+        if math.hypot(seg.end[0] - pt[0], seg.end[1] - pt[1]) <= tolerance:
+            ends.append((seg.id, 'end'))
+    return ends
+
+
+def nearest_node(world_pt, radius):
+    """Closest segment endpoint within `radius` (world units) of `world_pt`, or None."""
+    best = None
+    best_d = radius
+    for seg in sim.segments.values():
+        for p in (seg.start, seg.end):
+            d = math.hypot(p[0] - world_pt[0], p[1] - world_pt[1])
+            if d <= best_d:
+                best, best_d = p, d
+    return best
+
+
+def project(seg, world_pt):
+    """Fraction along `seg` of the point on it closest to `world_pt`."""
+    if seg.length <= 0:
+        return 0.0
+    t = ((world_pt[0] - seg.start[0]) * seg.dir[0] + (world_pt[1] - seg.start[1]) * seg.dir[1]) / seg.length
+    return max(0.0, min(1.0, t))
+
+
+def segment_at(world_pt, radius):
+    """Segment whose centre line passes within `radius` of `world_pt`, or None."""
+    best = None
+    best_d = radius
+    for seg in sim.segments.values():
+        t = project(seg, world_pt)
+        x = seg.start[0] + (seg.end[0] - seg.start[0]) * t
+        y = seg.start[1] + (seg.end[1] - seg.start[1]) * t
+        d = math.hypot(x - world_pt[0], y - world_pt[1])
+        if d <= best_d:
+            best, best_d = seg, d
+    return best
+
+
+def segment_ending_at(pt, tolerance=0.5):
+    for sid, which in endpoints_at(pt, tolerance):
+        if which == 'end':
+            return sid
+    return None
+
+
+def segment_starting_at(pt, tolerance=0.5):
+    for sid, which in endpoints_at(pt, tolerance):
+        if which == 'start':
+            return sid
+    return None
+
+
+def unique_id(base):
+    n = 2
+    while f'{base}_{n}' in sim.segments:
+        n += 1
+    return f'{base}_{n}'
+
+
+def unique_junction_id(base):
+    ids = {j.id for j in sim.junctions}
+    if base not in ids:
+        return base
+    n = 2
+    while f'{base}_{n}' in ids:
+        n += 1
+    return f'{base}_{n}'
@@ -0,0 +1,274 @@
+import csv
+import os
+
+import numpy as np
+
+# Instantaneous fuel, energy, CO2 and NOx, one batched table lookup per tick.
+#
+# Emission rates are tabulated per vehicle profile on a speed x acceleration
+# grid (VT-Micro / HBEFA style). Every segment update leaves its cars' new
+# speeds and accelerations in seg.car_v / seg.car_a (aligned with seg.cars);
+# EmissionsMonitor.on_tick() concatenates them for the whole network, looks
+# up the nearest grid cell of every car at once and adds rate * STEP to
+# per-vehicle, per-segment and network totals. Cars on meso segments drive
+# at constant speed and are looked up with a = 0.
+#
+# The built-in tables come from a power-based instantaneous model (tractive
+# power from mass, rolling resistance and drag; fuel as idle rate plus terms
+# in power and inertial power, after Akcelik & Besley's ARRB model; NOx
+# linear in power) with generic parameters per profile. For calibrated
+# numbers, load tables from a CSV with columns profile,v,a,fuel,energy,co2,nox
+# (per-second rates on a regular grid, v in m/s and a in m/s^2) through the
+# 'table' entry of the state's 'emissions' section.
+#
+# Cars get their profile from the 'emissions' entry of car_params or of their
+# vehicle class (default DEFAULT_PROFILE). Per-segment totals are written to
+# CSV every `interval` simulated seconds, per-vehicle trip totals when a car
+# leaves the network (and for the cars still driving on close()).
+
+QUANTITIES = ('fuel_l', 'energy_kwh', 'co2_kg', 'nox_g')
+DEFAULT_PROFILE = 'petrol_car'
+V_GRID = (0.0, 50.0, 0.5)    # m/s: first, last, step
+A_GRID = (-8.0, 5.0, 0.25)   # m/s^2
+GRAVITY = 9.81
+AIR_DENSITY = 1.2            # kg/m^3
+ROTATING_MASS = 0.04         # extra inertia of wheels and drivetrain, as a share of the mass
+
+# fuel -> (kg CO2 per litre, kWh per litre)
+FUELS = {'petrol': (2.31, 8.9), 'diesel': (2.68, 10.0)}
+
+# mass kg, cd_a m^2 (drag coefficient x frontal area), c_r rolling resistance;
+# combustion: idle mL/s, beta1 mL/kJ, beta2 mL/(kJ m/s^2), NOx g/s idle and g/kJ;
+# electric: drive and regeneration efficiency, auxiliary load kW
+PROFILES = {
+    'petrol_car': {'mass': 1300, 'cd_a': 0.65, 'c_r': 0.012, 'fuel': 'petrol', 'idle': 0.375, 'beta1': 0.09,
+                   'beta2': 0.03, 'nox_idle': 0.0002, 'nox_per_kj': 0.00012},
+    'diesel_car': {'mass': 1450, 'cd_a': 0.68, 'c_r': 0.012, 'fuel': 'diesel', 'idle': 0.3, 'beta1': 0.075,
+                   'beta2': 0.025, 'nox_idle': 0.002, 'nox_per_kj': 0.0012},
+    'diesel_truck': {'mass': 15000, 'cd_a': 5.5, 'c_r': 0.007, 'fuel': 'diesel', 'idle': 0.9, 'beta1': 0.075,
+                     'beta2': 0.02, 'nox_idle': 0.02, 'nox_per_kj': 0.0012},
+    'electric_car': {'mass': 1700, 'cd_a': 0.6, 'c_r': 0.011, 'drive_eff': 0.88, 'regen_eff': 0.65, 'aux_kw': 1.0},
+}
+
+SEGMENT_FIELDS = ['time', 'segment', 'vehicle_seconds'] + list(QUANTITIES)
+VEHICLE_FIELDS = ['car', 'vclass', 'profile', 'spawn_time', 'end_time', 'arrived'] + list(QUANTITIES)
+
+
+def _grid(first, last, step):
+    return first + step * np.arange(int(round((last - first) / step)) + 1)
+
+
+def profile_rates(p, v, a):
+    """Per-second rates (fuel L, energy kWh, CO2 kg, NOx g) of profile `p` at speeds v and accelerations a."""
+    m = p['mass']
+    force = (m * (1 + ROTATING_MASS) * a + m * GRAVITY * p['c_r'] * (v > 0)
+             + 0.5 * AIR_DENSITY * p['cd_a'] * v * v)
+    power = force * v / 1000.0  # kW at the wheels
+    if 'fuel' not in p:
+        kw = np.where(power > 0, power / p['drive_eff'], power * p['regen_eff']) + p['aux_kw']
+        zero = np.zeros_like(kw)
+        return np.stack([zero, kw / 3600.0, zero, zero], -1)
+    inertial = m * np.maximum(a, 0.0) ** 2 * v / 1000.0
+    ml = p['idle'] + np.where(power > 0, p['beta1'] * power + p['beta2'] * inertial, 0.0)
+    co2_per_l, kwh_per_l = FUELS[p['fuel']]
+    litres = ml / 1000.0
+    nox = p['nox_idle'] + p['nox_per_kj'] * np.maximum(power, 0.0)
+    return np.stack([litres, litres * kwh_per_l, litres * co2_per_l, nox], -1)
+
+
+def default_tables():
+    """(profile names, v grid, a grid, rates[profile, v, a, quantity]) from PROFILES."""
+    v = _grid(*V_GRID)
+    a = _grid(*A_GRID)
+    vv, aa = np.meshgrid(v, a, indexing='ij')
+    return list(PROFILES), v, a, np.stack([profile_rates(p, vv, aa) for p in PROFILES.values()])
+
+
+def load_tables(path):
+    """Tables from a CSV with columns profile,v,a,fuel,energy,co2,nox on a regular v x a grid."""
+    rows = {}
+    with open(path, newline='') as f:
+        for r in csv.DictReader(f):
+            rows.setdefault(r['profile'], {})[(float(r['v']), float(r['a']))] = \
+                [float(r[k]) for k in ('fuel', 'energy', 'co2', 'nox')]
+    if not rows:
+        raise ValueError(f'{path}: no emission rates')
+    first = next(iter(rows.values()))
+    v = np.array(sorted({k[0] for k in first}))
+    a = np.array(sorted({k[1] for k in first}))
+    for axis, name in ((v, 'v'), (a, 'a')):
+        if len(axis) < 2 or not np.allclose(np.diff(axis), axis[1] - axis[0]):
+            raise ValueError(f'{path}: {name} values must form a regular grid')
+    rates = np.empty((len(rows), len(v), len(a), len(QUANTITIES)))
+    for k, (name, cells) in enumerate(rows.items()):
+        try:
+            rates[k] = [[cells[(x, y)] for y in a] for x in v]
+        except KeyError as e:
+            raise ValueError(f'{path}: profile {name!r} has no rate for v, a = {e.args[0]}') from None
+    return list(rows), v, a, rates
+
+
+class EmissionsMonitor:
+    def __init__(self, segments, step, interval=60.0, path='emissions.csv', vehicles_path=None, table=None):
+        """`path` None: keep totals in memory only (headless batch runs)."""
+        self.step = step
+        self.interval = interval
+        self.profiles, v, a, rates = load_tables(table) if table else default_tables()
+        self.profile_index = {name: i for i, name in enumerate(self.profiles)}
+        self.v0, self.dv_inv, self.nv = v[0], 1.0 / (v[1] - v[0]), len(v)
+        self.a0, self.da_inv, self.na = a[0], 1.0 / (a[1] - a[0]), len(a)
+        self.cells = len(v) * len(a)  # table rows per profile
+        self.per_tick = rates.reshape(-1, len(QUANTITIES)) * step  # amounts emitted in one tick
+        self.totals = np.zeros(len(QUANTITIES))  # network totals since the start
+        self.car_profile = np.zeros(1024, np.int32)  # by car id
+        self.car_totals = np.zeros((len(QUANTITIES), 1024))  # quantity x car id
+        self.live = {}  # car id -> car, for the vehicle rows of cars still driving at close()
+        self.seg_ids = []
+        self.index = {}
+        self._ids = {}  # segment id -> (car count, front car, back car, [car ids, table offsets]) from the last tick
+        self._file = self._writer = self._veh_file = self._veh_writer = None
+        if path is not None:
+            self._file = open(path, 'w', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(SEGMENT_FIELDS)
+            self._veh_file = open(vehicles_path or _vehicles_path(path), 'w', newline='')
+            self._veh_writer = csv.writer(self._veh_file)
+            self._veh_writer.writerow(VEHICLE_FIELDS)
+        self.set_segments(segments)
+        self._next_flush = interval
+        self._last_time = 0.0
+
+    def check_profile(self, name):
+        if (name or DEFAULT_PROFILE) not in self.profile_index:
+            raise ValueError(f"unknown emissions profile {name!r} (known: {', '.join(self.profiles)})")
+
+    def set_segments(self, segments):
+        """(Re)index segments; call after topology changes."""
+        self.seg_ids = list(segments.keys())
+        self.index = {sid: i for i, sid in enumerate(self.seg_ids)}
+        self._reset_accumulators()
+
+    def add_segment(self, sid):
+        """Index a segment added by the network editor, keeping the running interval."""
+        if sid in self.index:
+            return
+        self.index[sid] = len(self.seg_ids)
+        self.seg_ids.append(sid)
+        self.seg_ticks = np.append(self.seg_ticks, 0)
+        self.seg_totals = np.vstack([self.seg_totals, np.zeros(len(QUANTITIES))])
+
+    def _reset_accumulators(self):
+        n = len(self.seg_ids)
+        self.seg_ticks = np.zeros(n, np.int64)
+        self.seg_totals = np.zeros((n, len(QUANTITIES)))
+
+    # --- per car ---
+
+    def add_car(self, car, profile=None):
+        """Called by sim.spawn_into with the car's 'emissions' parameter."""
+        if car.id >= len(self.car_profile):
+            size = max(2 * len(self.car_profile), car.id + 1)
+            self.car_profile = np.resize(self.car_profile, size)
+            self.car_totals = np.hstack([self.car_totals, np.zeros((len(QUANTITIES), size - self.car_totals.shape[1]))])
+        self.car_profile[car.id] = self.profile_index[profile or DEFAULT_PROFILE]
+        self.car_totals[:, car.id] = 0.0
+        self.live[car.id] = car
+
+    def record_arrival(self, car, sim_time):
+        """Called by sim.arrive: write the car's trip totals."""
+        if self.live.pop(car.id, None) is not None:
+            self._write_vehicle(car, sim_time, True)
+
+    def car_total(self, car):
+        """{quantity: total} of one car so far."""
+        return dict(zip(QUANTITIES, self.car_totals[:, car.id].tolist()))
+
+    # --- per tick ---
+
+    def on_tick(self, segments, sim_time):
+        v_parts, a_parts, key_parts, seg_idx, counts = [], [], [], [], []
+        index = self.index
+        ids = self._ids
+        for sid, seg in segments.items():
+            cars = seg.cars
+            n = len(cars)
+            if n == 0:
+                ids.pop(sid, None)
+                continue
+            if seg.meso or len(seg.car_v) != n:
+                v_parts.append(np.fromiter((c.v for c in cars), np.float64, n))
+                a_parts.append(np.zeros(n))
+            else:
+                v_parts.append(seg.car_v)
+                a_parts.append(seg.car_a)
+            # cars only join at the back and leave at the front of a segment, so
+            # the same count, front and back car mean the same cars in the same order
+            cached = ids.get(sid)
+            if cached is None or cached[0] != n or cached[1] is not cars[0] or cached[2] is not cars[-1]:
+                car_ids = np.fromiter((c.id for c in cars), np.intp, n)
+                # row 0: car ids, row 1: first table row of each car's profile
+                cached = ids[sid] = (n, cars[0], cars[-1], np.stack([car_ids, self.car_profile[car_ids] * self.cells]))
+            key_parts.append(cached[3])
+            seg_idx.append(index[sid])
+            counts.append(n)
+        if v_parts:
+            car_ids, base = np.concatenate(key_parts, axis=1)
+            self._accumulate(np.concatenate(v_parts), np.concatenate(a_parts), car_ids, base,
+                             np.array(seg_idx), np.array(counts))
+        self._last_time = sim_time
+        if sim_time >= self._next_flush:
+            self.flush(sim_time)
+            self._next_flush = sim_time + self.interval
+
+    def _accumulate(self, v, a, ids, base, seg_idx, counts):
+        """Cars are grouped by segment: counts[k] consecutive cars are on segment seg_idx[k];
+        base is each car's first row in the table (its profile)."""
+        # nearest grid cell; below the first value truncation and clipping both give 0
+        iv = ((v - self.v0) * self.dv_inv + 0.5).astype(np.intp)
+        np.maximum(iv, 0, out=iv)
+        np.minimum(iv, self.nv - 1, out=iv)
+        ia = ((a - self.a0) * self.da_inv + 0.5).astype(np.intp)
+        np.maximum(ia, 0, out=ia)
+        np.minimum(ia, self.na - 1, out=ia)
+        iv *= self.na
+        iv += ia
+        iv += base
+        amounts = self.per_tick.take(iv, axis=0)
+        for k, car_totals in enumerate(self.car_totals):
+            car_totals[ids] += amounts[:, k]  # a car is on one segment, so ids are unique
+        seg_amounts = np.add.reduceat(amounts, np.cumsum(counts) - counts, axis=0)
+        self.seg_ticks[seg_idx] += counts
+        self.seg_totals[seg_idx] += seg_amounts
+        self.totals += seg_amounts.sum(axis=0)
+
+    # --- output ---
+
+    def flush(self, sim_time):
+        if self._writer is not None:
+            t = round(sim_time, 3)
+            for i in np.flatnonzero(self.seg_ticks):
+                self._writer.writerow([t, self.seg_ids[i], round(self.seg_ticks[i] * self.step, 3)]
+                                      + [f'{x:.6g}' for x in self.seg_totals[i]])
+            self._file.flush()
+            self._veh_file.flush()
+        self._reset_accumulators()
+
+    def _write_vehicle(self, car, sim_time, arrived):
+        if self._veh_writer is not None:
+            self._veh_writer.writerow([car.id, car.vclass or '', self.profiles[self.car_profile[car.id]],
+                                       round(car.spawn_time, 3), round(sim_time, 3), int(arrived)]
+                                      + [f'{x:.6g}' for x in self.car_totals[:, car.id]])
+
+    def close(self):
+        """Write the partial last interval and the cars still driving, and close the files."""
+        if self._file is not None and not self._file.closed:
+            for car in self.live.values():
+                self._write_vehicle(car, self._last_time, False)
+            self.flush(self._last_time)
+            self._file.close()
+            self._veh_file.close()
+
+
+def _vehicles_path(path):
+    root, ext = os.path.splitext(path)
+    return f'{root}_vehicles{ext or ".csv"}'
@@ -0,0 +1,260 @@
+import argparse
+import csv
+import math
+import multiprocessing as mp
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from statistics import NormalDist
+
+# Stochastic ensemble runs with confidence intervals.
+#
+#   python src/ensemble.py --seconds 1800 --precision 0.05
+#   python src/ensemble.py --config base.json --variant signals.json --crn
+#
+# Replication r runs the scenario headless with random streams seeded from
+# "<seed>:<r>" (sim.seed_streams), so any replication can be re-run on its
+# own. With --variant both scenarios are run for every replication and the
+# table also has the per-replication difference variant - base; --crn gives
+# both the same seed (common random numbers), which pairs the runs and
+# usually narrows the interval of the difference a lot.
+#
+# Replications run on a process pool, but their results are folded into the
+# running statistics (Welford) in replication order, so the number of
+# replications used and the table do not depend on scheduling. After
+# --min-reps, the ensemble stops as soon as every --stop-on metric (of the
+# difference when there is a variant) has a confidence interval half-width
+# within --precision of its mean (or below --abs-precision).
+#
+# Metrics, measured after --warmup:
+#   throughput   cars leaving the network per hour
+#   travel_time  mean trip time of those cars (s; none on closed loops)
+#   delay        time lost below the speed limit per vehicle-km driven (s/km),
+#                from the per-segment exit counters
+#   collisions   cars that started overlapping another car
+#   fuel, energy, co2, nox
+#                network emissions per hour (L, kWh, kg, g) when the state's
+#                'emissions' section is enabled (see emissions.py)
+
+METRICS = ('throughput', 'travel_time', 'delay', 'collisions', 'fuel', 'energy', 'co2', 'nox')
+EMISSIONS = ('fuel', 'energy', 'co2', 'nox')  # in emissions.QUANTITIES order
+
+_configs = None  # per worker process: the scenarios passed to _init_worker
+
+
+def t_quantile(p, df):
+    """Quantile of Student's t distribution (exact for df 1-2, Cornish-Fisher expansion above)."""
+    if df == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    return (z + (z ** 3 + z) / (4 * df)
+            + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+            + (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / (92160 * df ** 4))
+
+
+class RunningStat:
+    """Streaming mean and variance (Welford); None values are skipped."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x):
+        if x is None:
+            return
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+
+    @property
+    def sd(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else float('nan')
+
+    def half_width(self, confidence=0.95):
+        if self.n < 2:
+            return float('inf')
+        return t_quantile(0.5 + confidence / 2, self.n - 1) * self.sd / math.sqrt(self.n)
+
+
+def replicate(config, seed, seconds, warmup=300.0):
+    """One headless run; returns {metric: value} (None where nothing was measured)."""
+    import sim
+
+    sim.reset_clock()
+    sim.build_from_config(config)
+    sim.seed_streams(seed)
+    for _ in range(int(round(warmup / sim.STEP))):
+        sim.spawn_default(sim.STEP)
+        sim.step()
+
+    def totals():
+        segs = [seg for seg in sim.segments.values() if seg.speed_limit > 0]
+        lost = sum(seg.travel_time_total - seg.exits * seg.length / seg.speed_limit for seg in segs)
+        km = sum(seg.exits * seg.length for seg in segs) / 1000.0
+        emitted = tuple(sim.emissions.totals.tolist()) if sim.emissions is not None else (None,) * len(EMISSIONS)
+        return (sim.arrived, sim.arrived_time_total, lost, km, sim.collisions) + emitted
+
+    before = totals()
+    for _ in range(int(round(seconds / sim.STEP))):
+        sim.spawn_default(sim.STEP)
+        sim.step()
+    after = totals()
+    arrived, trip_time, lost, km, collisions = (b - a for a, b in zip(before[:5], after[:5]))
+    metrics = {
+        'throughput': arrived * 3600.0 / seconds,
+        'travel_time': trip_time / arrived if arrived else None,
+        'delay': max(0.0, lost) / km if km > 0 else None,
+        'collisions': collisions,
+    }
+    for name, a, b in zip(EMISSIONS, before[5:], after[5:]):
+        metrics[name] = (b - a) * 3600.0 / seconds if a is not None else None
+    return metrics
+
+
+def _init_worker(configs):
+    global _configs
+    _configs = configs
+
+
+def _run(args):
+    variant, rep, seed, seconds, warmup = args
+    return variant, rep, replicate(_configs[variant], seed, seconds, warmup)
+
+
+def replication_seed(seed, rep, variant, crn):
+    return f'{seed}:{rep}' if crn or variant == 0 else f'{seed}:{rep}:{variant}'
+
+
+def run_ensemble(configs, seconds, warmup=300.0, seed=0, crn=False, confidence=0.95, precision=0.05,
+                 abs_precision=0.0, min_reps=5, max_reps=100, jobs=None, stop_on=METRICS, log=print):
+    """Replicate one scenario (or a base and a variant) until the intervals are tight enough.
+
+    Returns (stats, replications, precise) with stats[(row, metric)] -> RunningStat, rows being
+    0..len(configs)-1 and 'diff' for a variant.
+    """
+    rows = list(range(len(configs))) + (['diff'] if len(configs) == 2 else [])
+    stats = {(row, m): RunningStat() for row in rows for m in METRICS}
+    targets = ['diff' if len(configs) == 2 else 0]
+    jobs = jobs or os.cpu_count() or 1
+    finished = {}  # rep -> {variant: metrics}
+    used = 0
+    precise = False
+    next_task = 0
+    tasks = [(v, r) for r in range(max_reps) for v in range(len(configs))]
+
+    def is_precise():
+        for row in targets:
+            for m in stop_on:
+                s = stats[(row, m)]
+                if s.n == 0:
+                    continue  # never measured in this scenario (e.g. trip times on a closed loop)
+                if s.n < 2 or s.half_width(confidence) > max(precision * abs(s.mean), abs_precision):
+                    return False
+        return True
+
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=mp.get_context('spawn'),
+                             initializer=_init_worker, initargs=(configs,)) as pool:
+        running = set()
+        while True:
+            while next_task < len(tasks) and len(running) < jobs + 1:
+                v, r = tasks[next_task]
+                running.add(pool.submit(_run, (v, r, replication_seed(seed, r, v, crn), seconds, warmup)))
+                next_task += 1
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                v, r, metrics = fut.result()
+                finished.setdefault(r, {})[v] = metrics
+            # fold in completed replications in order, checking the stopping rule after each
+            before = used
+            while len(finished.get(used, ())) == len(configs):
+                results = finished.pop(used)
+                for m in METRICS:
+                    for v in range(len(configs)):
+                        stats[(v, m)].add(results[v][m])
+                    if len(configs) == 2 and results[0][m] is not None and results[1][m] is not None:
+                        stats[('diff', m)].add(results[1][m] - results[0][m])
+                used += 1
+                if used >= min_reps and is_precise():
+                    precise = True
+                    break
+            if precise:
+                for fut in running:
+                    fut.cancel()
+                break
+            if log is not None and used > before:
+                log(f'{used} replications done')
+    return stats, used, precise
+
+
+def format_table(stats, labels, confidence=0.95):
+    """Rows of the result table (header first) as lists of strings."""
+    pct = f'{confidence * 100:g}%'
+    table = [['scenario', 'metric', 'n', 'mean', 'sd', f'{pct} low', f'{pct} high', '± %']]
+    for (row, m), s in stats.items():
+        if s.n == 0:
+            table.append([labels[row], m, '0'] + ['-'] * 5)
+            continue
+        hw = s.half_width(confidence)
+        rel = f'{100 * hw / abs(s.mean):.1f}' if s.mean else '-'
+        table.append([labels[row], m, str(s.n), f'{s.mean:.3f}', f'{s.sd:.3f}', f'{s.mean - hw:.3f}',
+                      f'{s.mean + hw:.3f}', rel])
+    return table
+
+
+def main(argv=None):
+    import config as cfg
+
+    p = argparse.ArgumentParser(description='Replicate a scenario and report metrics with confidence intervals.')
+    p.add_argument('--config', default=None, help='scenario JSON (default: config.json)')
+    p.add_argument('--variant', default=None, help='second scenario to compare against --config')
+    p.add_argument('--crn', action='store_true', help='common random numbers: same seeds for both scenarios')
+    p.add_argument('--seconds', type=float, default=1800.0, help='measured simulated seconds per replication')
+    p.add_argument('--warmup', type=float, default=300.0, help='simulated seconds before measuring')
+    p.add_argument('--seed', default='0', help='base seed; replication r uses "<seed>:<r>"')
+    p.add_argument('--confidence', type=float, default=0.95)
+    p.add_argument('--precision', type=float, default=0.05, help='target CI half-width relative to the mean')
+    p.add_argument('--abs-precision', type=float, default=0.0, help='absolute half-width that is always enough')
+    p.add_argument('--stop-on', nargs='+', choices=METRICS, default=list(METRICS),
+                   help='metrics the stopping rule looks at')
+    p.add_argument('--min-reps', type=int, default=5)
+    p.add_argument('--max-reps', type=int, default=100)
+    p.add_argument('--jobs', type=int, default=None, help='worker processes (default: CPUs)')
+    p.add_argument('--out', default=None, help='also write the table as CSV')
+    args = p.parse_args(argv)
+
+    configs = []
+    labels = {}
+    for i, path in enumerate([args.config] + ([args.variant] if args.variant else [])):
+        config = cfg.load_config(path)
+        if config is None:
+            sys.exit(1)
+        configs.append(cfg.batch_copy(config))
+        labels[i] = os.path.basename(path or cfg.CONFIG_PATH)
+    if args.variant:
+        labels['diff'] = 'variant - base' + (' (CRN)' if args.crn else '')
+
+    t0 = time.perf_counter()
+    stats, reps, precise = run_ensemble(configs, args.seconds, args.warmup, args.seed, args.crn, args.confidence,
+                                        args.precision, args.abs_precision, max(2, args.min_reps),
+                                        max(2, args.max_reps), args.jobs, args.stop_on)
+    table = format_table(stats, labels, args.confidence)
+    widths = [max(len(r[i]) for r in table) for i in range(len(table[0]))]
+    for r in table:
+        print('  '.join(c.ljust(w) if i < 2 else c.rjust(w) for i, (c, w) in enumerate(zip(r, widths))))
+    reason = 'precision reached' if precise else 'max replications reached'
+    print(f'{reps} replications ({reason}) in {time.perf_counter() - t0:.1f} s')
+    if args.out:
+        with open(args.out, 'w', newline='') as f:
+            csv.writer(f).writerows(table)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,12 @@
 import math
+import random
 import pygame
 
 # Keep constants expected by entities imported from caller context where needed
 
 class Car:
     def __init__(self):
+        self.id = None  # assigned by sim.spawn_into
         self.pos = 0.0
         self.v = 0.0
         self.segment = None
@@ -14,26 +16,73 @@ class Car:
         self.b_max = None
         self.T = None
         self.s0 = None
+        self.vclass = None  # vehicle class name from the scenario's vehicle_classes
+        self.model = 'idm'  # car-following model name (see models.py)
+        self.model_params = None  # the model's parameter values in schema order, set at spawn
         self.risk = "green"
         self.colliding = False
         self.accel_state = "coasting"  # NEW: accelerating / braking / coasting        
+        self._meta_lazy = None  # (builder, args) set by kernels.py; the dict is only built when read
         self.car_meta = {}  # Store calculated info: s, dv, a, s_star, etc.
+        self.spawn_time = 0.0
+        self.destination = None  # segment id the car is routed to (None = follow junction modes)
+        self.route = None        # tuple of Segments from the current segment to the destination
+        self.route_idx = 0       # index of the current segment in `route`
+        self.seg_entry_time = 0.0
+        self.meso_entry = None   # (time, pos) when scheduled on a meso segment
+        self.meso_exit = None    # scheduled exit time on a meso segment
+
+    @property
+    def car_meta(self):
+        if self._meta_lazy is not None:
+            builder, args = self._meta_lazy
+            self._car_meta = builder(*args)
+            self._meta_lazy = None
+        return self._car_meta
+
+    @car_meta.setter
+    def car_meta(self, meta):
+        self._meta_lazy = None
+        self._car_meta = meta
 
 
 class Segment:
     def __init__(self, id, start_pt, end_pt, speed_limit=13.9, car_length=4.5):
         self.id = id
-        self.start = tuple(start_pt)
-        self.end = tuple(end_pt)
         self.speed_limit = speed_limit
         self.cars = []
         self.outputs = []
+        self.lookahead = []       # cached downstream (segment, offset, parent), see sim.rebuild_leader_cache
+        self.signal_state = None  # 'green' / 'amber' / 'red' when the end of this segment is signalised
+        self.meso = False         # simulated by the meso queue model instead of IDM, see meso.py
+        self.closed = False       # closed to entering cars (events.py)
+        self.exit_closed = False  # every output is closed: the end acts as a stop line
+        self.asleep = False       # blocked with all cars stopped: skipped by the update (gridlock.py)
+        self.meso_last_exit = None
+        self.exits = 0            # cars that left this segment
+        self.leader_s = ()        # per-car gap to leader from the last update (aligned with cars)
+        self.leader_dv = ()       # per-car speed difference to leader
+        self.leader_real = ()     # per-car: the leader is a car, not a stop line
+        self.car_v = ()           # per-car speed and acceleration after the last update (emissions.py)
+        self.car_a = ()
+        self.last_clear = None    # (time, input id) the last entering car cleared the segment start (PET)
+        self.travel_time_total = 0.0
+        self.set_geometry(start_pt, end_pt)
+        self.car_length = car_length
 
+    def set_geometry(self, start_pt, end_pt, scale_cars=True):
+        """Move the segment's endpoints; cars keep their relative position along it unless scale_cars is False."""
+        old_length = getattr(self, 'length', 0.0)
+        self.start = tuple(start_pt)
+        self.end = tuple(end_pt)
         dx = self.end[0] - self.start[0]
         dy = self.end[1] - self.start[1]
         self.length = math.hypot(dx, dy)
         self.dir = (dx / self.length, dy / self.length) if self.length > 0 else (0, 0)
-        self.car_length = car_length
+        if scale_cars and old_length > 0 and self.cars:
+            scale = self.length / old_length
+            for car in self.cars:
+                car.pos *= scale
 
     def add_car(self, car, pos=0.0):
         car.segment = self
@@ -47,13 +96,30 @@ class Segment:
         if car in self.cars:
             self.cars.remove(car)
 
-    def draw_road(self, surface, world_to_screen, zoom, road_color=(80,80,80), road_width=40):
+    def draw_road(self, surface, world_to_screen, zoom, road_color=(80,80,80), road_width=40, span_colors=None):
+        """Draw the road; with span_colors (e.g. a heatmap) the road is split into equal coloured sub-spans."""
         if self.length == 0:
             return
         p1 = world_to_screen(self.start)
         p2 = world_to_screen(self.end)
         rw = max(1, int(road_width * zoom))
-        pygame.draw.line(surface, road_color, p1, p2, rw)
+        if not span_colors:
+            pygame.draw.line(surface, road_color, p1, p2, rw)
+            return
+        # never draw spans shorter than ~4 px; merge neighbouring bins instead
+        seg_pixels = math.hypot(p2[0] - p1[0], p2[1] - p1[1])
+        n = len(span_colors)
+        spans = max(1, min(n, int(seg_pixels / 4)))
+        for k in range(spans):
+            lo = k * n // spans
+            hi = max(lo + 1, (k + 1) * n // spans)
+            group = span_colors[lo:hi]
+            color = tuple(sum(c[i] for c in group) // len(group) for i in range(3))
+            t0 = k / spans
+            t1 = (k + 1) / spans
+            a = (p1[0] + (p2[0] - p1[0]) * t0, p1[1] + (p2[1] - p1[1]) * t0)
+            b = (p1[0] + (p2[0] - p1[0]) * t1, p1[1] + (p2[1] - p1[1]) * t1)
+            pygame.draw.line(surface, color, a, b, rw)
 
     def draw_label(self, surface, world_to_screen, font, label_color=(200, 200, 200)):
         """Draw segment label at midpoint between start and end."""
@@ -67,7 +133,7 @@ class Segment:
         txt_rect = txt.get_rect(center=screen_pos)
         surface.blit(txt, txt_rect)
 
-    def draw_cars(self, surface, world_to_screen, font, zoom, W, H, car_length_const=4.5 ,selected_car=None):
+    def draw_cars(self, surface, world_to_screen, font, zoom, W, H, car_length_const=4.5 ,selected_car=None, overlays=True):
         if self.length <= 0:
             return
         s1 = world_to_screen(self.start)
@@ -117,7 +183,7 @@ class Segment:
                 rotated.append((int(round(rx)), int(round(ry))))
 
             # Is this the selected car?
-            if selected_car is not None and car == selected_car:
+            if overlays and selected_car is not None and car == selected_car:
                 # draw circle around car
                 center_x = int(round(sx))
                 center_y = int(round(sy))
@@ -241,7 +307,7 @@ class Segment:
                     # surface.blit(idx_txt, (cx + 2, cy - 10))
 
             # HEADLIGHT / BEAM (scaled)
-            if car.v > 2.0:
+            if overlays and car.v > 2.0:
                 front_x = sx + half_len * cos_a
                 front_y = sy + half_len * sin_a
                 beam_length_m = 6.0 + car.v * 0.6
@@ -263,9 +329,16 @@ class Segment:
                         front_x + dist * cos_a + width * sin_a,
                         front_y + dist * sin_a - width * cos_a
                     )
-                    tri_surf = pygame.Surface((W, H), pygame.SRCALPHA)
-                    pygame.draw.polygon(tri_surf, color, [p1, p2, p3])
-                    surface.blit(tri_surf, (0, 0))
+                    # alpha surface only as large as the triangle's bounding box
+                    ox = math.floor(min(p1[0], p2[0], p3[0]))
+                    oy = math.floor(min(p1[1], p2[1], p3[1]))
+                    bw = math.ceil(max(p1[0], p2[0], p3[0])) - ox + 1
+                    bh = math.ceil(max(p1[1], p2[1], p3[1])) - oy + 1
+                    if ox >= W or oy >= H or ox + bw <= 0 or oy + bh <= 0:
+                        continue
+                    tri_surf = pygame.Surface((bw, bh), pygame.SRCALPHA)
+                    pygame.draw.polygon(tri_surf, color, [(p[0] - ox, p[1] - oy) for p in (p1, p2, p3)])
+                    surface.blit(tri_surf, (ox, oy))
 
 
 class Junction:
@@ -275,6 +348,8 @@ class Junction:
         self.outputs = outputs if isinstance(outputs, list) else [outputs]
         self.mode = mode
         self.counter = 0
+        self.signal = None  # signals.SignalController when signalised
+        self.rng = random   # stream for 'random' mode, see sim.seed_streams
 
     def draw_junction(self, surface, world_to_screen, zoom, road_width=40, font=None):
         """Draw junction box and label above/right of the junction."""
@@ -305,6 +380,19 @@ class Junction:
                             (center[0] + line_len, center[1] - line_len),
                             (center[0] - line_len, center[1] + line_len), max(1, int(3 * zoom)))
 
+        # Signal heads at each input's stop line
+        if self.signal is not None:
+            signal_colors = {'green': (0, 220, 0), 'amber': (255, 190, 0), 'red': (230, 0, 0)}
+            head_r = max(2, int(road_width * 0.15 * zoom))
+            for inp in self.inputs:
+                if inp.length <= 0:
+                    continue
+                back = min(inp.length, road_width * 0.8)
+                pos = (inp.end[0] - inp.dir[0] * back, inp.end[1] - inp.dir[1] * back)
+                color = signal_colors.get(inp.signal_state, (120, 120, 120))
+                pygame.draw.circle(surface, color, world_to_screen(pos), head_r)
+                pygame.draw.circle(surface, (0, 0, 0), world_to_screen(pos), head_r, 1)
+
         # Draw label above and to the right of junction box
         if font is not None:
             label_x = top_left[0] + rect_w + 5
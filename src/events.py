@@ -0,0 +1,154 @@
+import heapq
+import math
+
+# Scheduled scenario events (incidents, closures, parameter changes).
+#
+# Events are listed in the state's 'events' section, each with the time it
+# fires in seconds after the scenario starts (or an exact "tick") and an
+# action with its arguments:
+#
+#   {"time": 600, "action": "close_segment", "segment": "east"}
+#   {"time": 900, "action": "set_speed_limit", "segment": "west", "value": 5.0}
+#   {"time": 1200, "action": "open_segment", "segment": "east"}
+#   {"time": 3600, "action": "set_spawn_rate", "value": 1.5}
+#   {"time": 3600, "action": "set_demand", "origin": "a", "destination": "b", "rate": 0.3}
+#   {"tick": 20000, "action": "set_junction_mode", "junction": "split", "mode": "random"}
+#
+# Pending events sit in a heap keyed by (tick, order added), so adding or
+# firing one is O(log n) and events due at the same tick fire in the order
+# they were listed. sim.step compares the tick with next_tick once per tick
+# and only calls run_due() when something is due; events fire at the start of
+# their tick, before signals and car updates, so runs are reproducible
+# whatever the frame rate. Every event ever added (also at run time through
+# the control server) is kept in `events` and written back with the state, so
+# a saved scenario replays them; `log` records when each one fired.
+
+
+class EventScheduler:
+    def __init__(self, step, start_tick=0):
+        self.step = step
+        self.start_tick = start_tick  # sim tick at which the scenario started (event time 0)
+        self.heap = []      # (tick, order, event)
+        self.order = 0
+        self.events = []    # every event definition in the order added
+        self.log = []       # (tick, event) of the events that fired
+        self.next_tick = math.inf
+
+    def tick_of(self, event):
+        if 'tick' in event:
+            return self.start_tick + int(event['tick'])
+        return self.start_tick + int(round(float(event['time']) / self.step))
+
+    def add(self, event, now_tick=None):
+        """Validate and schedule `event`; raises ValueError for bad events or (with now_tick) past ones."""
+        if not isinstance(event, dict) or ('time' not in event and 'tick' not in event):
+            raise ValueError(f'event needs a "time" or "tick": {event!r}')
+        action = ACTIONS.get(event.get('action'))
+        if action is None:
+            raise ValueError(f"unknown event action {event.get('action')!r} (known: {', '.join(ACTIONS)})")
+        missing = [k for k in action[0] if k not in event]
+        if missing:
+            raise ValueError(f"event {event['action']!r} needs {', '.join(missing)}")
+        _check_targets(event)
+        tick = self.tick_of(event)
+        if now_tick is not None and tick < now_tick:
+            raise ValueError(f'event time {event.get("time", event.get("tick"))} has already passed')
+        event = dict(event)
+        self.events.append(event)
+        heapq.heappush(self.heap, (tick, self.order, event))
+        self.order += 1
+        self.next_tick = self.heap[0][0]
+        return tick
+
+    def run_due(self, tick):
+        """Fire every event due at or before `tick`."""
+        heap = self.heap
+        while heap and heap[0][0] <= tick:
+            _, _, event = heapq.heappop(heap)
+            try:
+                ACTIONS[event['action']][1](event)
+            except (KeyError, ValueError) as e:
+                # the network may have been edited since the event was scheduled
+                print(f"Skipped event {event['action']} at tick {tick}: {e}")
+                continue
+            self.log.append((tick, event))
+        self.next_tick = heap[0][0] if heap else math.inf
+
+    def pending(self):
+        return [event for _, _, event in sorted(self.heap)]
+
+
+def _check_targets(event):
+    import sim
+    if 'segment' in event and event['segment'] not in sim.segments:
+        raise ValueError(f"event {event['action']!r}: unknown segment {event['segment']!r}")
+    if 'junction' in event and not any(j.id == event['junction'] for j in sim.junctions):
+        raise ValueError(f"event {event['action']!r}: unknown junction {event['junction']!r}")
+    if 'mode' in event and event['mode'] not in sim.JUNCTION_MODES:
+        raise ValueError(f"event {event['action']!r}: mode must be one of {sim.JUNCTION_MODES}")
+    for key in ('origin', 'destination'):
+        if key in event and event[key] not in sim.segments:
+            raise ValueError(f"event {event['action']!r}: unknown {key} {event[key]!r}")
+
+
+def _segment(event):
+    import sim
+    seg = sim.segments.get(event['segment'])
+    if seg is None:
+        raise KeyError(f"unknown segment {event['segment']!r}")
+    return seg
+
+
+def _close(event):
+    import sim
+    sim.set_closed(_segment(event), True)
+
+
+def _open(event):
+    import sim
+    sim.set_closed(_segment(event), False)
+
+
+def _speed_limit(event):
+    import sim
+    seg = _segment(event)
+    seg.speed_limit = float(event['value'])
+    if sim.route_table is not None and not seg.closed:
+        sim.route_table.update_weights({seg.id: sim.routing.free_flow_time(seg)})
+
+
+def _spawn_rate(event):
+    import sim
+    sim.spawn_rate = float(event['value'])
+
+
+def _demand(event):
+    import sim
+    for od in sim.demand:
+        if od['origin'] == event['origin'] and od['destination'] == event['destination']:
+            od['rate'] = float(event['rate'])
+            return
+    sim.demand.append({'origin': event['origin'], 'destination': event['destination'],
+                       'rate': float(event['rate']), 'timer': 0.0, 'backlog': 0})
+
+
+def _junction_mode(event):
+    import sim
+    if event['mode'] not in sim.JUNCTION_MODES:
+        raise ValueError(f"mode must be one of {sim.JUNCTION_MODES}")
+    for j in sim.junctions:
+        if j.id == event['junction']:
+            j.mode = event['mode']
+            return
+    raise KeyError(f"unknown junction {event['junction']!r}")
+
+
+# action -> (required fields, handler)
+ACTIONS = {
+    'close_segment': (('segment',), _close),
+    'open_segment': (('segment',), _open),
+    'set_speed_limit': (('segment', 'value'), _speed_limit),
+    'set_spawn_rate': (('value',), _spawn_rate),
+    'set_demand': (('origin', 'destination', 'rate'), _demand),
+    'set_junction_mode': (('junction', 'mode'), _junction_mode),
+}
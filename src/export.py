@@ -0,0 +1,244 @@
+import argparse
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+# Headless video / frame-sequence export.
+#
+#   python src/export.py --seconds 600 --every 4 --out frames/
+#   python src/export.py --seconds 600 --every 4 --out run.mp4
+#
+# Runs the sim as fast as it will go with the SDL dummy driver and draws every
+# Nth tick into an off-screen surface with the viewer's own draw functions
+# (render.py). Raw RGB frames are copied into a ring of slots in shared memory
+# and encoded by separate processes: the stepping loop only copies bytes and
+# hands over a slot number, and waits only if every slot is still queued
+# (the ring provides back-pressure instead of dropping frames).
+#
+# Output ending in a video extension is piped into ffmpeg (one encoder, in
+# frame order); anything else is a directory of frame_000000.png files, which
+# several encoder processes can write in parallel. Without ffmpeg on PATH a
+# video request falls back to PNG frames next to the requested file.
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+VIDEO_EXTS = ('.mp4', '.mkv', '.mov', '.webm', '.avi')
+ROAD_WIDTH = 40
+BACKGROUND = (30, 30, 30)
+
+
+def ffmpeg_command(path, W, H, fps):
+    exe = shutil.which('ffmpeg')
+    if exe is None:
+        return None
+    return [exe, '-loglevel', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{W}x{H}', '-r', str(fps), '-i', '-',
+            '-pix_fmt', 'yuv420p', path]
+
+
+def _encoder(shm_name, W, H, jobs, free, out_dir, ffmpeg_cmd):
+    """Encoder process: take (slot, frame number) jobs until None, give each slot back when done."""
+    frame_bytes = W * H * 3
+    shm = shared_memory.SharedMemory(name=shm_name)
+    pipe = None
+    if ffmpeg_cmd is not None:
+        pipe = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE)
+    else:
+        import pygame
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            slot, number = job
+            start = slot * frame_bytes
+            if pipe is not None:
+                pipe.stdin.write(shm.buf[start:start + frame_bytes])
+            else:
+                frame = pygame.image.frombuffer(bytes(shm.buf[start:start + frame_bytes]), (W, H), 'RGB')
+                pygame.image.save(frame, os.path.join(out_dir, f'frame_{number:06d}.png'))
+            free.put(slot)
+    finally:
+        if pipe is not None:
+            pipe.stdin.close()
+            pipe.wait()
+        shm.close()
+
+
+class FrameRing:
+    """Shared-memory ring of raw RGB frames feeding encoder processes."""
+
+    def __init__(self, W, H, slots, out_dir=None, ffmpeg_cmd=None, encoders=1):
+        self.W = W
+        self.H = H
+        self.frame_bytes = W * H * 3
+        if ffmpeg_cmd is not None:
+            encoders = 1  # ffmpeg needs the frames in order
+        ctx = mp.get_context('spawn')
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * self.frame_bytes)
+        self.jobs = ctx.Queue()
+        self.free = ctx.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.stalls = 0
+        self.wait_seconds = 0.0
+        self.frames = 0
+        self.workers = [ctx.Process(target=_encoder, args=(self.shm.name, W, H, self.jobs, self.free,
+                                                           out_dir, ffmpeg_cmd), daemon=True)
+                        for _ in range(encoders)]
+        for w in self.workers:
+            w.start()
+
+    def put(self, surface):
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            self.stalls += 1  # every slot is still waiting for an encoder
+            t0 = time.perf_counter()
+            slot = None
+            while slot is None:
+                try:
+                    slot = self.free.get(timeout=1.0)
+                except queue.Empty:
+                    if not all(w.is_alive() for w in self.workers):
+                        raise RuntimeError('frame encoder process exited')
+            self.wait_seconds += time.perf_counter() - t0
+        start = slot * self.frame_bytes
+        self.shm.buf[start:start + self.frame_bytes] = _tobytes(surface)
+        self.jobs.put((slot, self.frames))
+        self.frames += 1
+
+    def close(self):
+        for _ in self.workers:
+            self.jobs.put(None)
+        for w in self.workers:
+            w.join()
+            if w.exitcode:
+                print(f'encoder process exited with code {w.exitcode}')
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _tobytes(surface):
+    import pygame
+    if hasattr(pygame.image, 'tobytes'):
+        return pygame.image.tobytes(surface, 'RGB')
+    return pygame.image.tostring(surface, 'RGB')
+
+
+def export(config, out, seconds, every=2, size=(1280, 720), fps=30, slots=8, encoders=None,
+           heatmap_mode=None, use_view=False, hud=True):
+    import pygame
+    import heatmap
+    import render
+    import sim
+
+    pygame.init()
+    W, H = size
+    surface = pygame.Surface((W, H))
+    font = pygame.font.SysFont(None, 20)
+    label_font = pygame.font.SysFont(None, 16)
+
+    sim.reset_clock()
+    sim.build_from_config(config)
+    view = config.get('current_state', {}).get('view', {})
+    if use_view and 'zoom' in view:
+        zoom, pan_x, pan_y = view['zoom'], view.get('pan_x', 0.0), view.get('pan_y', 0.0)
+    else:
+        zoom, pan_x, pan_y = render.fit_view(sim.segments, W, H)
+
+    def world_to_screen(pt):
+        return (int(pt[0] * zoom + pan_x), int(pt[1] * zoom + pan_y))
+
+    ffmpeg_cmd = None
+    out_dir = out
+    if out.lower().endswith(VIDEO_EXTS):
+        ffmpeg_cmd = ffmpeg_command(out, W, H, fps)
+        if ffmpeg_cmd is None:
+            out_dir = os.path.splitext(out)[0] + '_frames'
+            print(f'ffmpeg not found, writing PNG frames to {out_dir}/')
+    if ffmpeg_cmd is None:
+        os.makedirs(out_dir, exist_ok=True)
+
+    if encoders is None:
+        encoders = max(1, (os.cpu_count() or 2) - 1)
+    heat = heatmap.Heatmap() if heatmap_mode else None
+    ring = FrameRing(W, H, slots, out_dir=out_dir, ffmpeg_cmd=ffmpeg_cmd, encoders=encoders)
+    ticks = int(round(seconds / sim.STEP))
+    render_s = 0.0
+    wall_start = time.perf_counter()
+    try:
+        for tick in range(ticks):
+            sim.spawn_default(sim.STEP)
+            sim.step()
+            if heat is not None:
+                heat.update(sim.segments, sim.STEP, sim.sim_time)
+            if tick % every:
+                continue
+            t0 = time.perf_counter()
+            surface.fill(BACKGROUND)
+            render.sync_meso_positions()
+            render.draw_world(surface, world_to_screen, zoom, font, label_font, ROAD_WIDTH, sim.CAR_LENGTH,
+                              show_labels=False, jams=sim.jam_detector,
+                              span_colors=heat.colors(sim.segments, heatmap_mode) if heat is not None else None)
+            if hud:
+                cars = sum(len(s.cars) for s in sim.segments.values())
+                surface.blit(font.render(f'Time: {sim.sim_time:.1f}s  Cars: {cars}', True, (255, 255, 255)), (10, 10))
+            render_s += time.perf_counter() - t0
+            ring.put(surface)
+    finally:
+        ring.close()
+        if sim.safety is not None:
+            sim.safety.close()
+        if sim.jam_detector is not None:
+            sim.jam_detector.close()
+        if sim.emissions is not None:
+            sim.emissions.close()
+        if sim.gridlock is not None:
+            sim.gridlock.close()
+    wall = time.perf_counter() - wall_start
+    return {'frames': ring.frames, 'sim_seconds': sim.sim_time, 'wall_seconds': wall,
+            'render_seconds': render_s, 'ring_stalls': ring.stalls, 'ring_wait_seconds': ring.wait_seconds,
+            'output': out if ffmpeg_cmd is not None else out_dir}
+
+
+def main(argv=None):
+    import config as cfg
+    import sim
+
+    p = argparse.ArgumentParser(description='Render a scenario headless to a PNG sequence or video.')
+    p.add_argument('--config', default=None, help='scenario JSON (default: config.json)')
+    p.add_argument('--out', default='frames', help='output directory for PNGs, or a video file (needs ffmpeg)')
+    p.add_argument('--seconds', type=float, default=120.0, help='simulated seconds to export')
+    p.add_argument('--every', type=int, default=2, help='render every Nth tick')
+    p.add_argument('--size', default='1280x720', help='frame size WxH')
+    p.add_argument('--fps', type=int, default=30, help='video frame rate')
+    p.add_argument('--slots', type=int, default=8, help='frames in the shared-memory ring')
+    p.add_argument('--encoders', type=int, default=None, help='PNG encoder processes (default: CPUs - 1)')
+    p.add_argument('--heatmap', choices=('density', 'speed'), default=None)
+    p.add_argument('--view', action='store_true', help="use the saved view instead of fitting the network")
+    p.add_argument('--no-hud', action='store_true')
+    args = p.parse_args(argv)
+
+    config = cfg.load_config(args.config)
+    if config is None:
+        sys.exit(1)
+    W, H = (int(x) for x in args.size.lower().split('x'))
+    r = export(config, args.out, args.seconds, every=max(1, args.every), size=(W, H), fps=args.fps,
+               slots=max(1, args.slots), encoders=args.encoders and max(1, args.encoders), heatmap_mode=args.heatmap,
+               use_view=args.view, hud=not args.no_hud)
+    speed = r['sim_seconds'] / max(1e-9, r['wall_seconds'])
+    playback = max(1, args.every) * sim.STEP * args.fps
+    print(f"{r['frames']} frames -> {r['output']}")
+    print(f"{r['sim_seconds']:.1f} sim s in {r['wall_seconds']:.1f} wall s ({speed:.1f}x real time), "
+          f"render {r['render_seconds']:.1f} s, waited {r['ring_wait_seconds']:.1f} s on encoders; "
+          f"plays back at {playback:.1f}x at {args.fps} fps")
+
+
+if __name__ == '__main__':
+    main()
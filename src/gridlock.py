@@ -0,0 +1,301 @@
+import csv
+from collections import deque
+
+# Gridlock detection and resolution, plus sleeping of blocked segments.
+#
+# When the front car of a segment cannot enter the segment it wants at a
+# junction (sim.transfer_at_junction puts it back at the end), the segment
+# waits for that output. These wait-for edges form a graph in which every
+# segment waits for at most one other, so a new cycle can only appear when an
+# edge is added or changed, and it is found by walking the chain from there.
+# A transfer out of a segment removes its edge.
+#
+# A blocked front car is put back just before the end of its segment every
+# time it reaches the end, so it never quite stops; a segment counts as
+# stopped when all its other cars stand. A cycle is a gridlock once its
+# segments have waited for each other for CONFIRM seconds and are stopped.
+# It is then reported (a 'start' and an 'end' row in the CSV) and resolved as
+# configured:
+#
+#   - 'teleport': the front car of the segment blocked longest is moved to the
+#     nearest segment downstream with room at its start (SUMO-style teleport),
+#     or taken out of the network if there is none within TELEPORT_DEPTH
+#   - 'hold': no automatic spawns (default spawning, OD demand) into the
+#     segments upstream of the cycle until it clears
+#   - 'none': only report
+#
+# A blocked, stopped segment is put to sleep: the segment update and the
+# junction skip it until its car count changes or the rear of one of its
+# outputs moves on by WAKE_MOVE or leaves. It is only put to sleep after two
+# ticks in a row without such a change, so its cars already saw the rears
+# they will stand behind. Sleeping sets its cars' speeds to zero: the front
+# car stands at the end instead of being put back there tick after tick, and
+# the queue stops creeping towards its equilibrium gaps.
+
+CONFIRM = 10.0        # s a cycle must stay blocked and stopped before it is a gridlock
+STOP_SPEED = 0.01     # m/s, slower cars count as standing (queues creep towards their gaps forever)
+WAKE_MOVE = 0.1       # m the rear of an output must move on to wake a segment waiting for it
+SAMPLE_EVERY = 1.0    # s between checks of the cycles found
+TELEPORT_DEPTH = 20   # segments searched downstream for room to teleport into
+RECENT_EVENTS = 200   # events kept in memory for display
+RESOLUTIONS = ('none', 'teleport', 'hold')
+
+FIELDS = ['time', 'event', 'gridlock', 'resolution', 'duration_s', 'cars', 'teleported', 'segments']
+
+
+class Gridlock:
+    def __init__(self, gid, segs, now):
+        self.id = gid
+        self.segments = segs   # the cycle, each segment waiting for the next
+        self.found = now
+        self.start = None      # time it was confirmed
+        self.cars = 0
+        self.teleported = 0
+
+
+class GridlockMonitor:
+    def __init__(self, path=None, resolve='teleport', confirm=CONFIRM, sleep=True, sample_every=SAMPLE_EVERY):
+        if resolve not in RESOLUTIONS:
+            raise ValueError(f"unknown gridlock resolution {resolve!r} (expected one of {', '.join(RESOLUTIONS)})")
+        self.resolve = resolve
+        self.confirm = confirm
+        self.sleep = sleep
+        self.sample_every = sample_every
+        self.next_sample = 0.0
+        self.now = 0.0
+        self.waits = {}        # segment -> output its front car waits for
+        self.since = {}        # segment -> time its front car was first blocked
+        self.cycles = {}       # frozenset of segment ids -> Gridlock (found or confirmed)
+        self.held = set()      # segment ids automatic spawns skip ('hold')
+        self.asleep = {}       # segment -> (car count, rear bumper of each output) when it fell asleep
+        self._drowsy = {}      # segment -> the same, from the last tick, for blocked stopped segments
+        self.next_id = 1
+        self.reported = 0
+        self.teleported = 0    # cars moved downstream
+        self.removed = 0       # cars taken out for lack of room downstream
+        self.recent = deque(maxlen=RECENT_EVENTS)
+        self._file = None
+        self._writer = None
+        if path:
+            self._file = open(path, 'w', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(FIELDS)
+
+    # --- wait-for graph (called from sim.transfer_at_junction) ---
+
+    def block(self, seg, output, now):
+        """The front car of `seg` could not enter `output`."""
+        if seg not in self.since:
+            self.since[seg] = now
+        if self.waits.get(seg) is output:
+            return
+        self.waits[seg] = output
+        cycle = self._cycle(seg)
+        if cycle is not None:
+            key = frozenset(s.id for s in cycle)
+            if key not in self.cycles:
+                self.cycles[key] = Gridlock(None, cycle, now)
+
+    def clear(self, seg):
+        """A car left `seg` at its end."""
+        if self.waits.pop(seg, None) is not None:
+            del self.since[seg]
+            self._drowsy.pop(seg, None)
+            self.wake(seg)
+
+    def holds(self, seg):
+        """True while automatic spawns into `seg` are held back by a gridlock."""
+        return seg.id in self.held
+
+    def _cycle(self, start):
+        """The cycle of waiting segments through `start`, or None."""
+        path = [start]
+        seen = {start}
+        seg = self.waits[start]
+        while seg is not start:
+            if seg is None or seg in seen:
+                return None
+            path.append(seg)
+            seen.add(seg)
+            seg = self.waits.get(seg)
+        return path
+
+    # --- sleeping ---
+
+    def wake(self, seg):
+        if self.asleep.pop(seg, None) is not None:
+            seg.asleep = False
+
+    def wake_all(self):
+        """Wake every segment and drop edges to removed segments (the network was edited)."""
+        import sim
+        for seg in list(self.asleep):
+            self.wake(seg)
+        self._drowsy.clear()
+        for seg, out in list(self.waits.items()):
+            if seg.id not in sim.segments or out.id not in sim.segments:
+                self.clear(seg)
+
+    @staticmethod
+    def _stopped(seg):
+        """True when every car on `seg` but the (blocked) front one is slower than STOP_SPEED."""
+        moving = [c for c in seg.cars if c.v >= STOP_SPEED]
+        return not moving or (len(moving) == 1 and moving[0] is max(seg.cars, key=lambda c: c.pos))
+
+    @staticmethod
+    def _rears(seg):
+        """Rear bumper position on each output of `seg` (inf when empty)."""
+        return [min(c.pos - c.length for c in out.cars) if out.cars else float('inf') for out in seg.outputs]
+
+    @staticmethod
+    def _moved_on(seg, rears):
+        """True when the rear of an (awake) output of `seg` moved more than WAKE_MOVE past `rears`.
+        Cars entering an output only move its rear back, so only this can free the queue."""
+        return any(not out.asleep and (min(c.pos - c.length for c in out.cars) if out.cars else float('inf'))
+                   > rear + WAKE_MOVE for out, rear in zip(seg.outputs, rears))
+
+    def _update_sleep(self):
+        for seg, (count, rears) in list(self.asleep.items()):
+            if seg.meso or len(seg.cars) != count or self._moved_on(seg, rears):
+                self.wake(seg)
+        for seg in self.waits:
+            if seg.asleep or seg.meso:
+                continue
+            if not self._stopped(seg):
+                self._drowsy.pop(seg, None)
+                continue
+            last = self._drowsy.get(seg)
+            if last is not None and last[0] == len(seg.cars) and not self._moved_on(seg, last[1]):
+                del self._drowsy[seg]
+                self.asleep[seg] = (len(seg.cars), self._rears(seg))
+                seg.asleep = True
+                for car in seg.cars:
+                    car.v = 0.0
+                seg.car_v = [0.0] * len(seg.cars)   # idling, for emissions.py
+                seg.car_a = [0.0] * len(seg.cars)
+            else:
+                self._drowsy[seg] = (len(seg.cars), self._rears(seg))
+
+    # --- per tick ---
+
+    def on_tick(self, now):
+        """Wake / put segments to sleep, and check the cycles every sample_every seconds."""
+        self.now = now
+        if self.sleep:
+            self._update_sleep()
+        if now + 1e-9 < self.next_sample or not self.cycles:
+            return
+        self.next_sample = now + self.sample_every
+        for key, lock in list(self.cycles.items()):
+            segs = lock.segments
+            if not all(self.waits.get(s) is segs[(i + 1) % len(segs)] for i, s in enumerate(segs)):
+                del self.cycles[key]
+                if lock.start is not None:
+                    self._event(now, 'end', lock)
+                    self._update_held()
+                continue
+            if lock.start is None and now - lock.found >= self.confirm \
+                    and all(s.asleep or self._stopped(s) for s in segs):
+                lock.id = self.next_id
+                self.next_id += 1
+                lock.start = now
+                lock.cars = sum(len(s.cars) for s in segs)
+                self.reported += 1
+                self._event(now, 'start', lock)
+                if self.resolve == 'hold':
+                    self._update_held()
+            if lock.start is not None and self.resolve == 'teleport':
+                self._teleport(lock, now)
+        if self._file is not None:
+            self._file.flush()
+
+    # --- resolution ---
+
+    def _teleport(self, lock, now):
+        import sim
+        seg = min(lock.segments, key=lambda s: self.since[s])
+        if not seg.cars:
+            return
+        car = max(seg.cars, key=lambda c: c.pos)
+        target = self._room_downstream(seg, car, {s.id for s in lock.segments})
+        seg.remove_car(car)
+        sim.record_exit(seg, car)
+        self.clear(seg)
+        lock.teleported += 1
+        if target is None:
+            self.removed += 1
+            if sim.emissions is not None:
+                sim.emissions.record_arrival(car, now)
+            car.segment = None
+            return
+        self.teleported += 1
+        target.add_car(car, 0)
+        car.v = 0.0
+        car.seg_entry_time = now
+        car.route = None   # re-planned from the destination at the next junction
+        car.route_idx = 0
+        if target.meso:
+            sim.meso.schedule(target, car, now)
+
+    @staticmethod
+    def _room_downstream(seg, car, skip):
+        """Nearest open segment downstream of `seg`, outside `skip`, with room for `car` at its start."""
+        frontier = list(seg.outputs)
+        seen = {seg.id}
+        for _ in range(TELEPORT_DEPTH):
+            nxt = []
+            for out in frontier:
+                if out.id in seen:
+                    continue
+                seen.add(out.id)
+                if out.id not in skip and not out.closed:
+                    rear = min(out.cars, key=lambda c: c.pos) if out.cars else None
+                    if rear is None or rear.pos >= car.length + rear.length + car.s0:
+                        return out
+                nxt.extend(out.outputs)
+            if not nxt:
+                break
+            frontier = nxt
+        return None
+
+    def _update_held(self):
+        """Segments upstream of a confirmed gridlock, through the route table's predecessor lists."""
+        import sim
+        held = set()
+        if self.resolve == 'hold' and sim.route_table is not None:
+            stack = [s.id for lock in self.cycles.values() if lock.start is not None for s in lock.segments]
+            while stack:
+                sid = stack.pop()
+                if sid in held:
+                    continue
+                held.add(sid)
+                stack.extend(sim.route_table.pred.get(sid, ()))
+        self.held = held
+
+    # --- output ---
+
+    def active(self):
+        """Confirmed gridlocks that have not cleared yet."""
+        return [lock for lock in self.cycles.values() if lock.start is not None]
+
+    def _event(self, now, kind, lock):
+        row = {
+            'time': round(now, 2), 'event': kind, 'gridlock': lock.id, 'resolution': self.resolve,
+            'duration_s': round(now - lock.start, 1), 'cars': lock.cars, 'teleported': lock.teleported,
+            'segments': ' '.join(s.id for s in lock.segments),
+        }
+        self.recent.append(row)
+        if self._writer is not None:
+            self._writer.writerow([row[f] for f in FIELDS])
+
+    def close(self):
+        """End the active gridlocks, wake all segments and close the CSV."""
+        for lock in self.active():
+            self._event(self.now, 'end', lock)
+        self.cycles = {}
+        self.held = set()
+        for seg in list(self.asleep):
+            self.wake(seg)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,119 @@
+import math
+
+import numpy as np
+
+import meso
+
+# Density / speed heatmap over the roads.
+#
+# Each segment owns a fixed run of bins (about BIN_LENGTH meters each, at most
+# MAX_BINS) inside one flat array for the whole network. Every tick the
+# arrays decay by exp(-STEP / TAU) and each car adds to the bin it is in, so
+# the values are exponentially time-averaged occupancy and speed. Updating is
+# one pass over the cars plus two bincounts; drawing colours sub-spans of
+# each road in Segment.draw_road, so it costs per segment, not per car.
+
+BIN_LENGTH = 10.0    # m
+MAX_BINS = 64
+TAU = 30.0           # s, averaging time constant
+MAX_DENSITY = 150.0  # veh/km shown as full red
+MODES = ('off', 'density', 'speed')
+
+
+def _palette():
+    """256 colours from green (0) through yellow to red (255)."""
+    colors = []
+    for i in range(256):
+        t = i / 255.0
+        if t < 0.5:
+            colors.append((int(510 * t), 200, 0))
+        else:
+            colors.append((255, int(200 * (2 - 2 * t)), 0))
+    return colors
+
+
+PALETTE = _palette()
+
+
+class Heatmap:
+    def __init__(self, bin_length=BIN_LENGTH, max_bins=MAX_BINS, tau=TAU):
+        self.bin_length = bin_length
+        self.max_bins = max_bins
+        self.tau = tau
+        self._segments = None
+        self._n_segments = 0
+        self.layout = {}   # segment id -> (first bin, bin count, bin length in m)
+        self.count = np.zeros(0)
+        self.speed = np.zeros(0)
+        self.bin_len = np.zeros(0)
+
+    def rebuild(self, segments):
+        """Lay out bins for the current segments (call after topology changes)."""
+        self.layout = {}
+        total = 0
+        for sid, seg in segments.items():
+            n = max(1, min(self.max_bins, int(math.ceil(seg.length / self.bin_length))))
+            self.layout[sid] = (total, n, seg.length / n if seg.length > 0 else 1.0)
+            total += n
+        self.count = np.zeros(total)
+        self.speed = np.zeros(total)
+        self.bin_len = np.empty(total)
+        for start, n, bl in self.layout.values():
+            self.bin_len[start:start + n] = bl
+        self._segments = segments
+        self._n_segments = len(segments)
+
+    def resize(self, seg):
+        """Keep a segment's bins after its length changed (same count, new bin length)."""
+        if seg.id not in self.layout:
+            return
+        start, n, _ = self.layout[seg.id]
+        bl = seg.length / n if seg.length > 0 else 1.0
+        self.layout[seg.id] = (start, n, bl)
+        self.bin_len[start:start + n] = bl
+
+    def update(self, segments, step, now=None):
+        """Decay and add this tick's cars. Rebuilds if the segment set changed."""
+        if segments is not self._segments or len(segments) != self._n_segments:
+            self.rebuild(segments)
+        decay = math.exp(-step / self.tau)
+        self.count *= decay
+        self.speed *= decay
+
+        idx = []
+        speeds = []
+        layout = self.layout
+        for sid, seg in segments.items():
+            if not seg.cars:
+                continue
+            if seg.meso and now is not None:
+                meso.sync_positions(seg, now)
+            start, n, blen = layout[sid]
+            last = start + n - 1
+            for car in seg.cars:
+                idx.append(min(start + int(car.pos / blen), last))
+                speeds.append(car.v)
+        if idx:
+            w = 1.0 - decay
+            total = len(self.count)
+            self.count += np.bincount(idx, minlength=total) * w
+            self.speed += np.bincount(idx, weights=speeds, minlength=total) * w
+
+    def colors(self, segments, mode):
+        """Per segment id, the list of span colours for `mode` ('density' or 'speed')."""
+        if segments is not self._segments or len(segments) != self._n_segments:
+            self.rebuild(segments)
+        if mode == 'density':
+            value = self.count / self.bin_len * 1000.0 / MAX_DENSITY
+        else:
+            limits = np.empty_like(self.count)
+            for sid, (start, n, _) in self.layout.items():
+                limits[start:start + n] = max(0.1, segments[sid].speed_limit)
+            occupied = self.count > 1e-3
+            mean_v = np.where(occupied, self.speed / np.maximum(self.count, 1e-9), limits)
+            value = 1.0 - np.clip(mean_v / limits, 0.0, 1.0)
+        pal_idx = np.clip(value * 255, 0, 255).astype(np.int32).tolist()
+        out = {}
+        for sid, (start, n, _) in self.layout.items():
+            out[sid] = [PALETTE[i] for i in pal_idx[start:start + n]]
+        return out
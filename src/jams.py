@@ -0,0 +1,277 @@
+import csv
+from collections import deque
+
+# Streaming jam and stop-and-go wave detection.
+#
+# Every SAMPLE_EVERY seconds one pass over the cars finds queue pieces: runs
+# of consecutive cars below JAM_SPEED with less than MAX_GAP between them, on
+# one segment. Pieces that reach the end of a segment are joined with pieces
+# at the start of its outputs, so a jam is followed across junctions. Jams
+# are matched to the previous sample by the cars they share, which keeps
+# their identity while cars flow through them.
+#
+# For each jam the upstream end (tail, where cars join the queue) and the
+# downstream end (head, where they leave it) are tracked as fronts. Front
+# moves are measured along the road, also when a front crosses a junction,
+# and the front speed is the least-squares slope over the last HISTORY
+# samples. A negative tail speed is a shockwave moving upstream.
+#
+# Work per sample is one pass over the cars plus the queue pieces; the per
+# jam front histories are bounded deques and finished jams are written out
+# and dropped, so memory does not grow with run length.
+#
+# Jams held for MIN_DURATION with at least MIN_CARS cars are reported: a
+# 'start' and an 'end' row in the CSV, the end row with duration, maximum
+# queue length and cars, front speeds and all segments the jam touched.
+# Queues standing at a red or amber signal are reported with cause 'signal'.
+# A queue that closes a loop has no tail or head; its front speeds stay empty.
+
+JAM_SPEED = 5.0        # m/s, cars below this are queued
+MAX_GAP = 30.0         # m, largest gap inside a queue (also across junctions)
+MIN_CARS = 3
+MIN_DURATION = 10.0    # s a queue must last before it is reported
+END_GRACE = 3.0        # s a jam may go unseen before it ends
+SAMPLE_EVERY = 0.5     # s between detection passes
+HISTORY = 60           # front samples kept per jam for the speed fit
+RECENT_EVENTS = 200    # events kept in memory for display
+
+FIELDS = ['time', 'event', 'jam', 'cause', 'duration_s', 'queue_m', 'max_queue_m', 'cars', 'max_cars',
+          'tail_speed_kmh', 'head_speed_kmh', 'segments']
+
+
+class Jam:
+    def __init__(self, jid, now):
+        self.id = jid
+        self.first_seen = now
+        self.last_seen = now
+        self.reported = False
+        self.cause = 'jam'
+        self.pieces = []       # [(segment, tail pos, head pos)] from the last sample
+        self.car_ids = ()
+        self.queue_m = 0.0
+        self.max_queue_m = 0.0
+        self.max_cars = 0
+        self.segments = set()  # every segment id the jam has touched
+        self.tail = None       # (segment, pos) of the upstream front
+        self.head = None       # (segment, pos) of the downstream front
+        self.tail_offset = 0.0
+        self.head_offset = 0.0
+        self.tail_history = deque(maxlen=HISTORY)  # (time, distance moved along the road)
+        self.head_history = deque(maxlen=HISTORY)
+
+    @property
+    def tail_speed(self):
+        return _slope(self.tail_history)
+
+    @property
+    def head_speed(self):
+        return _slope(self.head_history)
+
+
+def _slope(history):
+    """Least-squares slope of (t, x) samples in m/s, or None with too little data."""
+    n = len(history)
+    if n < 3 or history[-1][0] - history[0][0] < 2.0:
+        return None
+    mt = sum(t for t, _ in history) / n
+    mx = sum(x for _, x in history) / n
+    var = sum((t - mt) ** 2 for t, _ in history)
+    return sum((t - mt) * (x - mx) for t, x in history) / var if var > 0 else None
+
+
+def _moved(old, new):
+    """Distance along the road from location `old` to `new` (segment, pos), if they are adjacent."""
+    (a, pa), (b, pb) = old, new
+    if a is b:
+        return pb - pa
+    if b in a.outputs:
+        return a.length - pa + pb
+    if a in b.outputs:
+        return pb - b.length - pa
+    return None
+
+
+class JamDetector:
+    def __init__(self, path=None, jam_speed=JAM_SPEED, sample_every=SAMPLE_EVERY):
+        self.jam_speed = jam_speed
+        self.sample_every = sample_every
+        self.next_sample = 0.0
+        self.active = {}   # jam id -> Jam
+        self.by_car = {}   # car id -> jam id, from the last sample
+        self.next_id = 1
+        self.recent = deque(maxlen=RECENT_EVENTS)
+        self.reported = 0
+        self._file = None
+        self._writer = None
+        if path:
+            self._file = open(path, 'w', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(FIELDS)
+
+    def on_tick(self, segments, now):
+        if now + 1e-9 < self.next_sample:
+            return
+        self.next_sample = now + self.sample_every
+        self._sample(segments, now)
+
+    def _sample(self, segments, now):
+        jam_speed = self.jam_speed
+        pieces = []   # [segment, tail pos, head pos, cars]
+        at_start = {}  # segment -> piece indexes touching its start
+        at_end = []
+        for seg in segments.values():
+            if seg.meso or not seg.cars:
+                continue
+            cars = sorted(seg.cars, key=lambda c: c.pos, reverse=True)
+            run = None
+            prev = None
+            for car in cars:
+                if car.v >= jam_speed:
+                    run = None
+                elif run is not None and prev.pos - prev.length - car.pos < MAX_GAP:
+                    run[3].append(car)
+                    run[1] = car.pos - car.length
+                else:
+                    run = [seg, car.pos - car.length, car.pos, [car]]
+                    pieces.append(run)
+                prev = car
+        if not pieces and not self.active:
+            return
+
+        # join pieces across junctions (union-find over piece indexes)
+        parent = list(range(len(pieces)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i, (seg, tail, head, _) in enumerate(pieces):
+            if tail < MAX_GAP:
+                at_start.setdefault(seg, []).append(i)
+            if seg.length - head < MAX_GAP:
+                at_end.append(i)
+        upstream = set()
+        downstream = set()
+        for i in at_end:
+            seg, _, head, _ = pieces[i]
+            for out in seg.outputs:
+                for j in at_start.get(out, ()):
+                    if seg.length - head + pieces[j][1] < MAX_GAP:
+                        parent[find(j)] = find(i)
+                        upstream.add(j)
+                        downstream.add(i)
+        groups = {}
+        for i in range(len(pieces)):
+            groups.setdefault(find(i), []).append(i)
+
+        # match each group to the jam most of its cars were in
+        by_car = {}
+        seen = set()
+        for members in sorted(groups.values(), key=lambda m: -sum(len(pieces[i][3]) for i in m)):
+            cars = [c for i in members for c in pieces[i][3]]
+            votes = {}
+            for c in cars:
+                jid = self.by_car.get(c.id)
+                if jid is not None and jid not in seen:
+                    votes[jid] = votes.get(jid, 0) + 1
+            if votes:
+                jam = self.active[max(votes, key=votes.get)]
+            elif len(cars) >= MIN_CARS:
+                jam = Jam(self.next_id, now)
+                self.next_id += 1
+                self.active[jam.id] = jam
+            else:
+                continue
+            seen.add(jam.id)
+            self._update(jam, [pieces[i] for i in members],
+                         [pieces[i] for i in members if i not in upstream],
+                         [pieces[i] for i in members if i not in downstream], cars, now)
+            for c in cars:
+                by_car[c.id] = jam.id
+        self.by_car = by_car
+
+        for jid in [jid for jid, jam in self.active.items() if jid not in seen]:
+            jam = self.active[jid]
+            jam.pieces = []
+            if now - jam.last_seen > END_GRACE:
+                del self.active[jid]
+                if jam.reported:
+                    self._event(now, 'end', jam)
+        if self._file is not None:
+            self._file.flush()
+
+    def _update(self, jam, pieces, tails, heads, cars, now):
+        jam.last_seen = now
+        jam.pieces = [(seg, tail, head) for seg, tail, head, _ in pieces]
+        jam.car_ids = [c.id for c in cars]
+        jam.queue_m = sum(head - tail for _, tail, head, _ in pieces)
+        jam.max_queue_m = max(jam.max_queue_m, jam.queue_m)
+        jam.max_cars = max(jam.max_cars, len(cars))
+        jam.segments.update(seg.id for seg, _, _, _ in pieces)
+        # the longest branch stands for a jam with several tails or heads; a queue
+        # around a whole loop has neither, its longest piece only marks where it is
+        longest = max(pieces, key=lambda p: len(p[3]))
+        tail = max(tails, key=lambda p: len(p[3])) if tails else longest
+        head = max(heads, key=lambda p: len(p[3])) if heads else longest
+        if tails:
+            jam.tail, jam.tail_offset = self._front(jam.tail, (tail[0], tail[1]), jam.tail_offset,
+                                                    jam.tail_history, now)
+        else:
+            jam.tail, jam.tail_offset = (tail[0], tail[1]), 0.0
+            jam.tail_history.clear()  # no front, no speed
+        if heads:
+            jam.head, jam.head_offset = self._front(jam.head, (head[0], head[2]), jam.head_offset,
+                                                    jam.head_history, now)
+        else:
+            jam.head, jam.head_offset = (head[0], head[2]), 0.0
+            jam.head_history.clear()
+        head_seg = head[0]
+        jam.cause = ('signal' if head_seg.signal_state in ('red', 'amber') and head_seg.length - head[2] < MAX_GAP
+                     else 'jam')
+        if not jam.reported and now - jam.first_seen >= MIN_DURATION and jam.max_cars >= MIN_CARS:
+            jam.reported = True
+            self.reported += 1
+            self._event(jam.first_seen, 'start', jam)
+
+    @staticmethod
+    def _front(old, new, offset, history, now):
+        if old is not None:
+            d = _moved(old, new)
+            if d is None:
+                history.clear()  # jumped to a branch that is not adjacent; restart the fit
+            else:
+                offset += d
+        history.append((now, offset))
+        return new, offset
+
+    def _event(self, now, kind, jam):
+        tail_v = jam.tail_speed
+        head_v = jam.head_speed
+        row = {
+            'time': round(now, 2), 'event': kind, 'jam': jam.id, 'cause': jam.cause,
+            'duration_s': round(jam.last_seen - jam.first_seen, 1),
+            'queue_m': round(jam.queue_m, 1), 'max_queue_m': round(jam.max_queue_m, 1),
+            'cars': len(jam.car_ids), 'max_cars': jam.max_cars,
+            'tail_speed_kmh': round(tail_v * 3.6, 1) if tail_v is not None else '',
+            'head_speed_kmh': round(head_v * 3.6, 1) if head_v is not None else '',
+            'segments': ' '.join(sorted(jam.segments)),
+        }
+        self.recent.append(row)
+        if self._writer is not None:
+            self._writer.writerow([row[f] for f in FIELDS])
+
+    def shown(self):
+        """Active jams that have been reported (for drawing)."""
+        return [jam for jam in self.active.values() if jam.reported and jam.pieces]
+
+    def close(self):
+        """End the active jams and close the CSV."""
+        for jam in list(self.active.values()):
+            if jam.reported:
+                self._event(jam.last_seen, 'end', jam)
+        self.active = {}
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,172 @@
+import math
+
+# Compiled per-segment physics kernel (optional).
+#
+# When Numba (and NumPy) are installed, update_segment() gathers a segment's
+# cars into flat arrays and runs the whole IDM update, collision detection and
+# risk classification in one compiled call, then writes the results back to
+# the Car objects. The kernel follows sim.update_cars exactly: cars are
+# processed front to back and each follower sees its leader's already updated
+# position, so both paths give the same trajectories.
+#
+# Without Numba, AVAILABLE is False and sim.step keeps using the pure Python
+# sim.update_cars. Compiled code is cached on disk (numba cache=True, next to
+# this file in __pycache__ or under NUMBA_CACHE_DIR), so only the first start
+# pays the JIT warm-up.
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    np = None
+    njit = None
+
+AVAILABLE = njit is not None
+
+ACCEL_STATES = ("accelerating", "braking", "coasting")
+RISKS = ("green", "yellow", "red")
+
+
+def _segment_kernel(pos, v, length, v0, a_max, b_max, T, s0, speed_limit,
+                    lead_s, lead_dv, step, margin,
+                    out_a, out_s, out_dv, out_s_star, out_v_free, out_state, out_risk, out_colliding):
+    n = pos.shape[0]
+    for i in range(n):
+        v_free = min(v0[i], speed_limit)
+        if i == 0:
+            s = lead_s
+            dv = lead_dv
+        else:
+            s = pos[i - 1] - pos[i] - length[i - 1]
+            dv = v[i] - v[i - 1]
+
+        # IDM
+        sqrt_ab = math.sqrt(a_max[i] * b_max[i])
+        if s <= 0:
+            a = -b_max[i]
+        else:
+            v_ratio = v[i] / v_free if v_free > 0 else 0.0
+            s_star = s0[i] + max(0.0, v[i] * T[i] + (v[i] * dv) / (2 * sqrt_ab))
+            a = a_max[i] * (1 - v_ratio ** 4 - (s_star / s) ** 2)
+            a = max(-b_max[i], min(a_max[i], a))
+
+        v_new = max(0.0, v[i] + a * step)
+        v[i] = v_new
+        pos[i] += v_new * step
+
+        if a > 0.5 * a_max[i]:
+            out_state[i] = 0
+        elif a < -0.5 * b_max[i]:
+            out_state[i] = 1
+        else:
+            out_state[i] = 2
+
+        out_colliding[i] = False
+        if i > 0 and pos[i - 1] - pos[i] - length[i - 1] < 0:
+            out_colliding[i] = True
+            out_colliding[i - 1] = True
+
+        # risk uses the updated speed, like sim.update_cars
+        if math.isinf(s):
+            out_risk[i] = 0
+            out_s_star[i] = 0.0
+        else:
+            s_star = s0[i] + max(0.0, v_new * T[i] + (v_new * dv) / (2 * sqrt_ab))
+            out_s_star[i] = s_star
+            if s <= s_star:
+                out_risk[i] = 2
+            elif s <= s_star + margin:
+                out_risk[i] = 1
+            else:
+                out_risk[i] = 0
+
+        out_a[i] = a
+        out_s[i] = s
+        out_dv[i] = dv
+        out_v_free[i] = v_free
+
+
+_compiled = njit(cache=True, fastmath=False)(_segment_kernel) if AVAILABLE else None
+
+
+def update_segment(seg, step, margin, get_leader):
+    """Compiled equivalent of sim.update_cars for one segment; returns the number of new collisions."""
+    cars = seg.cars
+    if not cars:
+        return 0
+    cars.sort(key=lambda c: c.pos, reverse=True)
+    n = len(cars)
+    lead_s, lead_dv, lead_real = get_leader(seg, 0)
+
+    f = np.float64
+    pos = np.fromiter((c.pos for c in cars), f, n)
+    v = np.fromiter((c.v for c in cars), f, n)
+    length = np.fromiter((c.length for c in cars), f, n)
+    v0 = np.fromiter((c.v0 for c in cars), f, n)
+    a_max = np.fromiter((c.a_max for c in cars), f, n)
+    b_max = np.fromiter((c.b_max for c in cars), f, n)
+    T = np.fromiter((c.T for c in cars), f, n)
+    s0 = np.fromiter((c.s0 for c in cars), f, n)
+
+    out_a = np.empty(n)
+    out_s = np.empty(n)
+    out_dv = np.empty(n)
+    out_s_star = np.empty(n)
+    out_v_free = np.empty(n)
+    out_state = np.empty(n, np.int8)
+    out_risk = np.empty(n, np.int8)
+    out_colliding = np.empty(n, np.bool_)
+
+    _compiled(pos, v, length, v0, a_max, b_max, T, s0, float(seg.speed_limit),
+              float(lead_s), float(lead_dv), float(step), float(margin),
+              out_a, out_s, out_dv, out_s_star, out_v_free, out_state, out_risk, out_colliding)
+
+    # follower/leader arrays for batched analytics (see safety.py)
+    seg.leader_s = out_s
+    seg.leader_real = np.ones(n, np.bool_)   # only the front car can follow a stop line
+    seg.leader_real[0] = lead_real
+    seg.leader_dv = out_dv
+    seg.car_v = v
+    seg.car_a = out_a
+
+    return write_back(seg, cars, pos.tolist(), v.tolist(), out_a.tolist(), out_s.tolist(), out_dv.tolist(),
+                      out_s_star.tolist(), out_v_free.tolist(), out_state.tolist(), out_risk.tolist(),
+                      out_colliding.tolist(), margin)
+
+
+def write_back(seg, cars, pos, v, a, s, dv, s_star, v_free, state, risk, colliding, margin):
+    seg_id = seg.id
+    new_collisions = 0
+    for i, car in enumerate(cars):
+        if colliding[i] and not car.colliding:
+            new_collisions += 1
+        car.pos = pos[i]
+        car.v = v[i]
+        car.a = a[i]
+        car.accel_state = ACCEL_STATES[state[i]]
+        car.risk = RISKS[risk[i]]
+        car.colliding = colliding[i]
+        # car_meta is built from these only if somebody reads it
+        car._meta_lazy = (build_meta, (s[i], dv[i], a[i], s_star[i], v_free[i], seg_id, risk[i], margin))
+    return new_collisions
+
+
+def build_meta(s, dv, a, s_star, v_free, seg_id, risk, margin):
+    """car_meta dict in the same shape sim.update_cars writes."""
+    if s == float('inf'):
+        reason = "No leader ahead"
+    elif risk == 2:
+        reason = f"Gap {round(s, 2)}m <= Desired {round(s_star, 2)}m (too close)"
+    elif risk == 1:
+        reason = f"Gap {round(s, 2)}m in warning zone ({round(s_star, 2)}m to {round(s_star + margin, 2)}m)"
+    else:
+        reason = f"Gap {round(s, 2)}m > Safe threshold"
+    return {
+        's': s if s != float('inf') else 'inf',
+        'dv': round(dv, 2),
+        'a': round(a, 2),
+        's_star': round(s_star, 2),
+        'v_free': round(v_free, 2),
+        'segment_id': seg_id,
+        'risk_reason': reason,
+    }
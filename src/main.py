@@ -1,4 +1,4 @@
-import pygame, random, sys, math, os, hashlib, datetime
+import pygame, random, sys, math, os, hashlib, datetime, time
 import config as cfg
 pygame.init()
 
@@ -211,6 +211,25 @@ STEP = 0.05
 # Typical: 0.01–0.1 s
 # Warning: Too large → oscillation or crash | Too small → slow sim
 
+WARP_SPEEDS = (1, 2, 10, 100, None)
+# Time warp multipliers stepped with [ and ]
+# Unit: simulated seconds per wall-clock second (None = as fast as possible)
+# Meaning: 1 runs in real time; above 1 many STEP ticks run per displayed frame
+# Effect: the sim only gets WARP_BUDGET of each frame, so a multiplier the
+#         machine cannot keep up with is capped (the HUD shows what is achieved)
+
+WARP_FPS = 30
+# Render rate while warping
+# Unit: frames per second
+# Meaning: fewer frames leave more wall time for ticks
+# Typical: 20–30
+
+WARP_BUDGET = 0.75
+# Share of each warped frame spent on ticks; the rest is left for drawing
+
+WARP_OVERLAYS = 10
+# From this multiplier up headlights and selection rings are skipped
+
 ROAD_WIDTH = 40
 # Visual road thickness in pixels
 # Unit: pixels
@@ -232,6 +251,19 @@ POINTS = {
 # === ENTITIES / SIM separations ===
 import entities
 import sim
+import heatmap
+import render
+import editor
+import tiles
+import jams
+import timespace
+import autosave
+
+HEATMAP_AUTO_ZOOM = 0.5
+# Below this zoom the heatmap replaces per-car drawing (density if no mode is selected)
+
+TILE_ZOOM = 0.25
+# Below this zoom roads come from the pre-rendered tile cache and the heatmap is the coarse congestion grid
 
 # Initialize sim state from config
 sim.build_from_config(config)
@@ -241,34 +273,178 @@ sim.build_from_config(config)
 segments = sim.segments
 junctions = sim.junctions
 spawn_rate = sim.spawn_rate
-spawn_timer = sim.spawn_timer
 
 # Use simulation implementations from sim module
 update_cars = sim.update_cars
 transfer_at_junction = sim.transfer_at_junction
-# spawn_rate / spawn_timer are provided by sim module
+# spawn_rate / spawn_timer are provided by sim module (see sim.spawn_default)
+
+def save_current_state():
+    """Write segments/junctions and the current view back to config.json (on the autosave thread)."""
+    # also save view
+    config.setdefault('current_state', {})
+    config['current_state'].setdefault('view', {})
+    config['current_state']['view']['zoom'] = ZOOM
+    config['current_state']['view']['pan_x'] = PAN_X
+    config['current_state']['view']['pan_y'] = PAN_Y
+    config['current_state']['view']['show_help'] = show_help
+    config['current_state']['view']['show_labels'] = show_labels
+    config['current_state']['view']['heatmap'] = heatmap_mode
+    config['current_state']['view']['minimap'] = show_minimap
+    saver.request()
+
+
+saver = autosave.AutoSaver(config, interval=config.get('autosave', {}).get('interval', 0))
+
+
+JUNCTION_MODES = sim.JUNCTION_MODES
+
+def apply_control_command(cmd):
+    """Apply a command received from the control server. Called between ticks.
+    Returns a JSON-serialisable result; raises ValueError for bad requests.
+    """
+    global is_paused
+    name = cmd['cmd']
+    if name == 'pause':
+        is_paused = True
+        return {'paused': True}
+    if name == 'resume':
+        is_paused = False
+        return {'paused': False}
+    if name == 'spawn':
+        seg_id = cmd.get('segment', 'northsouth')
+        if seg_id not in sim.segments:
+            raise ValueError(f'unknown segment {seg_id!r}')
+        sim.spawn_into(seg_id)
+        return {'segment': seg_id}
+    if name == 'set_spawn_rate':
+        rate = float(cmd['rate'])
+        if rate < 0:
+            raise ValueError('rate must be >= 0')
+        sim.spawn_rate = rate
+        return {'spawn_rate': rate}
+    if name == 'set_junction_mode':
+        mode = cmd.get('mode')
+        if mode not in JUNCTION_MODES:
+            raise ValueError(f'mode must be one of {JUNCTION_MODES}')
+        for j in sim.junctions:
+            if j.id == cmd.get('junction'):
+                j.mode = mode
+                return {'junction': j.id, 'mode': mode}
+        raise ValueError(f"unknown junction {cmd.get('junction')!r}")
+    if name == 'schedule':
+        tick = sim.scheduler.add(cmd.get('event'), now_tick=sim.sim_tick)
+        return {'tick': tick, 'pending': len(sim.scheduler.heap)}
+    if name == 'save':
+        save_current_state()
+        return {'saved': cfg.CONFIG_PATH}
+    if name == 'status':
+        return {'tick': sim.sim_tick, 'time': round(sim.sim_time, 3), 'paused': is_paused,
+                'spawn_rate': sim.spawn_rate, 'cars': sum(len(s.cars) for s in sim.segments.values())}
+    raise ValueError(f'unknown command {name!r}')
+
+
+# === CONTROL SERVER (optional, see config['control']) ===
+control_cfg = config.get('control', {})
+control_server = None
+if control_cfg.get('enabled', False):
+    import control
+    control_server = control.ControlServer(
+        host=control_cfg.get('host', '127.0.0.1'),
+        port=control_cfg.get('port', 8765),
+        path=control_cfg.get('path'),
+        queue_size=control_cfg.get('queue_size', 256),
+    )
+    control_server.start()
 
 # === MAIN LOOP ===
 accumulator = 0
-sim_tick = 0
-sim_time = 0.0
 show_help = config['current_state']['view'].get('show_help', False)
 show_labels = config['current_state']['view'].get('show_labels', True)
+heatmap_mode = config['current_state']['view'].get('heatmap', 'off')
+heat = heatmap.Heatmap()
+show_minimap = config['current_state']['view'].get('minimap', True)
+tile_cache = tiles.TileCache(ROAD_WIDTH)
+minimap = tiles.Minimap()
+trajectories = None  # timespace.TrajectoryRecorder while the time-space panel is open (T key)
+ts_panel = None
+
+# === NETWORK EDITOR (E key) ===
+net_editor = editor.Editor()
+edit_mode = False
+edit_selected = None   # segment selected for connecting
+drag_node = None       # endpoint being dragged
+new_seg_start = None   # start of a segment being drawn (Shift+drag)
+
+def on_network_edit(changed, topology):
+    # heatmap bins follow length changes; added/removed segments trigger a rebuild there
+    for sid in changed:
+        if sid in sim.segments:
+            heat.resize(sim.segments[sid])
+    tile_cache.invalidate(sim.segments, changed)
+    minimap.base = None  # redrawn on the next update
+    if trajectories is not None:
+        trajectories.forget(sim.segments)
+        ts_panel.set_chain(sim.segments, ts_panel.chain)
+
+net_editor.listeners.append(on_network_edit)
+
+def snap_to_node(screen_pt):
+    """World point under the cursor, snapped to a nearby segment endpoint."""
+    world = screen_to_world(screen_pt)
+    node = editor.nearest_node(world, editor.NODE_RADIUS / ZOOM)
+    return node if node is not None else world
 is_paused = False
 selected_car = None
+tick_ms = 0.0
+warp = 0                       # index into WARP_SPEEDS
+warp_ratio = 1.0               # achieved sim time per wall time, measured every half second
+hud_stats = None               # (tick, car count, avg speed, red cars), recomputed once per tick
+ratio_wall, ratio_sim = time.perf_counter(), sim.sim_time
 while True:
-    dt = clock.tick(60) / 1000.0
+    speed = WARP_SPEEDS[warp]
+    dt = clock.tick(60 if speed == 1 else WARP_FPS) / 1000.0
     if not is_paused:
-        accumulator += dt
-        spawn_timer += dt
+        accumulator += dt * (speed or 0)
 
     for e in pygame.event.get():
         if e.type == pygame.QUIT:
+            if control_server is not None:
+                control_server.stop()
+            if not saver.flush(10.0):
+                print("Warning: config save still running at exit")
             sys.exit()
         
         # === ZOOM ===
         if e.type == pygame.MOUSEBUTTONDOWN:
-            if e.button == 1:  # left-click: select car
+            minimap_target = minimap.hit(e.pos) if (e.button == 1 and show_minimap) else None
+            if minimap_target is not None:
+                # centre the view on the clicked point
+                PAN_X = W / 2.0 - minimap_target[0] * ZOOM
+                PAN_Y = H / 2.0 - minimap_target[1] * ZOOM
+            elif e.button == 1 and edit_mode:
+                mouse_pos = pygame.mouse.get_pos()
+                mods = pygame.key.get_mods()
+                world = screen_to_world(mouse_pos)
+                node = editor.nearest_node(world, editor.NODE_RADIUS / ZOOM)
+                if mods & pygame.KMOD_SHIFT:
+                    new_seg_start = snap_to_node(mouse_pos)
+                elif node is not None and not (mods & pygame.KMOD_CTRL):
+                    drag_node = node
+                else:
+                    hit = editor.segment_at(world, editor.NODE_RADIUS / ZOOM)
+                    if hit is not None and edit_selected is not None and (mods & pygame.KMOD_CTRL) and hit is not edit_selected:
+                        # Ctrl+click toggles the link selected -> clicked
+                        try:
+                            if hit in edit_selected.outputs:
+                                net_editor.disconnect(edit_selected.id, hit.id)
+                            else:
+                                net_editor.connect(edit_selected.id, hit.id)
+                        except ValueError as err:
+                            print(f"Edit refused: {err}")
+                    else:
+                        edit_selected = hit
+            elif e.button == 1:  # left-click: select car
                 mouse_pos = pygame.mouse.get_pos()
                 selected_car = None
                 # Check which car was clicked (iterate through segments and cars)
@@ -292,6 +468,18 @@ while True:
         if e.type == pygame.MOUSEBUTTONDOWN and e.button == 3:  # right-click
             is_panning = True
             pan_last = pygame.mouse.get_pos()
+        if e.type == pygame.MOUSEBUTTONUP and e.button == 1 and edit_mode:
+            target = snap_to_node(pygame.mouse.get_pos())
+            if drag_node is not None:
+                if target != drag_node:
+                    net_editor.move_node(drag_node, target)
+                drag_node = None
+            elif new_seg_start is not None:
+                if math.hypot(target[0] - new_seg_start[0], target[1] - new_seg_start[1]) > 1.0:
+                    net_editor.add_segment(new_seg_start, target,
+                                           connect_from=editor.segment_ending_at(new_seg_start),
+                                           connect_to=editor.segment_starting_at(target))
+                new_seg_start = None
         if e.type == pygame.MOUSEBUTTONUP and e.button == 3:
             is_panning = False
         if e.type == pygame.MOUSEMOTION and is_panning:
@@ -315,10 +503,66 @@ while True:
             if e.key == pygame.K_l:
                 show_labels = not show_labels
                 continue
+            # === HEATMAP MODE (D key): off -> density -> speed ===
+            if e.key == pygame.K_d:
+                heatmap_mode = heatmap.MODES[(heatmap.MODES.index(heatmap_mode) + 1) % len(heatmap.MODES)]
+                continue
+            # === NETWORK EDITOR (E key; Ctrl+Z / Ctrl+Y undo/redo, X split) ===
+            if e.key == pygame.K_e:
+                edit_mode = not edit_mode
+                edit_selected = drag_node = new_seg_start = None
+                continue
+            if edit_mode and e.key == pygame.K_z and (pygame.key.get_mods() & pygame.KMOD_CTRL):
+                net_editor.undo()
+                edit_selected = None
+                continue
+            if edit_mode and e.key == pygame.K_y and (pygame.key.get_mods() & pygame.KMOD_CTRL):
+                net_editor.redo()
+                edit_selected = None
+                continue
+            if edit_mode and e.key == pygame.K_x:
+                world = screen_to_world(pygame.mouse.get_pos())
+                hit = editor.segment_at(world, editor.NODE_RADIUS / ZOOM)
+                if hit is not None:
+                    net_editor.split_segment(hit.id, world)
+                continue
+            # === JAM DETECTION (J key; the state's 'jams' section also writes events to CSV) ===
+            if e.key == pygame.K_j:
+                if sim.jam_detector is None:
+                    sim.jam_detector = jams.JamDetector()
+                else:
+                    sim.jam_detector.close()
+                    sim.jam_detector = None
+                continue
+            # === TIME-SPACE DIAGRAM (T key): chain along the selected car's route, else 'timespace.chain' ===
+            if e.key == pygame.K_t:
+                if ts_panel is None:
+                    trajectories = timespace.TrajectoryRecorder(STEP)
+                    if selected_car is not None and selected_car.segment is not None:
+                        chain = timespace.default_chain(sim.segments, selected_car.segment.id, selected_car.route)
+                    else:
+                        chain = config['current_state'].get('timespace', {}).get('chain') or \
+                            timespace.default_chain(sim.segments, 'northsouth' if 'northsouth' in sim.segments
+                                                    else next(iter(sim.segments), None))
+                    ts_panel = timespace.TimeSpacePanel(trajectories, sim.segments, chain, font=label_font)
+                else:
+                    trajectories = ts_panel = None
+                continue
+            # === MINIMAP TOGGLE (M key) ===
+            if e.key == pygame.K_m:
+                show_minimap = not show_minimap
+                continue
             # === PAUSE TOGGLE (P key) ===
             if e.key == pygame.K_p:
                 is_paused = not is_paused
                 continue
+            # === TIME WARP ([ / ] keys) ===
+            if e.key in (pygame.K_LEFTBRACKET, pygame.K_RIGHTBRACKET):
+                shift = 1 if e.key == pygame.K_RIGHTBRACKET else -1
+                warp = min(max(warp + shift, 0), len(WARP_SPEEDS) - 1)
+                accumulator = 0
+                print(f"Speed: {WARP_SPEEDS[warp] or 'max'}x")
+                continue
             # === PLUS/MINUS ZOOM ===
             if e.key == pygame.K_PLUS or e.key == pygame.K_EQUALS or e.key == pygame.K_KP_PLUS:
                 zoom_at(pygame.mouse.get_pos(), 1.1)
@@ -333,21 +577,13 @@ while True:
 
             # === SAVE CONFIG (Ctrl+S) ===
             if e.key == pygame.K_s and (pygame.key.get_mods() & pygame.KMOD_CTRL):
-                sim.update_config_current_state(config)
-                # also save view
-                config.setdefault('current_state', {})
-                config['current_state'].setdefault('view', {})
-                config['current_state']['view']['zoom'] = ZOOM
-                config['current_state']['view']['pan_x'] = PAN_X
-                config['current_state']['view']['pan_y'] = PAN_Y
-                config['current_state']['view']['show_help'] = show_help
-                config['current_state']['view']['show_labels'] = show_labels
-                cfg.save_config(config)
-                print("Config saved to config.json")
+                save_current_state()
 
             # === RESET TO DEFAULT (R key) ===
             if e.key == pygame.K_r:
                 sim.reset_to_default_state(config)
+                net_editor.clear()
+                edit_selected = None
                 # reset view too
                 default = config.get('default_state', {})
                 if 'view' in default:
@@ -356,46 +592,97 @@ while True:
                     PAN_Y = default['view'].get('pan_y', PAN_Y)
                 print("Reset to default state")
 
-    if spawn_timer > 1.0 / max(1e-6, sim.spawn_rate):
-        north = sim.segments.get('northsouth')
-        if north is not None and (not north.cars or north.cars[-1].pos > 30):
-            sim.spawn_into('northsouth')
-        spawn_timer = 0
+    # === REMOTE COMMANDS (applied at the tick boundary) ===
+    if control_server is not None:
+        for cmd, reply in control_server.poll_commands():
+            try:
+                reply(apply_control_command(cmd))
+            except (KeyError, TypeError, ValueError) as err:
+                reply(error=str(err))
 
-    if not is_paused:
-        while accumulator >= STEP:
-            for seg in sim.segments.values():
-                sim.update_cars(seg, STEP)
+    # === PERIODIC AUTOSAVE (see config['autosave']) ===
+    if saver.due():
+        save_current_state()
 
-            # === TRANSFER VIA JUNCTIONS ===
-            for j in sim.junctions:
-                sim.transfer_at_junction(j)
+    heat_shown = heatmap_mode if heatmap_mode != 'off' else ('density' if ZOOM < HEATMAP_AUTO_ZOOM else None)
 
-            # Advance simulation time / ticks
-            sim_tick += 1
-            sim_time += STEP
+    if not is_paused:
+        # warped frames stop ticking at the budget; ticks that did not fit are dropped, not owed
+        deadline = None if speed == 1 else time.perf_counter() + WARP_BUDGET / WARP_FPS
+        while accumulator >= STEP or (speed is None and time.perf_counter() < deadline):
+            tick_start = time.perf_counter()
+            # default spawning into northsouth unless the scenario defines OD demand
+            sim.spawn_default(STEP)
+            # integrate cars, transfer via junctions, advance sim time / ticks
+            sim.step()
+            tick_ms = (time.perf_counter() - tick_start) * 1000.0
+            if heat_shown is not None and ZOOM >= TILE_ZOOM:
+                heat.update(sim.segments, STEP, sim.sim_time)
+            if trajectories is not None:
+                trajectories.on_tick(sim.segments, sim.sim_tick, sim.sim_time)
 
             accumulator -= STEP
 
+            if control_server is not None:
+                control_server.publish('segments', sim.sim_tick, lambda: control.segment_telemetry(sim.segments))
+                control_server.publish('car', sim.sim_tick, lambda: control.car_telemetry(selected_car))
+                control_server.publish('timing', sim.sim_tick, lambda: {
+                    'time': round(sim.sim_time, 3), 'tick_ms': round(tick_ms, 3), 'fps': round(clock.get_fps(), 1)})
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        if deadline is not None:
+            accumulator = min(max(accumulator, 0), STEP)
+    now = time.perf_counter()
+    if now - ratio_wall >= 0.5:
+        warp_ratio = max(0.0, sim.sim_time - ratio_sim) / (now - ratio_wall)
+        ratio_wall, ratio_sim = now, sim.sim_time
+
     # === RENDER ===
     screen.fill((30, 30, 30))
-
-    # Draw all roads
-    for seg in sim.segments.values():
-        seg.draw_road(screen, world_to_screen, ZOOM, road_width=ROAD_WIDTH)
-
-    # Draw all junctions
-    for junc in sim.junctions:
-        junc.draw_junction(screen, world_to_screen, ZOOM, road_width=ROAD_WIDTH, font=font)
-
-    # Draw all cars
-    for seg in sim.segments.values():
-        seg.draw_cars(screen, world_to_screen, label_font, ZOOM, W, H, car_length_const=CAR_LENGTH, selected_car=selected_car)
-
-    # Draw segment labels at their midpoints
-    if show_labels:
+    render.sync_meso_positions()
+    if show_minimap or (ZOOM < TILE_ZOOM and heat_shown is not None):
+        minimap.update(sim.segments, sim.sim_time)
+    if ZOOM < TILE_ZOOM:
+        # city scale: cached road tiles plus the coarse congestion grid, independent of network size
+        tile_cache.draw(screen, sim.segments, ZOOM, PAN_X, PAN_Y)
+        grid = minimap.congestion
+        if heat_shown is not None and grid.bounds is not None:
+            grid.draw(screen, world_to_screen((grid.bounds[0], grid.bounds[1])), ZOOM)
+    else:
+        # roads are coloured by the heatmap when it is shown; cars give way to it when zoomed far out
+        heat_colors = heat.colors(sim.segments, heat_shown) if heat_shown is not None else None
+        render.draw_world(screen, world_to_screen, ZOOM, font, label_font, ROAD_WIDTH, CAR_LENGTH,
+                          selected_car=selected_car, show_labels=show_labels, span_colors=heat_colors,
+                          show_cars=ZOOM >= HEATMAP_AUTO_ZOOM, jams=sim.jam_detector,
+                          overlays=speed is not None and speed < WARP_OVERLAYS)
+
+    # Editor overlay: endpoints, selected segment, drag / new segment preview
+    if edit_mode:
+        if edit_selected is not None and edit_selected.id not in sim.segments:
+            edit_selected = None
         for seg in sim.segments.values():
-            seg.draw_label(screen, world_to_screen, label_font)
+            for p in (seg.start, seg.end):
+                pygame.draw.circle(screen, (255, 255, 255), world_to_screen(p), 4, 1)
+        if edit_selected is not None:
+            pygame.draw.line(screen, (0, 200, 255), world_to_screen(edit_selected.start),
+                             world_to_screen(edit_selected.end), 3)
+        anchor = drag_node if drag_node is not None else new_seg_start
+        if anchor is not None:
+            pygame.draw.line(screen, (255, 255, 0), world_to_screen(anchor), pygame.mouse.get_pos(), 2)
+        edit_txt = font.render("EDIT: drag endpoints, Shift+drag add, X split, Ctrl+click link, Ctrl+Z/Y", True, (0, 200, 255))
+        screen.blit(edit_txt, (10, H - 25))
+
+    if show_minimap:
+        minimap.draw(screen, screen_to_world)
+
+    # Time-space panel and the selected car's trail, both read from the trajectory rings
+    if ts_panel is not None:
+        if selected_car is not None and sim.route_table is not None:
+            trail = trajectories.trail(selected_car, sim.segments, sim.route_table.pred, sim.sim_tick)
+            if len(trail) > 1:
+                pygame.draw.lines(screen, (0, 200, 255), False, [world_to_screen(p) for p in trail], 2)
+        ts_panel.update(sim.segments, sim.sim_time, selected_car.id if selected_car is not None else None)
+        ts_panel.draw(screen, (W - ts_panel.size[0] - 10, 50))
 
     # Help screen
     if show_help:
@@ -410,6 +697,11 @@ while True:
             "H: Toggle help",
             "L: Toggle labels",
             "P: Pause/Resume",
+            "[ / ]: Slower/faster (1x, 2x, 10x, 100x, max)",
+            "D: Heatmap (off/density/speed)",
+            "M: Toggle minimap (click it to jump)",
+            "J: Jam / shockwave detection",
+            "T: Time-space diagram (selected car's route) and trail",
             "SPACE: Spawn car",
             "Ctrl+F: Toggle fullscreen",
             "Ctrl+S: Save config",
@@ -418,6 +710,8 @@ while True:
             "Mouse Wheel: Zoom",
             "Right-Click + Drag: Pan",
             "Left-Click: Select car",
+            "E: Edit network (drag endpoints, Shift+drag add, X split,",
+            "   Ctrl+click link/unlink, Ctrl+Z/Ctrl+Y undo/redo)",
         ]
         y_offset = 10
         for line in help_lines:
@@ -432,28 +726,50 @@ while True:
     fps = clock.get_fps()
     fps_txt = font.render(f'FPS: {fps:.1f}', True, (255, 255, 255))
     screen.blit(fps_txt, (W - 100, 10))
+    if saver.busy():
+        save_txt = font.render('Saving...', True, (180, 180, 180))
+        screen.blit(save_txt, (W - 100, 25))
 
     # Stats - always show tick/time regardless of car count
-    all_cars = [c for seg in sim.segments.values() for c in seg.cars]
-    sim_time_txt = font.render(f'Time: {sim_time:.2f}s', True, (255,255,255))
-    tick_txt = font.render(f'Ticks: {sim_tick}', True, (255,255,255))
+    n_cars = sum(len(seg.cars) for seg in sim.segments.values())
+    if hud_stats is None or hud_stats[:2] != (sim.sim_tick, n_cars):   # new tick, or cars spawned/removed
+        all_cars = [c for seg in sim.segments.values() for c in seg.cars]
+        hud_stats = (sim.sim_tick, n_cars, sum(c.v for c in all_cars) / max(n_cars, 1),
+                     sum(1 for c in all_cars if c.risk == "red"))
+    sim_time_txt = font.render(f'Time: {sim.sim_time:.2f}s', True, (255,255,255))
+    tick_line = f'Ticks: {sim.sim_tick}'
+    if speed != 1:
+        tick_line += f'  |  Speed: {speed or "max"}x ({warp_ratio:.0f}x real time)'
+    tick_txt = font.render(tick_line, True, (255,255,255))
 
     screen.blit(sim_time_txt, (10, y_offset))
     screen.blit(tick_txt, (10, y_offset + 15))
     
-    if all_cars:
-        avg_v = sum(c.v for c in all_cars) / len(all_cars)
-        red = sum(1 for c in all_cars if c.risk == "red")
-        stats_txt = font.render(f'Avg: {avg_v:.1f} m/s | Cars: {len(all_cars)} | Red: {red}', True, (255,255,255))
+    if n_cars:
+        _, _, avg_v, red = hud_stats
+        stats_txt = font.render(f'Avg: {avg_v:.1f} m/s | Cars: {n_cars} | Red: {red}', True, (255,255,255))
         screen.blit(stats_txt, (10, y_offset + 30))
 
+    if sim.jam_detector is not None:
+        shown = sim.jam_detector.shown()
+        jam_txt = font.render(f'Jams: {len(shown)} now, {sim.jam_detector.reported} reported '
+                              f'({sum(j.queue_m for j in shown):.0f} m queued)', True, (255, 0, 255))
+        screen.blit(jam_txt, (10, y_offset + 45))
+
+    if sim.gridlock is not None:
+        gridlock_txt = font.render(f'Gridlocks: {len(sim.gridlock.active())} now, {sim.gridlock.reported} reported, '
+                                   f'{len(sim.gridlock.asleep)} segments asleep', True, (255, 120, 0))
+        screen.blit(gridlock_txt, (10, y_offset + 60))
+
     # Display pause status
     if is_paused:
         pause_txt = font.render("*** PAUSED ***", True, (255, 100, 100))
         pause_rect = pause_txt.get_rect(topright=(W - 10, 10))
         screen.blit(pause_txt, pause_rect)
 
-    # Display selected car info
+    # Display selected car info (cars that left the network are deselected)
+    if selected_car is not None and selected_car.segment is None:
+        selected_car = None
     if selected_car:
         # Position the selected-car info panel at left (inline with stats) and 1/2 down
         x_base = 10
@@ -0,0 +1,152 @@
+import heapq
+
+# Mesoscopic fast-forward for quiet segments.
+#
+# A segment in meso mode is not integrated by update_cars. Each car on it is
+# given an exit time from a simple link/queue model (free-flow travel time to
+# the end, but never sooner than one capacity headway after the car ahead)
+# and sits in a heap until then. When its exit time comes the car is placed
+# at the end of the segment and the normal junction transfer takes it.
+# Positions in between are only interpolated on demand (sync_positions, used
+# before rendering).
+#
+# Segments go meso when their density drops below MESO_DENSITY and switch back
+# to full IDM when it reaches MICRO_DENSITY, when the segment is signalised,
+# when a downstream segment is congested (cars would be approaching a queue),
+# or when a released car cannot enter the next segment. Cars keep their
+# identity; switching only rewrites pos/v.
+
+MESO_DENSITY = 12.0    # veh/km below which a segment may go meso
+MICRO_DENSITY = 25.0   # veh/km at which a meso segment goes back to micro
+CONGESTED_SPEED = 5.0  # m/s; a car this slow near the start of an output marks it congested
+APPROACH = 100.0       # m from the start of an output checked for congestion
+CHECK_EVERY = 1.0      # seconds between mode checks
+
+enabled = False
+heap = []              # (exit_time, car id, car) for cars on meso segments
+released = []          # cars placed at a segment end this tick
+_last_check = -1e9
+
+
+def reset():
+    global heap, released, _last_check
+    heap = []
+    released = []
+    _last_check = -1e9
+
+
+def density(seg):
+    return len(seg.cars) / seg.length * 1000.0 if seg.length > 0 else 0.0
+
+
+def free_speed(seg, car):
+    return max(1.0, min(car.v0, seg.speed_limit))
+
+
+def headway(seg, car):
+    """Minimum time between two cars leaving a segment (IDM capacity at free speed)."""
+    return car.T + (car.s0 + car.length) / free_speed(seg, car)
+
+
+def output_congested(seg):
+    for out in seg.outputs:
+        if density(out) >= MICRO_DENSITY:
+            return True
+        for c in out.cars:
+            if c.pos < APPROACH and c.v < CONGESTED_SPEED:
+                return True
+    return False
+
+
+def schedule(seg, car, now):
+    """Give a car on a meso segment its exit time (FIFO behind the car ahead of it)."""
+    v = free_speed(seg, car)
+    exit_time = now + max(0.0, seg.length - car.pos) / v
+    if car.v < v:
+        # time lost accelerating up to free speed (IDM averages about half of a_max)
+        exit_time += (v - car.v) ** 2 / (car.a_max * v)
+    if seg.meso_last_exit is not None:
+        exit_time = max(exit_time, seg.meso_last_exit + headway(seg, car))
+    seg.meso_last_exit = exit_time
+    car.meso_entry = (now, car.pos)
+    car.meso_exit = exit_time
+    car.v = v
+    car.a = 0.0
+    car.accel_state = "coasting"
+    car.risk = "green"
+    car.colliding = False
+    heapq.heappush(heap, (exit_time, car.id, car))
+
+
+def to_meso(seg, now):
+    seg.meso = True
+    seg.meso_last_exit = None
+    seg.cars.sort(key=lambda c: c.pos, reverse=True)
+    for car in seg.cars:
+        schedule(seg, car, now)
+
+
+def to_micro(seg, now):
+    sync_positions(seg, now)
+    seg.meso = False
+    seg.meso_last_exit = None
+    for car in seg.cars:
+        car.meso_exit = None  # heap entries are dropped lazily
+        car.meso_entry = None
+
+
+def interpolated_pos(seg, car, now):
+    t0, p0 = car.meso_entry
+    if car.meso_exit <= t0:
+        return seg.length
+    frac = (now - t0) / (car.meso_exit - t0)
+    return min(seg.length, p0 + max(0.0, frac) * (seg.length - p0))
+
+
+def sync_positions(seg, now):
+    """Write interpolated positions for cars on a meso segment (cheap; call before drawing)."""
+    if not seg.meso:
+        return
+    for car in seg.cars:
+        if car.meso_exit is not None:
+            car.pos = interpolated_pos(seg, car, now)
+
+
+def release_due(now):
+    """Move cars whose exit time has come to the end of their segment, ready for transfer."""
+    released.clear()
+    while heap and heap[0][0] <= now:
+        exit_time, _, car = heapq.heappop(heap)
+        seg = car.segment
+        if seg is None or not seg.meso or car.meso_exit != exit_time:
+            continue  # car left, or segment switched to micro
+        car.pos = seg.length
+        car.meso_exit = None
+        car.meso_entry = None
+        released.append(car)
+
+
+def after_transfer(now):
+    """Cars that could not leave mean a queue downstream: run their segment as micro."""
+    for car in released:
+        seg = car.segment
+        if seg is not None and seg.meso and car in seg.cars:
+            to_micro(seg, now)
+
+
+def update_modes(segments, now):
+    """Periodic micro/meso switching based on density and downstream congestion."""
+    global _last_check
+    if now - _last_check < CHECK_EVERY:
+        return
+    _last_check = now
+    for seg in segments.values():
+        if seg.length <= 0:
+            continue
+        d = density(seg)
+        if seg.meso:
+            if d >= MICRO_DENSITY or seg.signal_state is not None or output_congested(seg):
+                to_micro(seg, now)
+        elif d < MESO_DENSITY and seg.signal_state is None and not output_congested(seg):
+            if all(c.v >= 0.8 * free_speed(seg, c) for c in seg.cars):
+                to_meso(seg, now)
@@ -0,0 +1,277 @@
+import zlib
+
+import numpy as np
+
+import kernels
+
+# Car-following model registry.
+#
+# A model is a batched kernel plus its parameter schema. The kernel gets the
+# cars of one model on one segment as arrays (a Batch: speed, gap to the
+# leader, speed difference to it, free speed, ...) and the car parameters as
+# per-car arrays by name, and returns their accelerations; it never loops
+# over cars. Register one with
+#
+#   @register('name', {'param': (default, low, high), ...})
+#   def name(b, p): return <acceleration array>
+#
+# Cars carry the model name (car.model) and their parameter values in schema
+# order (car.model_params), resolved once at spawn from the scenario's
+# car_params and vehicle class (see resolve()), on top of the model's own
+# defaults. Parameters with the names of the IDM ones (v0, a_max, b_max, T,
+# s0) are also the car's attributes, so a vehicle class sets e.g. a_max the
+# same way for any model.
+#
+# update_segment() replaces the per-car loop for a segment: gaps and speed
+# differences are taken from the positions at the start of the tick, the cars
+# are grouped by model and each model's kernel runs once on its group, then
+# all cars are moved together. Unlike sim.update_cars, where every follower
+# already sees its leader's new position, all cars of a segment update at
+# once; sim.step only takes this path when the scenario uses a model other
+# than IDM, so IDM-only scenarios keep their trajectories.
+#
+# Models:
+#   idm    Intelligent Driver Model (Treiber, Hennecke, Helbing 2000)
+#   gipps  Gipps (1981): free acceleration term, braking to the safe speed
+#          within the reaction time tau
+#   krauss Krauss (1998) safe speed with random dawdling sigma, as in SUMO
+#   ovm    Optimal Velocity Model (Bando et al. 1995), relaxation time tau
+#   acc    Adaptive cruise control, constant time gap (Milanes & Shladover 2014)
+#   cacc   Cooperative ACC: leader acceleration feed-forward (Van Arem 2006),
+#          falls back to ACC behind a leader that is not connected
+
+DEFAULT = 'idm'
+EMERGENCY_DECEL = 9.0  # m/s^2, the hardest braking any model may ask for
+
+MODELS = {}  # name -> Model
+rng = np.random.default_rng()  # random terms (Krauss dawdling); seeded by seed()
+
+
+class Model:
+    def __init__(self, name, kernel, schema, connected=False):
+        self.name = name
+        self.kernel = kernel
+        self.schema = schema  # param -> (default, low, high)
+        self.names = tuple(schema)
+        self.connected = connected  # sends its acceleration to followers (V2V)
+
+    def defaults(self):
+        return {k: d for k, (d, _, _) in self.schema.items()}
+
+
+def register(name, schema, connected=False):
+    def wrap(kernel):
+        MODELS[name] = Model(name, kernel, schema, connected)
+        return kernel
+    return wrap
+
+
+def get(name):
+    model = MODELS.get(name)
+    if model is None:
+        raise ValueError(f'unknown car-following model {name!r} (known: {", ".join(MODELS)})')
+    return model
+
+
+def resolve(name, params):
+    """Parameter tuple of model `name` in schema order, taken from `params` or the defaults.
+
+    Keys the model does not use are ignored (car_params always carries the
+    IDM ones); values outside the schema range raise ValueError.
+    """
+    model = get(name)
+    values = []
+    for key, (default, low, high) in model.schema.items():
+        value = float(params.get(key, default))
+        if not low <= value <= high:
+            raise ValueError(f'{name} parameter {key}={value} outside [{low}, {high}]')
+        values.append(value)
+    return tuple(values)
+
+
+def seed(value):
+    """Seed the random terms from the scenario seed (None: unseeded)."""
+    global rng
+    rng = np.random.default_rng(None if value is None else zlib.crc32(f'{value}:models'.encode()))
+
+
+class Batch:
+    """The cars of one model on one segment, as arrays aligned front to back."""
+
+    def __init__(self, v, s, dv, v_free, lead_a, lead_connected, step):
+        self.v = v
+        self.s = s            # gap to the leader (inf: none within the lookahead)
+        self.dv = dv          # own speed minus the leader's
+        self.v_free = v_free  # min(v0, speed limit)
+        self.lead_a = lead_a  # leader's acceleration in the last tick (0 for the front car)
+        self.lead_connected = lead_connected  # leader runs a connected model
+        self.step = step
+
+    def take(self, idx):
+        return Batch(self.v[idx], self.s[idx], self.dv[idx], self.v_free[idx], self.lead_a[idx],
+                     self.lead_connected[idx], self.step)
+
+
+def _idm_s_star(v, dv, p):
+    return p['s0'] + np.maximum(0.0, v * p['T'] + v * dv / (2 * np.sqrt(p['a_max'] * p['b_max'])))
+
+
+@register('idm', {'v0': (33.3, 0.1, 70.0), 'a_max': (3.0, 0.1, 10.0), 'b_max': (4.0, 0.1, 10.0),
+                  'T': (1.8, 0.1, 5.0), 's0': (3.0, 0.0, 20.0)})
+def idm(b, p):
+    v_ratio = np.where(b.v_free > 0, b.v / np.maximum(b.v_free, 1e-9), 0.0)
+    s = np.maximum(b.s, 1e-9)
+    a = p['a_max'] * (1 - v_ratio ** 4 - (_idm_s_star(b.v, b.dv, p) / s) ** 2)
+    a = np.clip(a, -p['b_max'], p['a_max'])
+    return np.where(b.s <= 0, -p['b_max'], a)
+
+
+@register('gipps', {'v0': (33.3, 0.1, 70.0), 'a_max': (1.7, 0.1, 10.0), 'b_max': (3.4, 0.1, 10.0),
+                    'b_hat': (3.2, 0.1, 10.0), 'tau': (0.67, 0.05, 3.0), 's0': (3.0, 0.0, 20.0)})
+def gipps(b, p):
+    r = b.v / np.maximum(b.v_free, 1e-9)
+    a_free = 2.5 * p['a_max'] * (1 - r) * np.sqrt(np.maximum(0.025 + r, 0.0))
+    bb, tau = p['b_max'], p['tau']
+    v_lead = np.maximum(0.0, b.v - b.dv)
+    # safe speed: stop behind the leader even if it brakes at b_hat (finite gaps only)
+    gap = np.where(np.isinf(b.s), 0.0, b.s - p['s0'])
+    root = (bb * tau) ** 2 + bb * (2 * gap - b.v * tau + v_lead ** 2 / p['b_hat'])
+    v_safe = np.where(np.isinf(b.s), np.inf, -bb * tau + np.sqrt(np.maximum(root, 0.0)))
+    a = np.minimum(a_free, (v_safe - b.v) / tau)
+    return np.clip(a, -EMERGENCY_DECEL, p['a_max'])
+
+
+@register('krauss', {'v0': (33.3, 0.1, 70.0), 'a_max': (2.6, 0.1, 10.0), 'b_max': (4.5, 0.1, 10.0),
+                     'tau': (1.0, 0.05, 3.0), 'sigma': (0.5, 0.0, 1.0), 's0': (2.5, 0.0, 20.0)})
+def krauss(b, p):
+    v_lead = np.maximum(0.0, b.v - b.dv)
+    tau = p['tau']
+    gap = np.where(np.isinf(b.s), 0.0, b.s - p['s0'])
+    v_safe = np.where(np.isinf(b.s), np.inf,
+                      v_lead + (gap - v_lead * tau) / ((b.v + v_lead) / (2 * p['b_max']) + tau))
+    v_des = np.minimum(np.minimum(b.v_free, b.v + p['a_max'] * b.step), v_safe)
+    v_des = np.maximum(0.0, v_des - p['sigma'] * p['a_max'] * b.step * rng.random(len(b.v)))
+    return np.clip((v_des - b.v) / b.step, -EMERGENCY_DECEL, p['a_max'])
+
+
+@register('ovm', {'v0': (33.3, 0.1, 70.0), 'a_max': (3.0, 0.1, 10.0), 'tau': (0.65, 0.05, 5.0),
+                  'delta_s': (8.0, 0.5, 50.0), 'beta': (1.5, 0.0, 5.0)})
+def ovm(b, p):
+    beta = np.tanh(p['beta'])
+    v_opt = b.v_free * np.maximum(0.0, np.tanh(b.s / p['delta_s'] - p['beta']) + beta) / (1 + beta)
+    return np.clip((v_opt - b.v) / p['tau'], -EMERGENCY_DECEL, p['a_max'])
+
+
+def _closing_limit(b, s0):
+    """Constant deceleration that just avoids hitting the leader (collision avoidance for ACC/CACC)."""
+    closing = (b.dv > 0) & np.isfinite(b.s)
+    room = np.maximum(np.where(closing, b.s, 1.0) - s0, 0.1)
+    return np.where(closing, -b.dv ** 2 / (2 * room), np.inf)
+
+
+def _acc(b, v_free, s0, t_hw, k0, k1, k2):
+    speed_mode = k0 * (v_free - b.v)
+    gap_mode = np.where(np.isinf(b.s), np.inf, k1 * (np.where(np.isinf(b.s), 0.0, b.s) - s0 - t_hw * b.v) - k2 * b.dv)
+    return np.minimum(speed_mode, gap_mode)
+
+
+@register('acc', {'v0': (33.3, 0.1, 70.0), 'a_max': (2.0, 0.1, 10.0), 's0': (2.0, 0.0, 20.0),
+                  't_hw': (1.1, 0.1, 5.0), 'k0': (0.4, 0.0, 5.0), 'k1': (0.23, 0.0, 5.0), 'k2': (0.07, 0.0, 5.0)})
+def acc(b, p):
+    a = _acc(b, b.v_free, p['s0'], p['t_hw'], p['k0'], p['k1'], p['k2'])
+    return np.clip(np.minimum(a, _closing_limit(b, p['s0'])), -EMERGENCY_DECEL, p['a_max'])
+
+
+@register('cacc', {'v0': (33.3, 0.1, 70.0), 'a_max': (2.0, 0.1, 10.0), 's0': (2.0, 0.0, 20.0),
+                   't_hw': (0.6, 0.1, 5.0), 'k_a': (1.0, 0.0, 2.0), 'k_v': (0.58, 0.0, 5.0), 'k_d': (0.1, 0.0, 5.0),
+                   'acc_t_hw': (1.1, 0.1, 5.0), 'k0': (0.4, 0.0, 5.0), 'k1': (0.23, 0.0, 5.0), 'k2': (0.07, 0.0, 5.0)},
+          connected=True)
+def cacc(b, p):
+    s = np.where(np.isinf(b.s), 0.0, b.s)
+    coop = p['k_a'] * b.lead_a - p['k_v'] * b.dv + p['k_d'] * (s - p['s0'] - p['t_hw'] * b.v)
+    coop = np.where(np.isinf(b.s), np.inf, coop)
+    speed_mode = p['k0'] * (b.v_free - b.v)
+    a = np.where(b.lead_connected, np.minimum(speed_mode, coop),
+                 _acc(b, b.v_free, p['s0'], p['acc_t_hw'], p['k0'], p['k1'], p['k2']))
+    return np.clip(np.minimum(a, _closing_limit(b, p['s0'])), -EMERGENCY_DECEL, p['a_max'])
+
+
+def model_params(car):
+    """The car's parameter tuple, resolved from its attributes for cars spawned without one."""
+    if car.model_params is None:
+        values = {k: getattr(car, k) for k in get(car.model).names if getattr(car, k, None) is not None}
+        car.model_params = resolve(car.model, values)
+    return car.model_params
+
+
+def update_segment(seg, step, margin, get_leader):
+    """Batched update of one segment's cars, grouped by model; returns the number of new collisions."""
+    cars = seg.cars
+    if not cars:
+        return 0
+    cars.sort(key=lambda c: c.pos, reverse=True)
+    n = len(cars)
+    lead_s, lead_dv, lead_real = get_leader(seg, 0)
+
+    f = np.float64
+    pos = np.fromiter((c.pos for c in cars), f, n)
+    v = np.fromiter((c.v for c in cars), f, n)
+    length = np.fromiter((c.length for c in cars), f, n)
+    v0 = np.fromiter((c.v0 for c in cars), f, n)
+    a_max = np.fromiter((c.a_max for c in cars), f, n)
+    b_max = np.fromiter((c.b_max for c in cars), f, n)
+    T = np.fromiter((c.T for c in cars), f, n)
+    s0 = np.fromiter((c.s0 for c in cars), f, n)
+
+    s = np.empty(n)
+    s[0] = lead_s
+    s[1:] = pos[:-1] - pos[1:] - length[:-1]
+    dv = np.empty(n)
+    dv[0] = lead_dv
+    dv[1:] = v[1:] - v[:-1]
+    v_free = np.minimum(v0, seg.speed_limit)
+
+    groups = {}
+    for i, car in enumerate(cars):
+        groups.setdefault(car.model, []).append(i)
+    lead_a = np.zeros(n)
+    lead_connected = np.zeros(n, np.bool_)
+    if any(get(name).connected for name in groups):
+        lead_a[1:] = np.fromiter((getattr(c, 'a', 0.0) for c in cars[:-1]), f, n - 1)
+        lead_connected[1:] = np.fromiter((get(c.model).connected for c in cars[:-1]), np.bool_, n - 1)
+    batch = Batch(v, s, dv, v_free, lead_a, lead_connected, step)
+
+    a = np.empty(n)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        for name, idx in groups.items():
+            model = get(name)
+            P = np.array([model_params(cars[i]) for i in idx], f).reshape(len(idx), len(model.names))
+            p = {k: P[:, j] for j, k in enumerate(model.names)}
+            if len(idx) == n:
+                a[:] = model.kernel(batch, p)
+            else:
+                idx = np.array(idx)
+                a[idx] = model.kernel(batch.take(idx), p)
+
+    v_new = np.maximum(0.0, v + a * step)
+    pos += v_new * step
+
+    state = np.where(a > 0.5 * a_max, 0, np.where(a < -0.5 * b_max, 1, 2))
+    overlap = pos[:-1] - pos[1:] - length[:-1] < 0
+    colliding = np.zeros(n, np.bool_)
+    colliding[1:] |= overlap
+    colliding[:-1] |= overlap
+    # risk is classified against the IDM desired gap for every model, at the new speed
+    finite = np.isfinite(s)
+    s_star = np.where(finite, s0 + np.maximum(0.0, v_new * T + v_new * dv / (2 * np.sqrt(a_max * b_max))), 0.0)
+    risk = np.where(~finite, 0, np.where(s <= s_star, 2, np.where(s <= s_star + margin, 1, 0)))
+
+    seg.leader_s = s
+    seg.leader_real = np.ones(n, np.bool_)   # only the front car can follow a stop line
+    seg.leader_real[0] = lead_real
+    seg.leader_dv = dv
+    seg.car_v = v_new
+    seg.car_a = a
+    return kernels.write_back(seg, cars, pos.tolist(), v_new.tolist(), a.tolist(), s.tolist(), dv.tolist(),
+                              s_star.tolist(), v_free.tolist(), state.tolist(), risk.tolist(), colliding.tolist(),
+                              margin)
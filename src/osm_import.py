@@ -0,0 +1,620 @@
+import argparse
+import json
+import lzma
+import math
+import mmap
+import multiprocessing as mp
+import os
+import random
+import re
+import struct
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from html import unescape
+
+import numpy as np
+
+# Road network import from a local OpenStreetMap extract (.osm XML or .osm.pbf).
+#
+#   python src/osm_import.py city.osm.pbf --out city.json
+#   python src/osm_import.py area.osm --out area.json --simplify 3 --demand 20
+#
+# The file is read twice, in parallel chunks (--jobs processes), and never
+# held in memory: the first pass keeps only drivable ways (their node ids and
+# the few tags used below), the second only the coordinates of nodes those
+# ways use. XML is cut into byte ranges at element starts and scanned with
+# regular expressions over a memory map (one element per line is not needed);
+# PBF blobs are decompressed and decoded by the workers, packed arrays with
+# numpy. Memory follows the size of the road network, not of the file.
+#
+# Coordinates are projected onto a local tangent plane around the centre of
+# the network (equirectangular, meters, y pointing down like the screen), the
+# units the sim uses. Ways are split at nodes shared with other ways, each
+# piece is simplified with Douglas-Peucker (--simplify meters) and every
+# remaining straight piece becomes a Segment; two-way roads get one per
+# direction. Each segment end gets a junction to the segments leaving that
+# node, except its own reverse (no U-turns); ends with no way on are sinks.
+# Speed limits come from maxspeed (km/h, mph, zone values like "DE:urban"),
+# or the road class's default.
+
+DEFAULT_SPEEDS = {  # km/h for ways without a usable maxspeed
+    'motorway': 110, 'motorway_link': 60, 'trunk': 90, 'trunk_link': 50, 'primary': 60, 'primary_link': 50,
+    'secondary': 50, 'secondary_link': 40, 'tertiary': 50, 'tertiary_link': 40, 'unclassified': 40,
+    'residential': 30, 'living_street': 10, 'service': 20, 'road': 40,
+}
+ZONE_SPEEDS = {'urban': 50, 'rural': 90, 'trunk': 100, 'motorway': 130, 'living_street': 10, 'walk': 7,
+               'none': 130, 'signals': 50}
+EXCLUDED_SERVICE = {'parking_aisle', 'driveway', 'drive-through'}
+NO_ACCESS = {'no', 'private'}
+KEEP_TAGS = {'highway', 'oneway', 'junction', 'maxspeed', 'maxspeed:forward', 'maxspeed:backward', 'access',
+             'motor_vehicle', 'motorcar', 'area', 'service'}
+EARTH_RADIUS = 6371008.8  # m
+SIMPLIFY = 5.0            # m, Douglas-Peucker tolerance
+XML_CHUNK = 64 << 20      # largest byte range one XML task scans
+PBF_BATCH = 8             # blobs per PBF task
+VIEW_SIZE = 700           # px of the viewer window the initial view fits
+
+_needed = None  # per worker process: sorted node ids whose coordinates are wanted
+
+
+def drivable(tags, highways, service=False):
+    hw = tags.get('highway')
+    if hw not in highways or tags.get('area') == 'yes':
+        return False
+    if not service and tags.get('service') in EXCLUDED_SERVICE:
+        return False
+    if tags.get('motor_vehicle', tags.get('motorcar')) in NO_ACCESS:
+        return False
+    return tags.get('access') not in NO_ACCESS or tags.get('motor_vehicle', tags.get('motorcar')) == 'yes'
+
+
+def parse_maxspeed(value):
+    """Speed in m/s from a maxspeed tag ("50", "30 mph", "DE:urban", "none"), or None."""
+    if not value:
+        return None
+    value = value.split(';')[0].strip().lower()
+    zone = value.split(':')[-1]
+    if zone in ZONE_SPEEDS:
+        return ZONE_SPEEDS[zone] / 3.6
+    m = re.match(r'([\d.]+)\s*(mph|knots|km/h|kmh)?$', value)
+    if m is None:
+        return None
+    try:
+        speed = float(m.group(1))
+    except ValueError:
+        return None
+    unit = m.group(2)
+    if unit == 'mph':
+        return speed * 0.44704
+    if unit == 'knots':
+        return speed * 0.514444
+    return speed / 3.6 if speed > 0 else None
+
+
+def directions(tags):
+    """(forward, backward) travel allowed on a way."""
+    oneway = tags.get('oneway', '')
+    if oneway in ('-1', 'reverse'):
+        return False, True
+    if oneway in ('yes', 'true', '1'):
+        return True, False
+    if oneway != 'no' and (tags.get('junction') in ('roundabout', 'circular') or tags.get('highway') == 'motorway'):
+        return True, False
+    return True, True
+
+
+# --- XML ---
+
+_WAY = re.compile(rb'<way\b([^>]*?)(?:/>|>(.*?)</way>)', re.S)
+_NODE = re.compile(rb'<node\b([^>]*?)/?>')
+_ID = re.compile(rb'\bid=["\'](-?\d+)')
+_LAT = re.compile(rb'\blat=["\']([-+\d.eE]+)')
+_LON = re.compile(rb'\blon=["\']([-+\d.eE]+)')
+_ND = re.compile(rb'<nd\s+ref=["\'](-?\d+)')
+_TAG = re.compile(rb'<tag\s+k=(["\'])(.*?)\1\s+v=(["\'])(.*?)\3', re.S)
+
+
+def _xml_ranges(path, jobs):
+    size = os.path.getsize(path)
+    chunk = max(1 << 20, min(XML_CHUNK, size // max(1, jobs * 4) + 1))
+    return [(path, start, min(size, start + chunk)) for start in range(0, size, chunk)]
+
+
+def _xml_ways(task, highways, service):
+    """Drivable ways of the elements starting in one byte range; elements may run past its end."""
+    path, start, end = task
+    ways = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        has_nodes = mm.find(b'<node', start, end) != -1
+        pos = mm.find(b'<way', start, end)
+        while pos != -1:
+            m = _WAY.match(mm, pos)
+            if m is None:
+                pos = mm.find(b'<way', pos + 4, end)
+                continue
+            body = m.group(2) or b''
+            tags = {unescape(k.decode('utf-8', 'replace')): unescape(v.decode('utf-8', 'replace'))
+                    for _, k, _, v in _TAG.findall(body)}
+            if drivable(tags, highways, service):
+                refs = np.array([int(r) for r in _ND.findall(body)], np.int64)
+                if len(refs) >= 2:
+                    ways.append((int(_ID.search(m.group(1)).group(1)),
+                                 refs, {k: v for k, v in tags.items() if k in KEEP_TAGS}))
+            pos = mm.find(b'<way', m.end(), end)
+    return ways, has_nodes
+
+
+def _xml_nodes(task):
+    """(ids, lat, lon) of the wanted nodes starting in one byte range."""
+    path, start, end = task
+    ids, at = [], []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = mm.find(b'<node', start, end)
+        while pos != -1:
+            m = _NODE.match(mm, pos)
+            if m is not None:
+                ids.append(int(_ID.search(m.group(1)).group(1)))
+                at.append(m.group(1))
+                pos = m.end()
+            else:
+                pos += 5
+            pos = mm.find(b'<node', pos, end)
+    ids = np.array(ids, np.int64)
+    keep = np.flatnonzero(_member(ids, _needed))
+    lat = np.array([float(_LAT.search(at[i]).group(1)) for i in keep])
+    lon = np.array([float(_LON.search(at[i]).group(1)) for i in keep])
+    return ids[keep], lat, lon
+
+
+# --- PBF (protocol buffers, decoded by hand) ---
+
+def _varint(buf, i):
+    result = shift = 0
+    while True:
+        b = buf[i]
+        i += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, i
+        shift += 7
+
+
+def _fields(buf):
+    """(field number, value) of a protobuf message; varints as int, length-delimited as memoryview."""
+    i, n = 0, len(buf)
+    while i < n:
+        key, i = _varint(buf, i)
+        wire = key & 7
+        if wire == 0:
+            value, i = _varint(buf, i)
+        elif wire == 2:
+            size, i = _varint(buf, i)
+            value = buf[i:i + size]
+            i += size
+        elif wire == 1:
+            value = buf[i:i + 8]
+            i += 8
+        elif wire == 5:
+            value = buf[i:i + 4]
+            i += 4
+        else:
+            raise ValueError(f'unsupported protobuf wire type {wire}')
+        yield key >> 3, value
+
+
+def _unpack(buf):
+    """Packed varints as a list (short arrays such as tag keys)."""
+    out, i, n = [], 0, len(buf)
+    while i < n:
+        v, i = _varint(buf, i)
+        out.append(v)
+    return out
+
+
+def _packed(buf, signed=False):
+    """Packed varints as an int64 array, decoded with numpy (long arrays: node ids, coordinates, refs)."""
+    b = np.frombuffer(buf, np.uint8)
+    if not len(b):
+        return np.zeros(0, np.int64)
+    ends = np.flatnonzero(b < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    shift = ((np.arange(len(b)) - np.repeat(starts, ends - starts + 1)) * 7).astype(np.uint64)
+    v = np.add.reduceat((b & 0x7f).astype(np.uint64) << shift, starts)
+    if signed:
+        return (v >> np.uint64(1)).astype(np.int64) ^ -(v & np.uint64(1)).astype(np.int64)
+    return v.astype(np.int64)
+
+
+def _zigzag(v):
+    return (v >> 1) ^ -(v & 1)
+
+
+def _int64(v):
+    return v - (1 << 64) if v >= 1 << 63 else v
+
+
+def _pbf_index(path):
+    """(offset, size) of every OSMData blob, read from the blob headers only."""
+    blobs = []
+    with open(path, 'rb') as f:
+        while True:
+            head = f.read(4)
+            if len(head) < 4:
+                break
+            (n,) = struct.unpack('>I', head)
+            kind, size = None, 0
+            for field, value in _fields(memoryview(f.read(n))):
+                if field == 1:
+                    kind = bytes(value).decode()
+                elif field == 3:
+                    size = value
+            if kind == 'OSMData':
+                blobs.append((f.tell(), size))
+            f.seek(size, os.SEEK_CUR)
+    return blobs
+
+
+def _pbf_blocks(path, blobs):
+    with open(path, 'rb') as f:
+        for offset, size in blobs:
+            f.seek(offset)
+            raw = None
+            for field, value in _fields(memoryview(f.read(size))):
+                if field == 1:
+                    raw = bytes(value)
+                elif field == 3:
+                    raw = zlib.decompress(value)
+                elif field == 4:
+                    raw = lzma.decompress(value)
+            if raw is None:
+                raise ValueError('unsupported PBF blob compression')
+            yield memoryview(raw)
+
+
+def _block_header(block):
+    strings, groups = [], []
+    scale = [100, 0, 0]  # granularity, lat offset, lon offset
+    for field, value in _fields(block):
+        if field == 1:
+            strings = [bytes(s).decode('utf-8', 'replace') for f, s in _fields(value) if f == 1]
+        elif field == 2:
+            groups.append(value)
+        elif field == 17:
+            scale[0] = value
+        elif field == 19:
+            scale[1] = _int64(value)
+        elif field == 20:
+            scale[2] = _int64(value)
+    return strings, groups, scale
+
+
+def _split_packed(bufs):
+    """Delta-coded packed sint64 arrays (way refs) of many messages, decoded in one numpy pass."""
+    joined = b''.join(bufs)
+    values = np.cumsum(_packed(joined, signed=True))
+    ends = np.flatnonzero(np.frombuffer(joined, np.uint8) < 0x80)
+    stops = np.searchsorted(ends, np.cumsum([len(b) for b in bufs]))
+    starts = np.concatenate(([0], stops[:-1]))
+    base = np.where(starts > 0, values[np.maximum(starts - 1, 0)], 0)
+    return [values[a:b] - off for a, b, off in zip(starts.tolist(), stops.tolist(), base.tolist())]
+
+
+def _pbf_ways(task, highways, service):
+    path, blobs = task
+    ways = []
+    has_nodes = False
+    for block in _pbf_blocks(path, blobs):
+        strings, groups, _ = _block_header(block)
+        keep = {i for i, s in enumerate(strings) if s in KEEP_TAGS}
+        hw = strings.index('highway') if 'highway' in strings else None
+        found, bufs = [], []
+        for group in groups:
+            for field, msg in _fields(group):
+                if field in (1, 2):
+                    has_nodes = True
+                if field != 3 or hw is None:
+                    continue
+                wid, keys, vals, refs = 0, None, None, None
+                for f, v in _fields(msg):
+                    if f == 1:
+                        wid = v
+                    elif f == 2:
+                        keys = v
+                    elif f == 3:
+                        vals = v
+                    elif f == 8:
+                        refs = v
+                if keys is None or refs is None:
+                    continue
+                ks = _unpack(keys)
+                if hw not in ks:
+                    continue
+                tags = {strings[k]: strings[v] for k, v in zip(ks, _unpack(vals)) if k in keep}
+                if drivable(tags, highways, service):
+                    found.append((wid, tags))
+                    bufs.append(refs)
+        if found:
+            for (wid, tags), ids in zip(found, _split_packed(bufs)):
+                if len(ids) >= 2:
+                    ways.append((wid, ids, tags))
+    return ways, has_nodes
+
+
+def _pbf_nodes(task):
+    path, blobs = task
+    out_ids, out_lat, out_lon = [], [], []
+    for block in _pbf_blocks(path, blobs):
+        _, groups, (gran, lat_off, lon_off) = _block_header(block)
+        for group in groups:
+            for field, msg in _fields(group):
+                if field == 2:  # DenseNodes
+                    parts = dict((f, v) for f, v in _fields(msg) if f in (1, 8, 9))
+                    ids = np.cumsum(_packed(parts.get(1, b''), signed=True))
+                    lat = np.cumsum(_packed(parts.get(8, b''), signed=True))
+                    lon = np.cumsum(_packed(parts.get(9, b''), signed=True))
+                elif field == 1:  # plain Node
+                    parts = dict(_fields(msg))
+                    ids = np.array([_zigzag(parts.get(1, 0))], np.int64)
+                    lat = np.array([_zigzag(parts.get(8, 0))], np.int64)
+                    lon = np.array([_zigzag(parts.get(9, 0))], np.int64)
+                else:
+                    continue
+                keep = _member(ids, _needed)
+                out_ids.append(ids[keep])
+                out_lat.append(1e-9 * (lat_off + gran * lat[keep]))
+                out_lon.append(1e-9 * (lon_off + gran * lon[keep]))
+    if not out_ids:
+        return np.zeros(0, np.int64), np.zeros(0), np.zeros(0)
+    return np.concatenate(out_ids), np.concatenate(out_lat), np.concatenate(out_lon)
+
+
+# --- parallel passes ---
+
+def _member(ids, sorted_ids):
+    idx = np.minimum(np.searchsorted(sorted_ids, ids), max(0, len(sorted_ids) - 1))
+    return (sorted_ids[idx] == ids) if len(sorted_ids) else np.zeros(len(ids), bool)
+
+
+def _init_worker(needed):
+    global _needed
+    _needed = needed
+
+
+def _ways_task(args):
+    fmt, task, highways, service = args
+    return (_pbf_ways if fmt == 'pbf' else _xml_ways)(task, highways, service)
+
+
+def _nodes_task(args):
+    fmt, task = args
+    return (_pbf_nodes if fmt == 'pbf' else _xml_nodes)(task)
+
+
+def _map(fn, tasks, jobs, needed=None):
+    if jobs <= 1 or len(tasks) <= 1:
+        _init_worker(needed)
+        return [fn(t) for t in tasks]
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=mp.get_context('spawn'),
+                             initializer=_init_worker, initargs=(needed,)) as pool:
+        return list(pool.map(fn, tasks))
+
+
+def read_network(path, jobs=None, highways=None, service=False, log=print):
+    """Drivable ways [(way id, node ids, tags)] and node coordinates (sorted ids, lat, lon)."""
+    jobs = jobs or os.cpu_count() or 1
+    highways = frozenset(highways or DEFAULT_SPEEDS)
+    fmt = 'pbf' if path.endswith('.pbf') else 'xml'
+    if fmt == 'pbf':
+        blobs = _pbf_index(path)
+        tasks = [(path, blobs[i:i + PBF_BATCH]) for i in range(0, len(blobs), PBF_BATCH)]
+    else:
+        tasks = _xml_ranges(path, jobs)
+
+    t0 = time.perf_counter()
+    results = _map(_ways_task, [(fmt, t, highways, service) for t in tasks], jobs)
+    ways = [w for part, _ in results for w in part]
+    needed = np.unique(np.concatenate([w[1] for w in ways])) if ways else np.zeros(0, np.int64)
+    log(f'{len(ways)} drivable ways using {len(needed)} nodes ({time.perf_counter() - t0:.1f} s)')
+
+    t0 = time.perf_counter()
+    node_tasks = [(fmt, t) for t, (_, has_nodes) in zip(tasks, results) if has_nodes]
+    parts = _map(_nodes_task, node_tasks, jobs, needed)
+    ids = np.concatenate([p[0] for p in parts]) if parts else np.zeros(0, np.int64)
+    lat = np.concatenate([p[1] for p in parts]) if parts else np.zeros(0)
+    lon = np.concatenate([p[2] for p in parts]) if parts else np.zeros(0)
+    order = np.argsort(ids, kind='stable')
+    log(f'{len(ids)} node coordinates ({time.perf_counter() - t0:.1f} s)')
+    return ways, (ids[order], lat[order], lon[order])
+
+
+# --- network ---
+
+def project(lat, lon, lat0, lon0):
+    """Local tangent plane around (lat0, lon0) in meters, x east and y south (screen orientation)."""
+    x = EARTH_RADIUS * np.radians(lon - lon0) * math.cos(math.radians(lat0))
+    y = -EARTH_RADIUS * np.radians(lat - lat0)
+    return x, y
+
+
+def simplify(xs, ys, tolerance):
+    """Indexes of the points Douglas-Peucker keeps (always the first and the last)."""
+    n = len(xs)
+    if n <= 2 or tolerance <= 0:
+        return list(range(n))
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        dx, dy = xs[b] - xs[a], ys[b] - ys[a]
+        norm = math.hypot(dx, dy)
+        best, best_i = -1.0, a
+        for i in range(a + 1, b):
+            px, py = xs[i] - xs[a], ys[i] - ys[a]
+            d = abs(dx * py - dy * px) / norm if norm > 0 else math.hypot(px, py)
+            if d > best:
+                best, best_i = d, i
+        if best > tolerance:
+            keep[best_i] = True
+            stack.append((a, best_i))
+            stack.append((best_i, b))
+    return [i for i in range(n) if keep[i]]
+
+
+def _runs(known, shared, first, stop):
+    """(lo, hi) index ranges of one way's nodes: runs with coordinates (extracts and --bbox cut
+    ways), cut again at shared nodes, which end one run and start the next."""
+    lo = None
+    for i in range(first, stop):
+        if not known[i]:
+            if lo is not None and i - lo > 1:
+                yield lo, i
+            lo = None
+        elif lo is None:
+            lo = i
+        elif shared[i]:
+            yield lo, i + 1
+            lo = i
+    if lo is not None and stop - lo > 1:
+        yield lo, stop
+
+
+def build_state(ways, nodes, tolerance=SIMPLIFY, bbox=None):
+    """Scenario state {'segments', 'junctions', 'view'} from read_network()'s output."""
+    node_ids, lat, lon = nodes
+    if bbox is not None:
+        west, south, east, north = bbox
+        inside = (lon >= west) & (lon <= east) & (lat >= south) & (lat <= north)
+        node_ids, lat, lon = node_ids[inside], lat[inside], lon[inside]
+    if not len(node_ids):
+        raise ValueError('no road nodes found (check the file and --bbox)')
+    lat0 = (lat.min() + lat.max()) / 2
+    lon0 = (lon.min() + lon.max()) / 2
+    X, Y = project(lat, lon, lat0, lon0)
+    X -= X.min()
+    Y -= Y.min()
+
+    # nodes shared by several ways (or visited twice by one) split ways into edges; all
+    # lookups are done once over the concatenated node lists, the loop below only slices
+    refs = np.concatenate([w[1] for w in ways])
+    uniq, counts = np.unique(refs, return_counts=True)
+    shared = _member(refs, uniq[counts > 1]).tolist()
+    idx = np.minimum(np.searchsorted(node_ids, refs), len(node_ids) - 1)
+    known = (node_ids[idx] == refs).tolist()
+    px = X[idx].tolist()
+    py = Y[idx].tolist()
+    refs = refs.tolist()
+    stops = np.cumsum([len(w[1]) for w in ways]).tolist()
+
+    segments = []
+    twin = {}
+    first = 0
+    for (wid, _, tags), stop in zip(ways, stops):
+        forward, backward = directions(tags)
+        default = DEFAULT_SPEEDS.get(tags.get('highway'), 40) / 3.6
+        v_fwd = round(parse_maxspeed(tags.get('maxspeed:forward') or tags.get('maxspeed')) or default, 2)
+        v_bwd = round(parse_maxspeed(tags.get('maxspeed:backward') or tags.get('maxspeed')) or default, 2)
+        k = 0
+        for lo, hi in _runs(known, shared, first, stop):
+            xs, ys = px[lo:hi], py[lo:hi]
+            kept = simplify(xs, ys, tolerance)
+            for a, b in zip(kept, kept[1:]):
+                start, end = [round(xs[a], 1), round(ys[a], 1)], [round(xs[b], 1), round(ys[b], 1)]
+                if start == end:
+                    continue
+                na, nb = refs[lo + a], refs[lo + b]
+                sid = f'{wid}.{k}'
+                k += 1
+                if forward:
+                    segments.append({'id': sid, 'start': start, 'end': end, 'speed_limit': v_fwd,
+                                     'from': na, 'to': nb})
+                if backward:
+                    segments.append({'id': sid + 'r', 'start': end, 'end': start, 'speed_limit': v_bwd,
+                                     'from': nb, 'to': na})
+                if forward and backward:
+                    twin[sid] = sid + 'r'
+                    twin[sid + 'r'] = sid
+        first = stop
+
+    # per segment end: the segments leaving that node, except the way back
+    leaving = {}
+    for seg in segments:
+        leaving.setdefault(seg['from'], []).append(seg['id'])
+    junctions = []
+    groups = {}  # (node, outputs) -> inputs
+    for seg in segments:
+        outs = tuple(o for o in leaving.get(seg['to'], ()) if o != twin.get(seg['id']))
+        if outs:
+            groups.setdefault((seg['to'], outs), []).append(seg['id'])
+    per_node = {}
+    for (node, outs), inputs in groups.items():
+        n = per_node.get(node, 0)
+        per_node[node] = n + 1
+        junctions.append({'id': f'n{node}' if n == 0 else f'n{node}.{n}', 'inputs': inputs, 'outputs': list(outs),
+                          'mode': 'priority' if len(outs) == 1 else 'random'})
+    for seg in segments:
+        del seg['from'], seg['to']
+
+    width = max(1.0, float(X.max()))
+    height = max(1.0, float(Y.max()))
+    zoom = 0.9 * VIEW_SIZE / max(width, height)
+    view = {'zoom': round(zoom, 6), 'pan_x': round(VIEW_SIZE / 2 - width / 2 * zoom, 2),
+            'pan_y': round(VIEW_SIZE / 2 - height / 2 * zoom, 2),
+            'show_help': False, 'show_labels': False}
+    return {'segments': segments, 'junctions': junctions, 'view': view,
+            'origin': {'lat': round(float(lat0), 6), 'lon': round(float(lon0), 6)}}
+
+
+def boundary_demand(state, flows, rate, seed=0):
+    """Random OD flows from segments nothing feeds (network entries) to segments with no way on (exits)."""
+    fed = {o for j in state['junctions'] for o in j['outputs']}
+    ends = {i for j in state['junctions'] for i in j['inputs']}
+    everywhere = [s['id'] for s in state['segments']]
+    # a network without open ends (e.g. a closed grid) gets flows between any segments
+    entries = [sid for sid in everywhere if sid not in fed] or everywhere
+    exits = [sid for sid in everywhere if sid not in ends] or everywhere
+    if not everywhere:
+        return []
+    rng = random.Random(seed)
+    return [{'origin': rng.choice(entries), 'destination': rng.choice(exits), 'rate': rate} for _ in range(flows)]
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Import the drivable roads of an OpenStreetMap extract as a scenario.')
+    p.add_argument('input', help='.osm (XML) or .osm.pbf file')
+    p.add_argument('--out', required=True, help='scenario JSON to write')
+    p.add_argument('--jobs', type=int, default=None, help='parse processes (default: CPUs)')
+    p.add_argument('--simplify', type=float, default=SIMPLIFY, help='Douglas-Peucker tolerance in meters')
+    p.add_argument('--bbox', default=None, help='west,south,east,north in degrees')
+    p.add_argument('--highways', nargs='+', default=None, choices=sorted(DEFAULT_SPEEDS),
+                   help='road classes to keep (default: all drivable)')
+    p.add_argument('--service', action='store_true', help='also keep driveways and parking aisles')
+    p.add_argument('--demand', type=int, default=0, help='random OD flows between network entries and exits')
+    p.add_argument('--rate', type=float, default=0.05, help='vehicles per second of each generated flow')
+    p.add_argument('--seed', type=int, default=0)
+    args = p.parse_args(argv)
+
+    t0 = time.perf_counter()
+    bbox = tuple(float(v) for v in args.bbox.split(',')) if args.bbox else None
+    ways, nodes = read_network(args.input, args.jobs, args.highways, args.service)
+    try:
+        state = build_state(ways, nodes, args.simplify, bbox)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    if args.demand:
+        state['demand'] = boundary_demand(state, args.demand, args.rate, args.seed)
+    with open(args.out, 'w') as f:
+        f.write(json.dumps({'current_state': state}))  # one C-encoded string; json.dump encodes in Python
+    print(f"{len(state['segments'])} segments, {len(state['junctions'])} junctions written to {args.out} "
+          f'in {time.perf_counter() - t0:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# Scene drawing shared by the live viewer (main.py) and headless export
+# (export.py). Everything here draws into the surface it is given, so it works
+# the same on the display surface and on an off-screen pygame.Surface.
+
+import pygame
+
+import sim
+
+JAM_COLORS = {'jam': (255, 0, 255), 'signal': (120, 140, 255)}
+
+
+def draw_world(surface, world_to_screen, zoom, font, label_font, road_width, car_length,
+               selected_car=None, show_labels=True, span_colors=None, show_cars=True, jams=None, overlays=True):
+    """Draw roads, junctions, cars and segment labels.
+
+    span_colors: optional {segment id: [colour, ...]} from heatmap.Heatmap.colors().
+    show_cars: False leaves the cars out (the heatmap stands in for them when zoomed out).
+    jams: optional jams.JamDetector whose reported jams are outlined under the cars.
+    overlays: False skips headlights and the selected car's rings (time warp in the viewer).
+    """
+    W, H = surface.get_size()
+    segments = sim.segments
+    span_colors = span_colors or {}
+
+    for seg in segments.values():
+        seg.draw_road(surface, world_to_screen, zoom, road_width=road_width, span_colors=span_colors.get(seg.id))
+
+    for junc in sim.junctions:
+        junc.draw_junction(surface, world_to_screen, zoom, road_width=road_width, font=font)
+
+    if jams is not None:
+        draw_jams(surface, world_to_screen, zoom, jams, label_font, road_width)
+
+    if show_cars:
+        for seg in segments.values():
+            seg.draw_cars(surface, world_to_screen, label_font, zoom, W, H, car_length_const=car_length,
+                          selected_car=selected_car, overlays=overlays)
+
+    if show_labels:
+        for seg in segments.values():
+            seg.draw_label(surface, world_to_screen, label_font)
+
+
+def draw_jams(surface, world_to_screen, zoom, detector, font, road_width):
+    """Outline each reported jam's queue pieces and label it at its tail with the tail front speed."""
+    width = max(3, int(road_width * zoom * 0.5))
+    for jam in detector.shown():
+        color = JAM_COLORS.get(jam.cause, JAM_COLORS['jam'])
+        for seg, tail, head in jam.pieces:
+            a = (seg.start[0] + seg.dir[0] * max(0.0, tail), seg.start[1] + seg.dir[1] * max(0.0, tail))
+            b = (seg.start[0] + seg.dir[0] * head, seg.start[1] + seg.dir[1] * head)
+            pygame.draw.line(surface, color, world_to_screen(a), world_to_screen(b), width)
+        if font is not None and jam.tail is not None:
+            seg, pos = jam.tail
+            speed = jam.tail_speed
+            text = f'J{jam.id} {jam.queue_m:.0f} m' + (f' {speed * 3.6:+.0f} km/h' if speed is not None else '')
+            x, y = world_to_screen((seg.start[0] + seg.dir[0] * pos, seg.start[1] + seg.dir[1] * pos))
+            surface.blit(font.render(text, True, color), (x + 6, y - 18))
+
+
+def sync_meso_positions():
+    """Interpolate positions of cars on meso segments before drawing them."""
+    if sim.meso.enabled:
+        for seg in sim.segments.values():
+            sim.meso.sync_positions(seg, sim.sim_time)
+
+
+def network_bounds(segments):
+    """(min_x, min_y, max_x, max_y) over all segment endpoints, or None without segments."""
+    xs = []
+    ys = []
+    for seg in segments.values():
+        xs += [seg.start[0], seg.end[0]]
+        ys += [seg.start[1], seg.end[1]]
+    if not xs:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def fit_view(segments, W, H, padding=40):
+    """(zoom, pan_x, pan_y) that fits the whole network into a W x H surface."""
+    bounds = network_bounds(segments)
+    if bounds is None:
+        return 1.0, 0.0, 0.0
+    min_x, min_y, max_x, max_y = bounds
+    span_x = max(1.0, max_x - min_x)
+    span_y = max(1.0, max_y - min_y)
+    zoom = min((W - 2 * padding) / span_x, (H - 2 * padding) / span_y)
+    pan_x = W / 2.0 - (min_x + max_x) / 2.0 * zoom
+    pan_y = H / 2.0 - (min_y + max_y) / 2.0 * zoom
+    return zoom, pan_x, pan_y
+
@@ -0,0 +1,158 @@
+import heapq
+
+# Shortest-path routing over the segment graph.
+#
+# Nodes are segments and a segment's outputs are its successors. The cost of
+# a route is the travel time of every segment after the origin, so a car's
+# remaining route is always priced from where it currently is.
+#
+# For each destination the table keeps a reverse-Dijkstra tree (distance to
+# the destination and next hop for every segment). Trees for all destinations
+# are precomputed at build time on networks up to ALL_PAIRS_LIMIT segments,
+# otherwise they are computed on first use. Routes are cached per
+# (origin, destination) and only the trees a weight change can affect are
+# dropped by update_weights(), so congestion refreshes stay incremental.
+
+ALL_PAIRS_LIMIT = 2000
+MIN_SPEED = 1.0  # m/s floor when turning observed speeds into travel times
+
+
+class RouteTable:
+    def __init__(self, segments, precompute=None):
+        self.segments = segments
+        self.pred = {sid: [] for sid in segments}
+        for seg in segments.values():
+            for out in seg.outputs:
+                if out.id in self.pred:
+                    self.pred[out.id].append(seg.id)
+        self.weight = {sid: free_flow_time(seg) for sid, seg in segments.items()}
+        self.trees = {}        # destination id -> (dist, next_hop)
+        self.routes = {}       # destination id -> {origin id: tuple of Segments or None}
+        self.tree_builds = 0
+        if precompute is None:
+            precompute = len(segments) <= ALL_PAIRS_LIMIT
+        if precompute:
+            for sid in segments:
+                self._tree(sid)
+
+    def _tree(self, dest):
+        tree = self.trees.get(dest)
+        if tree is not None:
+            return tree
+        dist = {dest: 0.0}
+        next_hop = {}
+        heap = [(0.0, dest)]
+        weight = self.weight
+        while heap:
+            du, u = heapq.heappop(heap)
+            if du > dist[u]:
+                continue
+            nd = du + weight[u]
+            for p in self.pred[u]:
+                if nd < dist.get(p, float('inf')):
+                    dist[p] = nd
+                    next_hop[p] = u
+                    heapq.heappush(heap, (nd, p))
+        tree = (dist, next_hop)
+        self.trees[dest] = tree
+        self.tree_builds += 1
+        return tree
+
+    def route(self, origin, dest):
+        """Tuple of Segments from `origin` to `dest` (both included), or None if unreachable."""
+        cached = self.routes.setdefault(dest, {})
+        if origin in cached:
+            return cached[origin]
+        dist, next_hop = self._tree(dest)
+        path = None
+        if origin == dest:
+            path = (self.segments[origin],)
+        elif origin in next_hop:
+            ids = [origin]
+            cur = origin
+            while cur != dest and len(ids) <= len(self.segments):
+                cur = next_hop[cur]
+                ids.append(cur)
+            path = tuple(self.segments[sid] for sid in ids)
+        cached[origin] = path
+        return path
+
+    def travel_time(self, origin, dest):
+        dist, _ = self._tree(dest)
+        return dist.get(origin, float('inf'))
+
+    def update_weights(self, new_weights):
+        """Apply changed segment travel times, dropping only the trees they can affect.
+        Returns the number of destinations invalidated.
+        """
+        changed = [(sid, w) for sid, w in new_weights.items() if w != self.weight.get(sid)]
+        if not changed:
+            return 0
+        stale = set()
+        for dest, (dist, next_hop) in self.trees.items():
+            for sid, w in changed:
+                if sid not in dist:
+                    continue
+                if w > self.weight[sid]:
+                    # slower: matters only if some shortest path goes through sid
+                    if any(next_hop.get(p) == sid for p in self.pred[sid]):
+                        stale.add(dest)
+                        break
+                else:
+                    # faster: matters if it now beats a predecessor's best
+                    through = w + dist[sid]
+                    if any(through < dist.get(p, float('inf')) for p in self.pred[sid]):
+                        stale.add(dest)
+                        break
+        for sid, w in changed:
+            self.weight[sid] = w
+        for dest in stale:
+            del self.trees[dest]
+            self.routes.pop(dest, None)
+        return len(stale)
+
+
+    # --- topology edits (editor.py) ---
+
+    def add_segment(self, seg):
+        self.pred.setdefault(seg.id, [])
+        self.weight[seg.id] = free_flow_time(seg)
+
+    def remove_segment(self, sid):
+        """Forget a segment that was removed from the network (it must have no links left)."""
+        self._drop_trees_through(sid)
+        self.trees.pop(sid, None)
+        self.routes.pop(sid, None)
+        self.pred.pop(sid, None)
+        self.weight.pop(sid, None)
+
+    def relink(self, seg, old_outputs):
+        """Update the graph after `seg`'s outputs changed from `old_outputs`.
+        Drops the trees in which `seg` or one of its new outputs is reachable.
+        """
+        for out in old_outputs:
+            if seg.id in self.pred.get(out.id, ()):
+                self.pred[out.id].remove(seg.id)
+        for out in seg.outputs:
+            self.pred.setdefault(out.id, []).append(seg.id)
+        self._drop_trees_through(seg.id, [out.id for out in seg.outputs])
+
+    def _drop_trees_through(self, sid, also=()):
+        stale = [dest for dest, (dist, _) in self.trees.items()
+                 if sid in dist or any(o in dist for o in also)]
+        for dest in stale:
+            del self.trees[dest]
+            self.routes.pop(dest, None)
+        return len(stale)
+
+
+def free_flow_time(seg):
+    return seg.length / max(MIN_SPEED, seg.speed_limit)
+
+
+def observed_time(seg):
+    """Travel time across `seg` at the mean speed of the cars on it (free flow if empty)."""
+    if not seg.cars:
+        return free_flow_time(seg)
+    mean_v = sum(c.v for c in seg.cars) / len(seg.cars)
+    return seg.length / max(MIN_SPEED, min(mean_v, seg.speed_limit))
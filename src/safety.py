@@ -0,0 +1,197 @@
+import csv
+import os
+
+import numpy as np
+
+# Surrogate safety measures, computed in one batched pass per tick.
+#
+# Every segment update leaves its follower/leader gaps and speed differences
+# in seg.leader_s / seg.leader_dv (aligned with seg.cars; the front car's entry
+# is its cross-junction leader from get_leader). SafetyMonitor.on_tick()
+# concatenates those arrays for the whole network and evaluates, per pair:
+#
+#   TTC  = s / dv            time to collision, closing pairs only (dv > 0)
+#   DRAC = dv^2 / (2 s)      deceleration rate needed to avoid the crash
+#
+# PET (post-encroachment time) is taken at junctions: when a car enters an
+# output segment, PET is the time since the previous car from a *different*
+# input cleared the start of that segment (merge/crossing conflicts).
+#
+# Results are aggregated per segment (exposure time below the critical
+# thresholds, minimum TTC, maximum DRAC, PET conflicts) plus network-wide
+# histograms, and written to CSV every `interval` simulated seconds. Nothing
+# is stored per car.
+#
+# Stop lines (red/amber signals, closed exits, also downstream ones reached
+# through the lookahead) act as virtual leaders in get_leader; the segment
+# updates flag them in seg.leader_real and those pairs are left out.
+
+TTC_CRITICAL = 1.5    # s
+DRAC_CRITICAL = 3.35  # m/s^2
+PET_CRITICAL = 1.5    # s
+TTC_BINS = np.linspace(0.0, 10.0, 21)
+DRAC_BINS = np.linspace(0.0, 10.0, 21)
+PET_BINS = np.linspace(0.0, 10.0, 21)
+
+FIELDS = ['time', 'segment', 'pair_seconds', 'ttc_exposure_s', 'min_ttc', 'drac_exposure_s', 'max_drac',
+          'pet_events', 'pet_conflicts', 'min_pet']
+
+
+class SafetyMonitor:
+    def __init__(self, segments, step, interval=60.0, path='safety_metrics.csv', hist_path=None):
+        self.step = step
+        self.interval = interval
+        self.path = path
+        self.hist_path = hist_path or _hist_path(path)
+        self.seg_ids = []
+        self.index = {}
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(FIELDS)
+        self._hist_file = open(self.hist_path, 'w', newline='')
+        self._hist_writer = csv.writer(self._hist_file)
+        self._hist_writer.writerow(['time', 'metric', 'bin_lo', 'bin_hi', 'count'])
+        self.set_segments(segments)
+        self._next_flush = interval
+        self._last_time = 0.0
+
+    def set_segments(self, segments):
+        """(Re)index segments; call after topology changes."""
+        self.seg_ids = list(segments.keys())
+        self.index = {sid: i for i, sid in enumerate(self.seg_ids)}
+        self._reset_accumulators()
+
+    def add_segment(self, sid):
+        """Index a segment added by the network editor, keeping the running interval."""
+        if sid in self.index:
+            return
+        self.index[sid] = len(self.seg_ids)
+        self.seg_ids.append(sid)
+        for name, fill in (('pair_ticks', 0), ('ttc_ticks', 0), ('min_ttc', np.inf), ('drac_ticks', 0),
+                           ('max_drac', 0.0), ('pet_events', 0), ('pet_conflicts', 0), ('min_pet', np.inf)):
+            arr = getattr(self, name)
+            setattr(self, name, np.append(arr, np.array([fill], arr.dtype)))
+
+    def _reset_accumulators(self):
+        n = len(self.seg_ids)
+        self.pair_ticks = np.zeros(n, np.int64)
+        self.ttc_ticks = np.zeros(n, np.int64)
+        self.min_ttc = np.full(n, np.inf)
+        self.drac_ticks = np.zeros(n, np.int64)
+        self.max_drac = np.zeros(n)
+        self.pet_events = np.zeros(n, np.int64)
+        self.pet_conflicts = np.zeros(n, np.int64)
+        self.min_pet = np.full(n, np.inf)
+        self.ttc_hist = np.zeros(len(TTC_BINS) - 1, np.int64)
+        self.drac_hist = np.zeros(len(DRAC_BINS) - 1, np.int64)
+        self.pet_hist = np.zeros(len(PET_BINS) - 1, np.int64)
+
+    # --- per tick ---
+
+    def on_tick(self, segments, sim_time):
+        s_parts, dv_parts, real_parts, idx_parts = [], [], [], []
+        index = self.index
+        for sid, seg in segments.items():
+            gaps = seg.leader_s
+            n = len(gaps)
+            # sleeping segments (gridlock.py) keep the arrays of their last update
+            if n == 0 or seg.meso or seg.asleep or n != len(seg.cars):
+                continue
+            s_parts.append(gaps)
+            dv_parts.append(seg.leader_dv)
+            real_parts.append(seg.leader_real)
+            idx_parts.append(np.full(n, index[sid], np.int32))
+        if s_parts:
+            real = np.concatenate([np.asarray(p, np.bool_) for p in real_parts])
+            s = np.concatenate([np.asarray(p, np.float64) for p in s_parts])[real]
+            dv = np.concatenate([np.asarray(p, np.float64) for p in dv_parts])[real]
+            idx = np.concatenate(idx_parts)[real]
+            self._accumulate(s, dv, idx)
+        self._last_time = sim_time
+        if sim_time >= self._next_flush:
+            self.flush(sim_time)
+            self._next_flush = sim_time + self.interval
+
+    def _accumulate(self, s, dv, idx):
+        n_seg = len(self.seg_ids)
+        finite = np.isfinite(s)
+        self.pair_ticks += np.bincount(idx[finite], minlength=n_seg)
+
+        closing = finite & (dv > 0) & (s > 0)
+        if not closing.any():
+            return
+        s_c = s[closing]
+        dv_c = dv[closing]
+        idx_c = idx[closing]
+        ttc = s_c / dv_c
+        drac = dv_c * dv_c / (2.0 * s_c)
+
+        self.ttc_ticks += np.bincount(idx_c[ttc < TTC_CRITICAL], minlength=n_seg)
+        self.drac_ticks += np.bincount(idx_c[drac > DRAC_CRITICAL], minlength=n_seg)
+        np.minimum.at(self.min_ttc, idx_c, ttc)
+        np.maximum.at(self.max_drac, idx_c, drac)
+        self.ttc_hist += np.histogram(ttc, TTC_BINS)[0]
+        self.drac_hist += np.histogram(drac, DRAC_BINS)[0]
+
+    def record_entry(self, output, input_seg, car, sim_time):
+        """Called by sim.transfer_at_junction when `car` enters `output` from `input_seg`."""
+        clear_time = sim_time + car.length / max(car.v, 0.1)
+        last = output.last_clear
+        output.last_clear = (clear_time, input_seg.id)
+        if last is None or last[1] == input_seg.id:
+            return
+        i = self.index.get(output.id)
+        if i is None:
+            return
+        pet = max(0.0, sim_time - last[0])
+        self.pet_events[i] += 1
+        if pet < PET_CRITICAL:
+            self.pet_conflicts[i] += 1
+        if pet < self.min_pet[i]:
+            self.min_pet[i] = pet
+        if pet < PET_BINS[-1]:
+            self.pet_hist[min(len(self.pet_hist) - 1, int(pet / (PET_BINS[1] - PET_BINS[0])))] += 1
+
+    # --- output ---
+
+    def flush(self, sim_time):
+        t = round(sim_time, 3)
+        step = self.step
+        for i, sid in enumerate(self.seg_ids):
+            if self.pair_ticks[i] == 0 and self.pet_events[i] == 0:
+                continue
+            self._writer.writerow([
+                t, sid,
+                round(self.pair_ticks[i] * step, 3),
+                round(self.ttc_ticks[i] * step, 3),
+                _fmt(self.min_ttc[i]),
+                round(self.drac_ticks[i] * step, 3),
+                round(float(self.max_drac[i]), 3),
+                int(self.pet_events[i]),
+                int(self.pet_conflicts[i]),
+                _fmt(self.min_pet[i]),
+            ])
+        for name, bins, hist in (('ttc', TTC_BINS, self.ttc_hist), ('drac', DRAC_BINS, self.drac_hist),
+                                 ('pet', PET_BINS, self.pet_hist)):
+            for k, count in enumerate(hist):
+                if count:
+                    self._hist_writer.writerow([t, name, bins[k], bins[k + 1], int(count)])
+        self._file.flush()
+        self._hist_file.flush()
+        self._reset_accumulators()
+
+    def close(self):
+        """Write the partial last interval and close the files."""
+        if not self._file.closed:
+            self.flush(self._last_time)
+            self._file.close()
+            self._hist_file.close()
+
+
+def _fmt(x):
+    return round(float(x), 3) if np.isfinite(x) else ''
+
+
+def _hist_path(path):
+    root, ext = os.path.splitext(path)
+    return f'{root}_hist{ext or ".csv"}'
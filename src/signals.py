@@ -0,0 +1,199 @@
+import heapq
+
+# Traffic signal control for junctions.
+#
+# A junction gets a signal when its config entry has a "signal" section:
+#
+#   "signal": {
+#     "plans": [
+#       {"start": 0, "offset": 0, "phases": [
+#          {"green": ["northsouth"], "duration": 30, "amber": 3},
+#          {"green": ["side"], "duration": 15, "amber": 3,
+#           "min_green": 8, "max_green": 30, "extension": 2, "detector": 30}
+#       ]},
+#       {"start": 25200, "offset": 12, "cycle": 90, "phases": [...]}
+#     ]
+#   }
+#
+# - plans are picked by time of day (`start` in seconds after midnight, see
+#   SignalSystem.day_start); the latest plan whose start has passed is active
+# - the cycle is the sum of green + amber times; a larger explicit `cycle`
+#   adds all-red clearance at the end
+# - `offset` shifts the cycle start, which is how green waves are set up
+# - a phase with `max_green` is actuated: it runs `min_green` (default
+#   `duration`) and then extends by `extension` seconds at a time while a car
+#   is within `detector` meters of the stop line, up to `max_green`
+# - green times (`duration`, `min_green`), `extension` and an explicit
+#   `cycle` must be positive and `amber` not negative (ValueError otherwise)
+#
+# Each input segment carries `signal_state` ('green', 'amber', 'red' or None
+# for unsignalised). sim.get_leader treats a red (or stoppable amber) stop
+# line as a stopped leader, and sim.step skips junctions that are all red.
+#
+# Controllers only do work when a phase ends: SignalSystem keeps a heap of
+# next change times, so ticks without a change cost one comparison.
+
+DAY = 86400.0
+
+
+class SignalController:
+    def __init__(self, junction, signal_cfg):
+        self.junction = junction
+        self.config = signal_cfg
+        self.plans = sorted(signal_cfg.get('plans', []), key=lambda p: p.get('start', 0))
+        if not self.plans:
+            raise ValueError(f'signal at junction {junction.id!r} has no plans')
+        for plan in self.plans:
+            if not plan.get('phases'):
+                raise ValueError(f'signal plan at junction {junction.id!r} has no phases')
+            # a stage of length 0 would be rescheduled at the same time forever
+            if plan.get('cycle', 1.0) <= 0:
+                raise ValueError(f'signal plan at junction {junction.id!r} has a cycle <= 0')
+            for phase in plan['phases']:
+                if _phase_green(phase) <= 0 or phase.get('amber', 3.0) < 0:
+                    raise ValueError(f'signal phase at junction {junction.id!r} needs a green time > 0 '
+                                     'and an amber time >= 0')
+                if 'max_green' in phase and phase.get('extension', 2.0) <= 0:
+                    raise ValueError(f'actuated signal phase at junction {junction.id!r} has an extension <= 0')
+        self.plan = None
+        self.phase_idx = 0
+        self.stage = 'red'       # 'green', 'amber' or 'red' (all-red clearance)
+        self.stage_start = 0.0
+        self.next_change = 0.0
+        self.all_red = False
+        self.changes = 0
+
+    # --- state ---
+
+    def _plan_for(self, day_time):
+        active = self.plans[-1]  # wraps around midnight
+        for plan in self.plans:
+            if plan.get('start', 0) <= day_time:
+                active = plan
+        return active
+
+    def _apply_states(self):
+        """Push the current phase to the input segments' signal_state."""
+        green_ids = set()
+        if self.stage in ('green', 'amber'):
+            green_ids = set(self.plan['phases'][self.phase_idx].get('green', []))
+        any_open = False
+        for seg in self.junction.inputs:
+            if seg.id in green_ids:
+                seg.signal_state = self.stage
+                any_open = True
+            else:
+                seg.signal_state = 'red'
+        self.all_red = not any_open
+
+    def refresh(self):
+        """Re-apply the current phase after the junction's inputs changed (network editor)."""
+        if self.plan is not None:
+            self._apply_states()
+
+    def sync(self, sim_time, day_start=0.0):
+        """Place the controller in its plan's cycle at `sim_time` (start-up and plan changes)."""
+        self.plan = self._plan_for((sim_time + day_start) % DAY)
+        cycle = _plan_cycle(self.plan)
+        cycle_start = sim_time - (sim_time - self.plan.get('offset', 0.0)) % cycle
+        start = cycle_start
+        for i, phase in enumerate(self.plan['phases']):
+            g = _phase_green(phase)
+            a = phase.get('amber', 3.0)
+            if sim_time < start + g:
+                self._start(i, 'green', start, g)
+                return
+            if sim_time < start + g + a:
+                self._start(i, 'amber', start + g, a)
+                return
+            start += g + a
+        # remaining all-red clearance until the cycle ends
+        self._start(len(self.plan['phases']) - 1, 'red', start, cycle_start + cycle - start)
+
+    def _start(self, phase_idx, stage, start, length):
+        self.phase_idx = phase_idx
+        self.stage = stage
+        self.stage_start = start
+        self.next_change = start + length
+        self._apply_states()
+
+    def advance(self, sim_time, day_start=0.0):
+        """Handle the change due at `self.next_change`. Returns the next change time."""
+        phases = self.plan['phases']
+        phase = phases[self.phase_idx]
+        now = self.next_change
+        if self.stage == 'green':
+            if 'max_green' in phase and self._detector_occupied(phase):
+                limit = self.stage_start + phase['max_green']
+                if now < limit:
+                    self.next_change = min(limit, now + phase.get('extension', 2.0))
+                    return self.next_change
+            self._start(self.phase_idx, 'amber', now, phase.get('amber', 3.0))
+        elif self.stage == 'amber':
+            if self.phase_idx + 1 < len(phases):
+                nxt = phases[self.phase_idx + 1]
+                self._start(self.phase_idx + 1, 'green', now, _phase_green(nxt))
+            else:
+                used = sum(_phase_green(p) + p.get('amber', 3.0) for p in phases)
+                clearance = _plan_cycle(self.plan) - used
+                if clearance > 0:
+                    self._start(self.phase_idx, 'red', now, clearance)
+                else:
+                    self._new_cycle(now, day_start)
+        else:
+            self._new_cycle(now, day_start)
+        self.changes += 1
+        return self.next_change
+
+    def _new_cycle(self, now, day_start):
+        plan = self._plan_for((now + day_start) % DAY)
+        if plan is not self.plan:
+            self.sync(now, day_start)
+            return
+        self._start(0, 'green', now, _phase_green(self.plan['phases'][0]))
+
+    def _detector_occupied(self, phase):
+        reach = phase.get('detector', 30.0)
+        green_ids = phase.get('green', [])
+        for seg in self.junction.inputs:
+            if seg.id in green_ids:
+                for car in seg.cars:
+                    if car.pos >= seg.length - reach:
+                        return True
+        return False
+
+
+class SignalSystem:
+    """All signal controllers of a network, advanced through a heap of change times."""
+
+    def __init__(self, day_start=0.0):
+        self.controllers = []
+        self.heap = []
+        self.day_start = day_start
+
+    def add(self, controller):
+        self.controllers.append(controller)
+
+    def start(self, sim_time):
+        self.heap = []
+        for i, c in enumerate(self.controllers):
+            c.sync(sim_time, self.day_start)
+            heapq.heappush(self.heap, (c.next_change, i))
+
+    def update(self, sim_time):
+        heap = self.heap
+        while heap and heap[0][0] <= sim_time:
+            _, i = heapq.heappop(heap)
+            nxt = self.controllers[i].advance(sim_time, self.day_start)
+            heapq.heappush(heap, (nxt, i))
+
+
+def _phase_green(phase):
+    if 'max_green' in phase:
+        return phase.get('min_green', phase.get('duration', 10.0))
+    return phase.get('duration', 10.0)
+
+
+def _plan_cycle(plan):
+    used = sum(_phase_green(p) + p.get('amber', 3.0) for p in plan['phases'])
+    return max(used, plan.get('cycle', used))
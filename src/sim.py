@@ -1,16 +1,50 @@
-import math, random
+import math, random, heapq
 from entities import Segment, Car, Junction
+import signals
+import routing
+import meso
+import kernels
+import jams
+import models
+import events
 
 # Simulation-level constants will be set by caller or assumed defaults
 STEP = 0.05
 CAR_LENGTH = 4.5
 MARGIN = 4.0
+LOOKAHEAD = 300.0  # how far past the end of its segment a front car looks for a leader (m)
+ROUTE_REFRESH = 10.0    # seconds between congestion updates of the route table
+ROUTE_SMOOTHING = 0.5   # weight of the newest observation in segment travel times
+ROUTE_THRESHOLD = 0.1   # relative travel time change that triggers a route table update
+USE_KERNEL = True       # use the compiled segment kernel when Numba is installed (see kernels.py)
+JUNCTION_MODES = ('round_robin', 'priority', 'fixed', 'random')
+CAR_PARAMS = {'length': CAR_LENGTH, 'v0': 33.3, 'a_max': 3.0, 'b_max': 4.0, 'T': 1.8, 's0': 3.0}
 
 # Simulation state
 segments = {}
 junctions = []
 spawn_rate = 0.8
 spawn_timer = 0
+sim_tick = 0
+sim_time = 0.0
+signal_system = signals.SignalSystem()
+route_table = None
+demand = []   # OD flows: {'origin', 'destination', 'rate', 'timer', 'backlog'}
+sinks = []    # segments without outputs; cars leave the network at their end
+arrived = 0
+arrived_time_total = 0.0
+collisions = 0  # cars that started overlapping their leader or follower
+next_car_id = 0
+safety = None  # safety.SafetyMonitor when enabled in the state's 'safety' section
+jam_detector = None  # jams.JamDetector when enabled in the state's 'jams' section
+emissions = None  # emissions.EmissionsMonitor when enabled in the state's 'emissions' section
+gridlock = None  # gridlock.GridlockMonitor when enabled in the state's 'gridlock' section
+car_params = dict(CAR_PARAMS)  # IDM parameters of spawned cars ('car_params' in the state)
+vehicle_classes = {}  # name -> {'share': weight, <CAR_PARAMS overrides>} ('vehicle_classes' in the state)
+rng_seed = None       # seed of the random streams ('seed' in the state), None = global random module
+class_rng = random    # vehicle class draws
+scheduler = events.EventScheduler(STEP)  # the scenario's 'events', see events.py
+car_models = False    # True when some cars use a model other than IDM; segments then go through models.py
 
 # Helper functions moved from main
 
@@ -24,7 +58,48 @@ def idm_acceleration(car, s, dv, v_free):
     return max(-car.b_max, min(car.a_max, a))
 
 
+def stops_at_signal(seg, car, gap):
+    """True if `car`, `gap` meters before the end of `seg`, should stop for its signal.
+    Red always stops; amber only when the car can still brake comfortably.
+    """
+    state = seg.signal_state
+    if state == 'red':
+        return True
+    if state == 'amber':
+        return car.v * car.v / (2 * car.b_max) <= gap
+    return False
+
+
+def rebuild_leader_cache(segs=None):
+    """Precompute each segment's downstream lookahead as (segment, offset, parent) entries.
+    offset is the distance from the start of `seg` to the start of the downstream
+    segment; parent indexes the entry it was reached from (-1 for direct outputs).
+    Entries are in increasing offset order and stop LOOKAHEAD meters past the end.
+    """
+    for seg in (segs if segs is not None else segments.values()):
+        entries = []
+        best = {}
+        heap = [(seg.length, i, out, -1) for i, out in enumerate(seg.outputs)]
+        heapq.heapify(heap)
+        counter = len(heap)
+        while heap:
+            offset, _, cur, parent = heapq.heappop(heap)
+            if cur.id in best or offset - seg.length > LOOKAHEAD:
+                continue
+            best[cur.id] = offset
+            entries.append((cur, offset, parent))
+            idx = len(entries) - 1
+            for out in cur.outputs:
+                if out.id not in best:
+                    heapq.heappush(heap, (offset + cur.length, counter, out, idx))
+                    counter += 1
+        seg.lookahead = entries
+
+
 def get_leader(seg, car_idx):
+    """Gap and speed difference to the leader of seg.cars[car_idx], and whether that leader is a car.
+    Stop lines (red / stoppable amber signals, closed exits) are virtual, standing leaders.
+    """
     car = seg.cars[car_idx]
 
     # local leader
@@ -32,49 +107,92 @@ def get_leader(seg, car_idx):
         leader = seg.cars[car_idx - 1]
         s = leader.pos - car.pos - leader.length
         dv = car.v - leader.v
-        return s, dv
+        return s, dv, True
+
+    # own stop line acts as a stopped leader while the signal holds us (or every way on is closed)
+    if seg.exit_closed or (seg.signal_state is not None and stops_at_signal(seg, car, seg.length - car.pos)):
+        return seg.length - car.pos, car.v, False
+
+    # routed cars only look down their own route
+    if car.route is not None:
+        return _route_leader(seg, car)
 
+    # walk the cached lookahead; a branch ends at its first car or red stop line
     best_s = float('inf')
     best_dv = 0
-    visited = set()
-    queue = [(seg, seg.length)]
-
-    while queue:
-        current_seg, dist_offset = queue.pop(0)
-        if current_seg.id in visited:
+    best_real = False
+    blocked = []
+    for out_seg, offset, parent in seg.lookahead:
+        if parent >= 0 and blocked[parent]:
+            blocked.append(True)
             continue
-        visited.add(current_seg.id)
-
-        if current_seg.cars:
-            rear_car = min(current_seg.cars, key=lambda c: c.pos)
-            s = dist_offset + rear_car.pos - car.pos - rear_car.length
+        if out_seg.cars:
+            if out_seg.meso:
+                meso.sync_positions(out_seg, sim_time)
+            rear_car = min(out_seg.cars, key=lambda c: c.pos)
+            s = offset + rear_car.pos - car.pos - rear_car.length
             dv = car.v - rear_car.v
-            if s < best_s:
-                best_s = s
-                best_dv = dv
-
-        outputs = []
-        if hasattr(current_seg, 'outputs') and current_seg.outputs:
-            outputs = current_seg.outputs
-        for out_seg in outputs:
-            if out_seg.id not in visited:
-                queue.append((out_seg, dist_offset + out_seg.length))
-
-    return (best_s, best_dv) if best_s != float('inf') else (float('inf'), 0)
+            real = True
+            blocked.append(True)
+        elif out_seg.exit_closed or (out_seg.signal_state is not None
+                                     and stops_at_signal(out_seg, car, offset + out_seg.length - car.pos)):
+            s = offset + out_seg.length - car.pos
+            dv = car.v
+            real = False
+            blocked.append(True)
+        else:
+            blocked.append(False)
+            continue
+        if s < best_s:
+            best_s = s
+            best_dv = dv
+            best_real = real
+
+    return (best_s, best_dv, best_real) if best_s != float('inf') else (float('inf'), 0, False)
+
+
+def _route_leader(seg, car):
+    route = car.route
+    offset = seg.length
+    for i in range(car.route_idx + 1, len(route)):
+        if offset - seg.length > LOOKAHEAD:
+            break
+        nxt = route[i]
+        if nxt.cars:
+            if nxt.meso:
+                meso.sync_positions(nxt, sim_time)
+            rear_car = min(nxt.cars, key=lambda c: c.pos)
+            return offset + rear_car.pos - car.pos - rear_car.length, car.v - rear_car.v, True
+        if nxt.exit_closed or (nxt.signal_state is not None and stops_at_signal(nxt, car, offset + nxt.length - car.pos)):
+            return offset + nxt.length - car.pos, car.v, False
+        offset += nxt.length
+    return float('inf'), 0, False
 
 
 def update_cars(seg, STEP_local=0.05):
+    """IDM update of one segment's cars; returns the number of cars that started colliding."""
     if not seg.cars:
-        return
+        return 0
     seg.cars.sort(key=lambda c: c.pos, reverse=True)
+    was_colliding = [c.colliding for c in seg.cars]
 
+    gaps = []
+    dvs = []
+    reals = []
+    vs = []
+    accs = []
     for i, car in enumerate(seg.cars):
         v_free = min(car.v0, seg.speed_limit)
-        s, dv = get_leader(seg, i)
+        s, dv, real = get_leader(seg, i)
+        gaps.append(s)
+        dvs.append(dv)
+        reals.append(real)
         a = idm_acceleration(car, s, dv, v_free)
         car.a = a  # store for display
         car.v = max(0, car.v + a * STEP)
         car.pos += car.v * STEP
+        vs.append(car.v)
+        accs.append(a)
 
         # === ACCELERATION STATE ===
         if a > 0.5 * car.a_max:
@@ -120,19 +238,74 @@ def update_cars(seg, STEP_local=0.05):
             'risk_reason': risk_reason,
         }
 
+    # follower/leader arrays for batched analytics (see safety.py)
+    seg.leader_s = gaps
+    seg.leader_dv = dvs
+    seg.leader_real = reals
+    seg.car_v = vs
+    seg.car_a = accs
+    return sum(1 for car, was in zip(seg.cars, was_colliding) if car.colliding and not was)
+
+
+def record_exit(seg, car):
+    """Count a car leaving `seg` and its time on it (flow / travel time metrics)."""
+    seg.exits += 1
+    seg.travel_time_total += sim_time - car.seg_entry_time
+
+
+def arrive(car):
+    """Record a car leaving the network."""
+    global arrived, arrived_time_total
+    arrived += 1
+    arrived_time_total += sim_time - car.spawn_time
+    if emissions is not None:
+        emissions.record_arrival(car, sim_time)
+    car.segment = None
+
+
+def next_on_route(car, input_seg, junction):
+    """Output segment on the car's (possibly refreshed) route, or None to fall back to the junction mode."""
+    route = route_table.route(input_seg.id, car.destination) if route_table is not None else None
+    car.route = route
+    car.route_idx = 0
+    if route is None or len(route) < 2 or route[1] not in junction.outputs:
+        car.route = None
+        return None
+    return route[1]
+
 
 def transfer_at_junction(junction):
     for input_seg in junction.inputs:
+        if input_seg.signal_state == 'red' or input_seg.asleep:
+            continue
         exiting = [c for c in input_seg.cars if c.pos >= input_seg.length]
         for car in exiting:
             input_seg.remove_car(car)
-            if junction.mode == "round_robin":
-                output = junction.outputs[junction.counter % len(junction.outputs)]
-                junction.counter += 1
-            elif junction.mode in ["priority", "fixed"]:
-                output = junction.outputs[0]
-            else:
-                output = random.choice(junction.outputs)
+            if car.destination is not None and input_seg.id == car.destination:
+                record_exit(input_seg, car)
+                arrive(car)
+                if gridlock is not None:
+                    gridlock.clear(input_seg)
+                continue
+
+            output = None
+            if car.destination is not None:
+                output = next_on_route(car, input_seg, junction)
+            if output is None:
+                if junction.mode == "round_robin":
+                    output = junction.outputs[junction.counter % len(junction.outputs)]
+                    junction.counter += 1
+                elif junction.mode in ["priority", "fixed"]:
+                    output = junction.outputs[0]
+                else:
+                    output = junction.rng.choice(junction.outputs)
+            if output.closed:
+                # detour through the first open output; routes already avoid closed segments
+                car.route = None
+                output = next((out for out in junction.outputs if not out.closed), None)
+                if output is None:
+                    input_seg.add_car(car, input_seg.length - 0.1)
+                    continue
 
             entry = 0
             if output.cars:
@@ -140,14 +313,138 @@ def transfer_at_junction(junction):
                 min_gap = car.length + first_car.length + car.s0
                 if first_car.pos < min_gap:
                     input_seg.add_car(car, input_seg.length - 0.1)
+                    if gridlock is not None:
+                        gridlock.block(input_seg, output, sim_time)
                     continue
+            record_exit(input_seg, car)
+            if gridlock is not None:
+                gridlock.clear(input_seg)
             output.add_car(car, entry)
             car.v = min(car.v, output.speed_limit)
+            car.seg_entry_time = sim_time
+            if car.route is not None:
+                car.route_idx = 1
+            if output.meso:
+                meso.schedule(output, car, sim_time)
+            if safety is not None:
+                safety.record_entry(output, input_seg, car, sim_time)
+
+
+def remove_at_sinks():
+    for seg in sinks:
+        if seg.cars:
+            leaving = [c for c in seg.cars if c.pos >= seg.length]
+            for car in leaving:
+                seg.remove_car(car)
+                record_exit(seg, car)
+                arrive(car)
+
+
+def spawn_demand():
+    """Spawn routed cars for each OD flow in `demand` (rate in vehicles per second).
+    Cars that come due while the origin has no room (or is closed / held) wait in the
+    flow's backlog and enter one per tick once it has, so the rate holds through congestion.
+    """
+    for od in demand:
+        if od['rate'] > 0:
+            od['timer'] += STEP
+            interval = 1.0 / od['rate']
+            if od['timer'] >= interval:
+                od['timer'] -= interval
+                od['backlog'] += 1
+        if not od['backlog']:
+            continue
+        origin = segments.get(od['origin'])
+        if origin is None or origin.closed or (gridlock is not None and gridlock.holds(origin)):
+            continue
+        if origin.meso:
+            meso.sync_positions(origin, sim_time)
+        if not origin.cars or min(c.pos for c in origin.cars) > 30:
+            spawn_into(od['origin'], destination=od['destination'])
+            od['backlog'] -= 1
+
+
+def spawn_default(elapsed):
+    """Default spawning into 'northsouth' at spawn_rate; scenarios with OD demand skip it.
+    `elapsed` is the time since the last call (STEP when called before each tick).
+    """
+    global spawn_timer
+    if demand:
+        return
+    spawn_timer += elapsed
+    if spawn_timer > 1.0 / max(1e-6, spawn_rate):
+        north = segments.get('northsouth')
+        if north is not None and not north.closed and (not north.cars or north.cars[-1].pos > 30) \
+                and (gridlock is None or not gridlock.holds(north)):
+            spawn_into('northsouth')
+        spawn_timer = 0
+
+
+def refresh_routes():
+    """Feed smoothed observed travel times into the route table (only meaningful changes)."""
+    if route_table is None:
+        return 0
+    changed = {}
+    for sid, seg in segments.items():
+        if seg.closed:
+            continue
+        old = route_table.weight[sid]
+        new = (1 - ROUTE_SMOOTHING) * old + ROUTE_SMOOTHING * routing.observed_time(seg)
+        if abs(new - old) > ROUTE_THRESHOLD * old:
+            changed[sid] = new
+    return route_table.update_weights(changed)
+
+
+def step():
+    """Advance the simulation by one tick: integrate all segments, then transfer at junctions."""
+    global sim_tick, sim_time, collisions
+    if sim_tick >= scheduler.next_tick:
+        scheduler.run_due(sim_tick)
+    signal_system.update(sim_time)
+    if demand:
+        spawn_demand()
+
+    if meso.enabled:
+        meso.update_modes(segments, sim_time)
+        meso.release_due(sim_time)
+    if gridlock is not None:
+        gridlock.on_tick(sim_time)
+
+    use_kernel = USE_KERNEL and kernels.AVAILABLE
+    for seg in segments.values():
+        if seg.meso or seg.asleep:
+            continue
+        if car_models:
+            collisions += models.update_segment(seg, STEP, MARGIN, get_leader)
+        elif use_kernel:
+            collisions += kernels.update_segment(seg, STEP, MARGIN, get_leader)
+        else:
+            collisions += update_cars(seg, STEP)
+    if safety is not None:
+        safety.on_tick(segments, sim_time + STEP)
+    if emissions is not None:
+        emissions.on_tick(segments, sim_time + STEP)
+
+    for j in junctions:
+        if j.signal is not None and j.signal.all_red:
+            continue
+        transfer_at_junction(j)
+    remove_at_sinks()
+    if meso.enabled:
+        meso.after_transfer(sim_time)
+
+    sim_tick += 1
+    sim_time += STEP
+    if jam_detector is not None:
+        jam_detector.on_tick(segments, sim_time)
+    if route_table is not None and sim_tick % int(round(ROUTE_REFRESH / STEP)) == 0:
+        refresh_routes()
 
 
 def build_from_config(config):
     """Initialize segments and junctions from config['current_state'] or default."""
-    global segments, junctions, spawn_rate, spawn_timer
+    global segments, junctions, spawn_rate, spawn_timer, signal_system, route_table, demand, sinks, safety
+    global car_params, vehicle_classes, jam_detector, car_models, scheduler, emissions, gridlock
     segments = {}
     junctions = []
 
@@ -179,6 +476,8 @@ def build_from_config(config):
             elif hasattr(out, 'id'):
                 outputs.append(out)
         j = Junction(jdata['id'], inputs if len(inputs)>1 else (inputs[0] if inputs else []), outputs if len(outputs)>1 else (outputs[0] if outputs else []), mode=jdata.get('mode','priority'))
+        if 'signal' in jdata:
+            j.signal = signals.SignalController(j, jdata['signal'])
         junctions.append(j)
 
     # After creating junctions, ensure segments have outputs lists if needed (some junction definitions expect this)
@@ -187,9 +486,108 @@ def build_from_config(config):
         for inp in j.inputs:
             if inp and isinstance(inp, Segment):
                 inp.outputs = j.outputs if isinstance(j.outputs, list) else [j.outputs]
+    rebuild_leader_cache()
+    meso.reset()
+    meso.enabled = state.get('meso', False)
+
+    # surrogate safety analytics streamed to CSV
+    if safety is not None:
+        safety.close()
+        safety = None
+    safety_cfg = state.get('safety', {})
+    if safety_cfg.get('enabled', False):
+        import safety as safety_mod  # needs numpy
+        safety = safety_mod.SafetyMonitor(segments, STEP, interval=safety_cfg.get('interval', 60.0),
+                                          path=safety_cfg.get('path', 'safety_metrics.csv'))
+    # queue / shockwave detection
+    if jam_detector is not None:
+        jam_detector.close()
+        jam_detector = None
+    jams_cfg = state.get('jams', {})
+    if jams_cfg.get('enabled', False):
+        jam_detector = jams.JamDetector(path=jams_cfg.get('path', 'jams.csv'),
+                                        jam_speed=jams_cfg.get('speed', jams.JAM_SPEED))
+    # fuel / energy / CO2 / NOx per vehicle and segment
+    if emissions is not None:
+        emissions.close()
+        emissions = None
+    emissions_cfg = state.get('emissions', {})
+    if emissions_cfg.get('enabled', False):
+        import emissions as emissions_mod  # needs numpy
+        emissions = emissions_mod.EmissionsMonitor(
+            segments, STEP, interval=emissions_cfg.get('interval', 60.0),
+            path=emissions_cfg.get('path', 'emissions.csv'), vehicles_path=emissions_cfg.get('vehicles_path'),
+            table=emissions_cfg.get('table'))
+    # wait-for graph over junction transfers: gridlocks and sleeping blocked segments
+    if gridlock is not None:
+        gridlock.close()
+        gridlock = None
+    gridlock_cfg = state.get('gridlock', {})
+    if gridlock_cfg.get('enabled', False):
+        import gridlock as gridlock_mod
+        gridlock = gridlock_mod.GridlockMonitor(path=gridlock_cfg.get('path', 'gridlock.csv'),
+                                                resolve=gridlock_cfg.get('resolve', 'teleport'),
+                                                confirm=gridlock_cfg.get('confirm', gridlock_mod.CONFIRM),
+                                                sleep=gridlock_cfg.get('sleep', True))
+    sinks = [seg for seg in segments.values() if not seg.outputs]
+
+    # shortest-path tables for routed cars
+    route_table = routing.RouteTable(segments)
+    demand = [{'origin': od['origin'], 'destination': od['destination'], 'rate': od.get('rate', 0.1), 'timer': 0.0,
+               'backlog': 0} for od in state.get('demand', [])]
+
+    # signals start in the phase their plan/offset puts them in at the current time
+    signal_system = signals.SignalSystem(day_start=state.get('time_of_day', 0.0))
+    for j in junctions:
+        if j.signal is not None:
+            signal_system.add(j.signal)
+    signal_system.start(sim_time)
 
     spawn_rate = state.get('spawn_rate', spawn_rate)
     spawn_timer = 0
+    own = state.get('car_params', {})
+    car_params = dict(CAR_PARAMS, **models.get(own.get('model', models.DEFAULT)).defaults())
+    car_params.update(own)
+    vehicle_classes = {name: dict(cls) for name, cls in state.get('vehicle_classes', {}).items()}
+    for params in [car_params] + [class_params(name) for name in vehicle_classes]:
+        models.resolve(params.get('model', models.DEFAULT), params)  # unknown models / bad values fail here
+        if emissions is not None:
+            emissions.check_profile(params.get('emissions'))
+    car_models = any(params.get('model', models.DEFAULT) != 'idm'
+                     for params in [car_params] + list(vehicle_classes.values()))
+    seed_streams(state.get('seed'))
+
+    # scripted events, timed from now
+    scheduler = events.EventScheduler(STEP, start_tick=sim_tick)
+    for event in state.get('events', []):
+        scheduler.add(event)
+
+
+def set_closed(seg, closed):
+    """Close `seg` to entering cars (or reopen it): routes avoid it, and segments whose outputs
+    are all closed hold their cars at the stop line."""
+    seg.closed = closed
+    if route_table is not None:
+        route_table.update_weights({seg.id: float('inf') if closed else routing.free_flow_time(seg)})
+    preds = route_table.pred.get(seg.id, ()) if route_table is not None else ()
+    for sid in preds:
+        pred = segments[sid]
+        pred.exit_closed = bool(pred.outputs) and all(out.closed for out in pred.outputs)
+
+
+def seed_streams(seed):
+    """Derive independent, reproducible random streams from `seed` (None: use the global random module).
+
+    Every junction in 'random' mode and the vehicle class draw get a stream of
+    their own, so two variants of a scenario run with the same seed see the
+    same draws where they are the same (common random numbers).
+    """
+    global rng_seed, class_rng
+    rng_seed = seed
+    class_rng = random if seed is None else random.Random(f'{seed}:classes')
+    models.seed(seed)
+    for j in junctions:
+        j.rng = random if seed is None else random.Random(f'{seed}:junction:{j.id}')
 
 
 def update_config_current_state(config):
@@ -197,48 +595,124 @@ def update_config_current_state(config):
     Only stores geometric/structural info (start/end/speed_limit and junction modes) and leaves cars out.
     """
     state = config.setdefault('current_state', {})
-    state.setdefault('segments', [])
-    state.setdefault('junctions', [])
+    apply_snapshot(state, snapshot_state())
+    # view will be handled by caller (main)
 
-    # segments
-    seg_list = []
-    for seg in segments.values():
-        seg_list.append({
-            'id': seg.id,
-            'start': [seg.start[0], seg.start[1]],
-            'end': [seg.end[0], seg.end[1]],
-            'speed_limit': seg.speed_limit
-        })
-    state['segments'] = seg_list
-
-    # junctions
-    j_list = []
-    for j in junctions:
-        j_list.append({
-            'id': j.id,
-            'inputs': [s.id for s in j.inputs],
-            'outputs': [s.id for s in (j.outputs if isinstance(j.outputs, list) else [j.outputs])],
-            'mode': j.mode
-        })
-    state['junctions'] = j_list
 
-    # view will be handled by caller (main)
+def snapshot_state():
+    """Cheap copy of the network for update_config_current_state, taken between ticks.
+
+    Only references immutable values (segment ids and endpoints) and copies the
+    junction lists, so it costs a fraction of building the config lists;
+    apply_snapshot() turns it into those lists later, possibly on another thread.
+    """
+    segs = [(seg.id, seg.start, seg.end, seg.speed_limit) for seg in segments.values()]
+    juncs = [(j.id, tuple(j.inputs), tuple(j.outputs) if isinstance(j.outputs, list) else (j.outputs,), j.mode,
+              None if j.signal is None else dict(j.signal.config)) for j in junctions]
+    events_list = [dict(event) for event in scheduler.events]
+    return segs, juncs, events_list
+
+
+def apply_snapshot(state, snapshot, rows=None):
+    """Store a snapshot_state() result in a config state dict.
+
+    `rows(items, convert)` builds each list; the default converts every entry
+    up front, autosave passes one that converts them while they are written.
+    """
+    rows = rows or (lambda items, convert: [convert(item) for item in items])
+    segs, juncs, events_list = snapshot
+    state['segments'] = rows(segs, _segment_entry)
+    state['junctions'] = rows(juncs, _junction_entry)
+    if events_list or 'events' in state:
+        state['events'] = events_list
+
+
+def _segment_entry(item):
+    sid, start, end, limit = item
+    return {'id': sid, 'start': [start[0], start[1]], 'end': [end[0], end[1]], 'speed_limit': limit}
+
+
+def _junction_entry(item):
+    jid, inputs, outputs, mode, signal = item
+    jdata = {
+        'id': jid,
+        'inputs': [s.id for s in inputs],
+        'outputs': [s.id for s in outputs],
+        'mode': mode
+    }
+    if signal is not None:
+        jdata['signal'] = signal
+    return jdata
+
+
+def reset_clock():
+    """Zero the sim clock and run counters (fresh headless runs; the viewer keeps counting across resets)."""
+    global sim_tick, sim_time, arrived, arrived_time_total, collisions, next_car_id
+    sim_tick = 0
+    sim_time = 0.0
+    arrived = 0
+    arrived_time_total = 0.0
+    collisions = 0
+    next_car_id = 0
 
 
 def reset_to_default_state(config):
     build_from_config(config)
 
 
-def spawn_into(segment_id):
+def pick_vehicle_class():
+    """Random vehicle class name, weighted by each class's 'share'."""
+    total = sum(cls.get('share', 1.0) for cls in vehicle_classes.values())
+    r = class_rng.random() * total
+    for name, cls in vehicle_classes.items():
+        r -= cls.get('share', 1.0)
+        if r < 0:
+            return name
+    return name
+
+
+def class_params(name):
+    """car_params with vehicle class `name`'s overrides; a class that switches model starts from its defaults."""
+    cls = vehicle_classes[name]
+    params = car_params
+    if cls.get('model', params.get('model', models.DEFAULT)) != params.get('model', models.DEFAULT):
+        params = dict(params, **models.get(cls['model']).defaults())
+    return dict(params, **{k: v for k, v in cls.items() if k != 'share'})
+
+
+def spawn_into(segment_id, destination=None):
+    global next_car_id
     if segment_id not in segments:
         return None
     car = Car()
-    # set car parameters defaults (caller can override)
-    car.length = CAR_LENGTH
-    car.v0 = 33.3
-    car.a_max = 3.0
-    car.b_max = 4.0
-    car.T = 1.8
-    car.s0 = 3.0
-    segments[segment_id].add_car(car, 0)
+    # scenario parameters, overridden per vehicle class (caller can override)
+    params = car_params
+    if vehicle_classes:
+        car.vclass = pick_vehicle_class()
+        params = class_params(car.vclass)
+    car.length = params['length']
+    car.v0 = params['v0']
+    car.a_max = params['a_max']
+    car.b_max = params['b_max']
+    car.T = params['T']
+    car.s0 = params['s0']
+    car.model = params.get('model', models.DEFAULT)
+    if car_models:
+        car.model_params = models.resolve(car.model, params)
+    car.id = next_car_id
+    next_car_id += 1
+    car.spawn_time = sim_time
+    car.seg_entry_time = sim_time
+    if destination is not None and route_table is not None:
+        route = route_table.route(segment_id, destination)
+        if route is not None:
+            car.destination = destination
+            car.route = route
+            car.route_idx = 0
+    if emissions is not None:
+        emissions.add_car(car, params.get('emissions'))
+    seg = segments[segment_id]
+    seg.add_car(car, 0)
+    if seg.meso:
+        meso.schedule(seg, car, sim_time)
     return car
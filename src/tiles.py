@@ -0,0 +1,380 @@
+import math
+from collections import OrderedDict
+from itertools import compress
+
+import numpy as np
+import pygame
+
+import heatmap
+
+# Level-of-detail drawing for zoomed-out views of large networks.
+#
+# TileCache: the static road network is pre-rendered into TILE_SIZE px tiles
+# at power-of-two zoom levels (the level is the next power of two at or above
+# the current zoom, so tiles are only ever scaled down). Tiles are rendered
+# on demand, at most RENDER_PER_FRAME per frame, and kept in an LRU
+# (OrderedDict) of MAX_TILES. Scaled copies for the current zoom are kept
+# until the zoom changes. A frame costs one blit per visible tile, whatever
+# the size of the network.
+#
+# Segments are found per tile through SegmentGrid, a uniform grid over
+# segment bounding boxes. The network editor reports changed segments
+# through invalidate(), which drops only the tiles they cross.
+#
+# CongestionGrid: coarse mean speed / speed limit of the cars per grid cell
+# over the whole network, recomputed every CONGESTION_EVERY seconds. It is
+# drawn over the tiles (in place of the per-segment heatmap) and on the
+# minimap. The cars of a segment count evenly along it (sample points about
+# half a cell apart, laid out once), and their speeds come from seg.car_v,
+# so an update costs a few numpy calls plus one short step per segment,
+# however many cars there are.
+#
+# Minimap: the whole network drawn once into a small surface, with the
+# congestion grid on top and the current viewport as a rectangle; clicking
+# it recentres the view.
+
+TILE_SIZE = 256         # px
+MAX_TILES = 160         # LRU capacity (~40 MB of 256x256 tiles)
+RENDER_PER_FRAME = 8    # new tiles rendered per frame; the rest follow on later frames
+GRID_CELL = 512.0       # world units per SegmentGrid cell
+CONGESTION_CELLS = 64   # cells along the longer side of the network
+CONGESTION_EVERY = 1.0  # s between congestion grid updates
+CONGESTION_ALPHA = 190
+MINIMAP_SIZE = 180      # px
+ROAD_COLOR = (80, 80, 80)
+BACKGROUND = (30, 30, 30)
+
+
+class SegmentGrid:
+    """Uniform grid of segment bounding boxes for rectangle queries."""
+
+    def __init__(self, segments, cell=GRID_CELL, pad=0.0):
+        self.cell = cell
+        self.pad = pad
+        self.cells = {}
+        self.boxes = {}   # segment id -> bbox it was inserted with
+        for seg in segments.values():
+            self.insert(seg)
+
+    def _bbox(self, seg):
+        p = self.pad
+        return (min(seg.start[0], seg.end[0]) - p, min(seg.start[1], seg.end[1]) - p,
+                max(seg.start[0], seg.end[0]) + p, max(seg.start[1], seg.end[1]) + p)
+
+    def _cell_range(self, box):
+        c = self.cell
+        return (range(int(math.floor(box[0] / c)), int(math.floor(box[2] / c)) + 1),
+                range(int(math.floor(box[1] / c)), int(math.floor(box[3] / c)) + 1))
+
+    def insert(self, seg):
+        box = self._bbox(seg)
+        self.boxes[seg.id] = box
+        xs, ys = self._cell_range(box)
+        for cx in xs:
+            for cy in ys:
+                self.cells.setdefault((cx, cy), set()).add(seg.id)
+
+    def remove(self, sid):
+        box = self.boxes.pop(sid, None)
+        if box is None:
+            return None
+        xs, ys = self._cell_range(box)
+        for cx in xs:
+            for cy in ys:
+                ids = self.cells.get((cx, cy))
+                if ids is not None:
+                    ids.discard(sid)
+                    if not ids:
+                        del self.cells[(cx, cy)]
+        return box
+
+    def query(self, box):
+        """Ids of segments whose (padded) bounding box overlaps `box`."""
+        found = set()
+        xs, ys = self._cell_range(box)
+        for cx in xs:
+            for cy in ys:
+                for sid in self.cells.get((cx, cy), ()):
+                    b = self.boxes[sid]
+                    if b[0] <= box[2] and b[2] >= box[0] and b[1] <= box[3] and b[3] >= box[1]:
+                        found.add(sid)
+        return found
+
+
+class TileCache:
+    def __init__(self, road_width, tile_size=TILE_SIZE, max_tiles=MAX_TILES):
+        self.road_width = road_width
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.tiles = OrderedDict()   # (level, tx, ty) -> Surface or None (empty)
+        self.scaled = {}             # (level, tx, ty) -> Surface scaled for self._scaled_zoom
+        self._scaled_zoom = None
+        self.grid = None
+        self._segments = None
+        self.rendered = 0
+
+    def _sync(self, segments):
+        if segments is not self._segments or self.grid is None or len(self.grid.boxes) != len(segments):
+            self.grid = SegmentGrid(segments, pad=self.road_width / 2.0)
+            self._segments = segments
+            self.tiles.clear()
+            self.scaled.clear()
+
+    def invalidate(self, segments, changed):
+        """Drop tiles crossed by the old or new geometry of the `changed` segment ids."""
+        if segments is not self._segments or self.grid is None:
+            self._sync(segments)
+            return
+        boxes = []
+        for sid in changed:
+            old = self.grid.remove(sid)
+            if old is not None:
+                boxes.append(old)
+            seg = segments.get(sid)
+            if seg is not None:
+                self.grid.insert(seg)
+                boxes.append(self.grid.boxes[sid])
+        if not boxes:
+            return
+        ts = self.tile_size
+        for key in list(self.tiles):
+            level, tx, ty = key
+            scale = 2.0 ** level
+            tile_box = (tx * ts / scale, ty * ts / scale, (tx + 1) * ts / scale, (ty + 1) * ts / scale)
+            if any(b[0] <= tile_box[2] and b[2] >= tile_box[0] and b[1] <= tile_box[3] and b[3] >= tile_box[1]
+                   for b in boxes):
+                del self.tiles[key]
+                self.scaled.pop(key, None)
+
+    def _render(self, segments, level, tx, ty):
+        ts = self.tile_size
+        scale = 2.0 ** level
+        x0 = tx * ts / scale
+        y0 = ty * ts / scale
+        ids = self.grid.query((x0, y0, x0 + ts / scale, y0 + ts / scale))
+        if not ids:
+            return None
+        surf = pygame.Surface((ts, ts))
+        surf.fill(BACKGROUND)
+
+        def to_tile(pt):
+            return (int((pt[0] - x0) * scale), int((pt[1] - y0) * scale))
+
+        for sid in ids:
+            segments[sid].draw_road(surf, to_tile, scale, road_color=ROAD_COLOR, road_width=self.road_width)
+        self.rendered += 1
+        return surf
+
+    def _tile(self, segments, key, budget):
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+            return self.tiles[key], budget
+        if budget <= 0:
+            return None, budget
+        surf = self._render(segments, *key)
+        self.tiles[key] = surf
+        while len(self.tiles) > self.max_tiles:
+            old, _ = self.tiles.popitem(last=False)
+            self.scaled.pop(old, None)
+        return surf, budget - 1
+
+    def draw(self, surface, segments, zoom, pan_x, pan_y):
+        """Blit the visible tiles of the road network for this view."""
+        self._sync(segments)
+        W, H = surface.get_size()
+        ts = self.tile_size
+        level = math.ceil(math.log2(zoom))
+        scale = 2.0 ** level
+        tile_px = ts * zoom / scale        # on-screen size of one tile
+        if zoom != self._scaled_zoom:
+            self.scaled.clear()
+            self._scaled_zoom = zoom
+        tx0 = int(math.floor(-pan_x / tile_px))
+        ty0 = int(math.floor(-pan_y / tile_px))
+        tx1 = int(math.floor((W - pan_x) / tile_px))
+        ty1 = int(math.floor((H - pan_y) / tile_px))
+        budget = RENDER_PER_FRAME
+        for tx in range(tx0, tx1 + 1):
+            sx0 = int(round(tx * tile_px + pan_x))
+            sx1 = int(round((tx + 1) * tile_px + pan_x))
+            for ty in range(ty0, ty1 + 1):
+                key = (level, tx, ty)
+                surf, budget = self._tile(segments, key, budget)
+                if surf is None:
+                    continue
+                sy0 = int(round(ty * tile_px + pan_y))
+                sy1 = int(round((ty + 1) * tile_px + pan_y))
+                scaled = self.scaled.get(key)
+                if scaled is None or scaled.get_size() != (sx1 - sx0, sy1 - sy0):
+                    scaled = pygame.transform.smoothscale(surf, (sx1 - sx0, sy1 - sy0))
+                    self.scaled[key] = scaled
+                surface.blit(scaled, (sx0, sy0))
+
+
+class CongestionGrid:
+    """Mean speed ratio of the cars per cell over the network's bounding box."""
+
+    def __init__(self, cells=CONGESTION_CELLS):
+        self.cells = cells
+        self.bounds = None
+        self.nx = self.ny = 1
+        self.cell = 1.0
+        self.image = None
+        self._pixels = None
+        self._scaled = None   # (view key, scaled image) reused until the view or the grid changes
+        self._samples = None  # _layout() of the segments, until the bounds or the segments change
+        self._last = -1e9
+
+    def set_bounds(self, bounds):
+        self.bounds = bounds
+        self._samples = None
+        if bounds is None:
+            return
+        span = max(bounds[2] - bounds[0], bounds[3] - bounds[1], 1.0)
+        self.cell = span / self.cells
+        self.nx = max(1, int(math.ceil((bounds[2] - bounds[0]) / self.cell)))
+        self.ny = max(1, int(math.ceil((bounds[3] - bounds[1]) / self.cell)))
+        self._last = -1e9
+
+    def _layout(self, segments):
+        """Sample points along every segment, about two per cell: (segments, segment list, speed
+        limits, segment of each sample, cell of each sample, samples on the segment of each sample)."""
+        segs = list(segments.values())
+        start = np.array([seg.start for seg in segs], np.float64).reshape(-1, 2)
+        delta = np.array([seg.end for seg in segs], np.float64).reshape(-1, 2) - start
+        steps = np.maximum(1, (np.hypot(delta[:, 0], delta[:, 1]) * 2 / self.cell).astype(np.int64))
+        seg_of = np.repeat(np.arange(len(segs)), steps)
+        first = np.cumsum(steps) - steps
+        t = (np.arange(len(seg_of)) - first[seg_of] + 0.5) / steps[seg_of]
+        pts = start[seg_of] + delta[seg_of] * t[:, None]
+        cx = np.clip(((pts[:, 0] - self.bounds[0]) / self.cell).astype(np.int64), 0, self.nx - 1)
+        cy = np.clip(((pts[:, 1] - self.bounds[1]) / self.cell).astype(np.int64), 0, self.ny - 1)
+        limits = np.maximum(0.1, np.array([seg.speed_limit for seg in segs], np.float64))
+        return segments, segs, limits, seg_of, cy * self.nx + cx, steps[seg_of]
+
+    def update(self, segments, now):
+        """Recompute the cell colours (at most every CONGESTION_EVERY seconds)."""
+        if self.bounds is None or now - self._last < CONGESTION_EVERY:
+            return
+        self._last = now
+        if self._samples is None or self._samples[0] is not segments or len(self._samples[1]) != len(segments):
+            self._samples = self._layout(segments)
+        _, segs, limits, seg_of, cell_of, per_seg = self._samples
+        n = self.nx * self.ny
+        rgb = np.zeros((n, 3), np.uint8)   # black = no cars (colour key)
+        seg_counts = [len(seg.cars) for seg in segs]
+        seg_cars = np.array(seg_counts, np.float64)
+        idx = np.flatnonzero(seg_cars)
+        if len(idx):
+            # speeds from the last segment update, or from the cars where those are stale
+            v = np.concatenate([seg.car_v if not seg.meso and len(seg.car_v) == len(seg.cars) else
+                                np.fromiter((c.v for c in seg.cars), np.float64, len(seg.cars))
+                                for seg in compress(segs, seg_counts)])
+            counts = seg_cars[idx].astype(np.int64)
+            ratio = np.minimum(1.0, v / np.repeat(limits[idx], counts))
+            seg_ratio = np.zeros(len(segs))
+            seg_ratio[idx] = np.add.reduceat(ratio, np.cumsum(counts) - counts)
+            # each segment's cars are spread evenly over its samples
+            count = np.bincount(cell_of, weights=seg_cars[seg_of] / per_seg, minlength=n)
+            total = np.bincount(cell_of, weights=seg_ratio[seg_of] / per_seg, minlength=n)
+            occupied = count > 0
+            level = np.clip((1.0 - total[occupied] / count[occupied]) * 255, 0, 255).astype(np.int32)
+            rgb[occupied] = np.asarray(heatmap.PALETTE, np.uint8)[level]
+        self._pixels = rgb.tobytes()  # frombuffer does not copy
+        self.image = pygame.image.frombuffer(self._pixels, (self.nx, self.ny), 'RGB')
+        self._scaled = None
+
+    def draw(self, surface, topleft, px_per_unit):
+        """Draw the grid with its corner at screen `topleft`, scaled to the view (visible cells only)."""
+        if self.image is None:
+            return
+        W, H = surface.get_size()
+        cell_px = self.cell * px_per_unit
+        cx0 = max(0, int(math.floor(-topleft[0] / cell_px)))
+        cy0 = max(0, int(math.floor(-topleft[1] / cell_px)))
+        cx1 = min(self.nx, int(math.ceil((W - topleft[0]) / cell_px)))
+        cy1 = min(self.ny, int(math.ceil((H - topleft[1]) / cell_px)))
+        if cx1 <= cx0 or cy1 <= cy0:
+            return
+        x0 = int(round(topleft[0] + cx0 * cell_px))
+        y0 = int(round(topleft[1] + cy0 * cell_px))
+        x1 = int(round(topleft[0] + cx1 * cell_px))
+        y1 = int(round(topleft[1] + cy1 * cell_px))
+        key = (cx0, cy0, cx1, cy1, x1 - x0, y1 - y0)
+        if self._scaled is None or self._scaled[0] != key:
+            part = self.image.subsurface((cx0, cy0, cx1 - cx0, cy1 - cy0))
+            scaled = pygame.transform.scale(part, (max(1, x1 - x0), max(1, y1 - y0)))
+            # colour key + surface alpha (RLE) blits much faster than per-pixel alpha
+            scaled.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+            scaled.set_alpha(CONGESTION_ALPHA, pygame.RLEACCEL)
+            self._scaled = (key, scaled)
+        surface.blit(self._scaled[1], (x0, y0))
+
+
+class Minimap:
+    def __init__(self, size=MINIMAP_SIZE, margin=10):
+        self.size = size
+        self.margin = margin
+        self.base = None
+        self.scale = 1.0
+        self.offset = (0.0, 0.0)
+        self.rect = pygame.Rect(0, 0, size, size)
+        self.congestion = CongestionGrid()
+        self._segments = None
+        self._count = -1
+
+    def rebuild(self, segments):
+        """Redraw the network into the minimap (after loading or editing)."""
+        self._segments = segments
+        self._count = len(segments)
+        xs = [p[0] for seg in segments.values() for p in (seg.start, seg.end)]
+        ys = [p[1] for seg in segments.values() for p in (seg.start, seg.end)]
+        self.base = pygame.Surface((self.size, self.size))
+        self.base.fill((15, 15, 15))
+        if not xs:
+            self.congestion.set_bounds(None)
+            return
+        bounds = (min(xs), min(ys), max(xs), max(ys))
+        inner = self.size - 8
+        self.scale = inner / max(bounds[2] - bounds[0], bounds[3] - bounds[1], 1.0)
+        self.offset = (4 + (inner - (bounds[2] - bounds[0]) * self.scale) / 2 - bounds[0] * self.scale,
+                       4 + (inner - (bounds[3] - bounds[1]) * self.scale) / 2 - bounds[1] * self.scale)
+        for seg in segments.values():
+            pygame.draw.line(self.base, (110, 110, 110), self.to_map(seg.start), self.to_map(seg.end), 1)
+        self.congestion.set_bounds(bounds)
+
+    def to_map(self, pt):
+        return (int(pt[0] * self.scale + self.offset[0]), int(pt[1] * self.scale + self.offset[1]))
+
+    def to_world(self, map_pt):
+        return ((map_pt[0] - self.offset[0]) / self.scale, (map_pt[1] - self.offset[1]) / self.scale)
+
+    def update(self, segments, now):
+        if segments is not self._segments or len(segments) != self._count or self.base is None:
+            self.rebuild(segments)
+        self.congestion.update(segments, now)
+
+    def draw(self, surface, screen_to_world):
+        W, H = surface.get_size()
+        self.rect = pygame.Rect(W - self.size - self.margin, H - self.size - self.margin, self.size, self.size)
+        if self.rect.left < 0 or self.rect.top < 0:
+            self.rect = pygame.Rect(0, 0, 0, 0)   # window too small: no minimap, nothing to click
+        if self.base is None or not self.rect.w:
+            return
+        surface.blit(self.base, self.rect.topleft)
+        bounds = self.congestion.bounds
+        if bounds is not None:
+            self.congestion.draw(surface.subsurface(self.rect), self.to_map((bounds[0], bounds[1])), self.scale)
+        # viewport
+        a = self.to_map(screen_to_world((0, 0)))
+        b = self.to_map(screen_to_world((W, H)))
+        view = pygame.Rect(a[0] + self.rect.x, a[1] + self.rect.y, b[0] - a[0], b[1] - a[1]).clip(self.rect)
+        if view.w > 0 and view.h > 0:
+            pygame.draw.rect(surface, (255, 255, 255), view, 1)
+        pygame.draw.rect(surface, (160, 160, 160), self.rect, 1)
+
+    def hit(self, screen_pt):
+        """World point under `screen_pt` if it is on the minimap, else None."""
+        if self.base is None or not self.rect.collidepoint(screen_pt):
+            return None
+        return self.to_world((screen_pt[0] - self.rect.x, screen_pt[1] - self.rect.y))
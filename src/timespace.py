@@ -0,0 +1,264 @@
+import math
+
+import numpy as np
+import pygame
+
+import heatmap
+import meso
+
+# Time-space (trajectory) diagram.
+#
+# TrajectoryRecorder samples every car every SAMPLE_EVERY seconds into a ring
+# per segment: fixed numpy arrays of tick, position, speed and car id that
+# are allocated once, when the segment first carries cars, and then only
+# overwritten (scalar stores, nothing is allocated per sample). A ring is
+# sized for WINDOW seconds of standing traffic (one car per SPACING meters),
+# 16 bytes per sample or about 0.8 MB per km of road that has carried cars.
+#
+# TimeSpacePanel plots a chain of segments (distance along the chain upward,
+# time to the right, colour = speed relative to the limit, like the speed
+# heatmap). It keeps its own surface: each frame the plot is scrolled left
+# by the elapsed time and only samples written since the last frame are
+# plotted, read straight from the rings through their write counters.
+# Shockwaves show up as bands of red sloping back against the trajectories.
+#
+# The selected car's trail on the map comes from the same rings: its samples
+# on its current segment, then on whichever predecessor segment holds its
+# samples from just before that, and so on back to the start of the window.
+
+WINDOW = 180.0       # s of history kept and shown
+SAMPLE_EVERY = 0.5   # s between trajectory samples
+SPACING = 7.5        # m of road per car when sizing a segment's ring (jam density)
+MIN_CAPACITY = 256
+PANEL_SIZE = (420, 260)
+MARGIN_LEFT = 44     # px for distance labels
+MARGIN_BOTTOM = 18   # px for the time axis
+BACKGROUND = (20, 20, 20)
+BOUNDARY = (70, 70, 70)
+SELECTED = (255, 255, 255)
+MAX_CHAIN_LENGTH = 5000.0  # m followed by default_chain
+
+
+class Ring:
+    """Fixed-size trajectory samples of one segment."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.tick = np.zeros(capacity, np.int32)
+        self.pos = np.zeros(capacity, np.float32)
+        self.v = np.zeros(capacity, np.float32)
+        self.car = np.full(capacity, -1, np.int32)
+        self.written = 0  # entries ever written; the next goes to written % capacity
+
+    def since(self, written):
+        """Slot indexes of the entries written after counter value `written`, oldest first."""
+        start = max(written, self.written - self.capacity)
+        return np.arange(start, self.written) % self.capacity
+
+    def valid(self):
+        return self.since(0)
+
+
+class TrajectoryRecorder:
+    def __init__(self, step, window=WINDOW, sample_every=SAMPLE_EVERY):
+        self.step = step
+        self.window = window
+        self.every = max(1, int(round(sample_every / step)))
+        self.rings = {}  # segment id -> Ring
+
+    def ring(self, seg):
+        r = self.rings.get(seg.id)
+        if r is None:
+            samples = int(math.ceil(self.window / (self.every * self.step)))
+            r = Ring(max(MIN_CAPACITY, int(math.ceil(seg.length / SPACING)) * samples))
+            self.rings[seg.id] = r
+        return r
+
+    def on_tick(self, segments, tick, now):
+        """Record every car's position and speed (every `every` ticks)."""
+        if tick % self.every:
+            return
+        for seg in segments.values():
+            if not seg.cars:
+                continue
+            if seg.meso:
+                meso.sync_positions(seg, now)
+            r = self.ring(seg)
+            ticks, pos, v, ids, cap = r.tick, r.pos, r.v, r.car, r.capacity
+            i = r.written
+            for car in seg.cars:
+                k = i % cap
+                ticks[k] = tick
+                pos[k] = car.pos
+                v[k] = car.v
+                ids[k] = car.id
+                i += 1
+            r.written = i
+
+    def forget(self, segments):
+        """Drop rings of segments that no longer exist (after network edits)."""
+        for sid in [sid for sid in self.rings if sid not in segments]:
+            del self.rings[sid]
+
+    def _visit(self, sid, car_id, before):
+        """(ticks, positions) of the car's latest contiguous run of samples on `sid` before tick `before`."""
+        r = self.rings.get(sid)
+        if r is None:
+            return None
+        idx = r.valid()
+        idx = idx[(r.car[idx] == car_id) & (r.tick[idx] < before)]
+        if not len(idx):
+            return None
+        ticks = r.tick[idx]
+        order = np.argsort(ticks)
+        ticks = ticks[order]
+        idx = idx[order]
+        # a loop can bring the car back to the same segment: keep only the last visit
+        gaps = np.nonzero(np.diff(ticks) > self.every)[0]
+        first = gaps[-1] + 1 if len(gaps) else 0
+        return ticks[first:], r.pos[idx[first:]]
+
+    def trail(self, car, segments, pred, now_tick):
+        """World points of the car's path over the window, oldest first."""
+        if car is None or car.segment is None:
+            return []
+        oldest = now_tick - int(self.window / self.step)
+        runs = []
+        sid = car.segment.id
+        visit = self._visit(sid, car.id, now_tick + 1)
+        while visit is not None and visit[0][0] >= oldest and len(runs) < 1000:
+            runs.append((sid, visit))
+            start = visit[0][0]
+            best = None
+            for p in pred.get(sid, ()):
+                v = self._visit(p, car.id, start)
+                if v is not None and (best is None or v[0][-1] > best[1][0][-1]):
+                    best = (p, v)
+            if best is None or start - best[1][0][-1] > 2 * self.every:
+                break
+            sid, visit = best
+        points = []
+        for sid, (_, pos) in reversed(runs):
+            seg = segments.get(sid)
+            if seg is None:
+                continue
+            sx, sy = seg.start
+            dx, dy = seg.dir
+            points += [(sx + dx * p, sy + dy * p) for p in pos.tolist()]
+        return points
+
+
+def default_chain(segments, start_id, route=None, max_length=MAX_CHAIN_LENGTH):
+    """Segment ids from `start_id` along `route` (Segments) or each segment's first output, without repeats."""
+    chain = []
+    length = 0.0
+    seg = segments.get(start_id)
+    route = list(route or ())
+    while seg is not None and seg.id not in chain and length < max_length:
+        chain.append(seg.id)
+        length += seg.length
+        if route and route[0] is seg:
+            route.pop(0)
+        nxt = route[0] if route else (seg.outputs[0] if seg.outputs else None)
+        seg = segments.get(nxt.id) if nxt is not None else None
+    return chain
+
+
+class TimeSpacePanel:
+    def __init__(self, recorder, segments, chain, size=PANEL_SIZE, font=None):
+        self.recorder = recorder
+        self.size = size
+        self.font = font
+        self.surface = pygame.Surface(size)
+        w, h = size
+        self.plot = self.surface.subsurface((MARGIN_LEFT, 0, w - MARGIN_LEFT, h - MARGIN_BOTTOM))
+        self.plot_w, self.plot_h = self.plot.get_size()
+        self.px_per_s = self.plot_w / recorder.window
+        self.palette = np.array([self.plot.map_rgb(c) for c in heatmap.PALETTE], np.uint32)
+        self.selected_color = self.plot.map_rgb(SELECTED)
+        self.set_chain(segments, chain)
+
+    def set_chain(self, segments, chain):
+        self.chain = [sid for sid in chain if sid in segments]
+        self.offsets = {}
+        total = 0.0
+        for sid in self.chain:
+            self.offsets[sid] = total
+            total += segments[sid].length
+        self.total = max(1.0, total)
+        self.edge = None  # time column at the right edge; None = full redraw on the next update
+        self.selected_id = None
+
+    def _y(self, dist):
+        return (self.plot_h - 1) - dist / self.total * (self.plot_h - 1)
+
+    def _boundaries(self, x0, x1):
+        for off in self.offsets.values():
+            y = int(self._y(off))
+            pygame.draw.line(self.plot, BOUNDARY, (x0, y), (x1, y))
+
+    def _redraw(self, segments, now, selected_id):
+        self.surface.fill(BACKGROUND)
+        self._boundaries(0, self.plot_w - 1)
+        if self.font is not None:
+            h = self.plot_h
+            for sid in self.chain:
+                y = int(self._y(self.offsets[sid]))
+                self.surface.blit(self.font.render(f'{self.offsets[sid]:.0f}', True, (160, 160, 160)), (2, y - 12))
+            self.surface.blit(self.font.render(f'-{self.recorder.window:.0f} s', True, (160, 160, 160)),
+                              (MARGIN_LEFT, h + 2))
+            label = self.font.render('now', True, (160, 160, 160))
+            self.surface.blit(label, (self.size[0] - label.get_width() - 2, h + 2))
+        self.read = {}
+        self.selected_id = selected_id
+        self.edge = self._column(now)
+        for sid in self.chain:
+            r = self.recorder.rings.get(sid)
+            if r is not None:
+                self._plot(segments[sid], r, r.valid(), selected_id)
+                self.read[sid] = r.written
+
+    def _column(self, t):
+        """Absolute pixel column of time `t`, so samples land in the same column however they are drawn."""
+        return np.floor(np.asarray(t) * self.px_per_s).astype(np.int64)
+
+    def _plot(self, seg, r, idx, selected_id):
+        if not len(idx):
+            return
+        x = self.plot_w - 1 - (self.edge - self._column(r.tick[idx] * self.recorder.step))
+        y = self._y(self.offsets[seg.id] + np.clip(r.pos[idx], 0.0, seg.length)).astype(np.int32)
+        keep = (x >= 0) & (x < self.plot_w)
+        ratio = np.clip(r.v[idx] / max(0.1, seg.speed_limit), 0.0, 1.0)
+        colors = self.palette[((1.0 - ratio) * 255).astype(np.int32)]
+        if selected_id is not None:
+            colors = np.where(r.car[idx] == selected_id, self.selected_color, colors)
+        px = pygame.surfarray.pixels2d(self.plot)
+        px[x[keep], y[keep]] = colors[keep]
+        del px
+
+    def update(self, segments, now, selected_id=None):
+        """Scroll by the time since the last update and plot only the new samples."""
+        edge = int(self._column(now))
+        if self.edge is None or not 0 <= edge - self.edge < self.plot_w or selected_id != self.selected_id:
+            self._redraw(segments, now, selected_id)
+            return
+        shift = edge - self.edge
+        if shift:
+            self.plot.scroll(-shift, 0)
+            self.plot.fill(BACKGROUND, (self.plot_w - shift, 0, shift, self.plot_h))
+            self._boundaries(self.plot_w - shift, self.plot_w - 1)
+        self.edge = edge
+        for sid in self.chain:
+            r = self.recorder.rings.get(sid)
+            if r is None or r.written == self.read.get(sid, 0):
+                continue
+            self._plot(segments[sid], r, r.since(self.read.get(sid, 0)), selected_id)
+            self.read[sid] = r.written
+
+    def draw(self, surface, topleft):
+        surface.blit(self.surface, topleft)
+        pygame.draw.rect(surface, BOUNDARY, (topleft, self.size), 1)
+        if self.font is not None and self.chain:
+            title = ' > '.join(self.chain) if len(self.chain) <= 4 else f'{self.chain[0]} > ... > {self.chain[-1]}'
+            surface.blit(self.font.render(f'Time-space: {title}', True, (200, 200, 200)),
+                         (topleft[0], topleft[1] - 16))
@@ -0,0 +1,24 @@
+import json
+
+import autosave
+import sim
+
+
+def test_saved_state_is_plain_and_keeps_the_view(tmp_path):
+    segs = [{'id': 'a', 'start': [0, 0], 'end': [100, 0], 'speed_limit': 13.9},
+            {'id': 'b', 'start': [100, 0], 'end': [200, 0], 'speed_limit': 13.9}]
+    config = {'current_state': {'segments': segs, 'junctions': [{'id': 'ab', 'inputs': ['a'], 'outputs': ['b']}],
+                                'seed': 1, 'spawn_rate': 0, 'view': {'zoom': 1.0}}}
+    sim.reset_clock()
+    sim.build_from_config(config)
+    path = tmp_path / 'config.json'
+    saver = autosave.AutoSaver(config, path=str(path))
+    state = config['current_state']
+    saver.request()
+    state['view']['zoom'] = 2.0   # the main thread keeps going while the worker writes
+    assert saver.flush(timeout=10)
+    assert saver.saves == 1
+    assert config['current_state'] is state and state['view']['zoom'] == 2.0
+    assert type(state['segments']) is list and type(state['junctions']) is list
+    assert state['junctions'] == [{'id': 'ab', 'inputs': ['a'], 'outputs': ['b'], 'mode': 'priority'}]
+    assert json.loads(path.read_text())['current_state']['view']['zoom'] == 1.0
@@ -0,0 +1,43 @@
+import json
+import socket
+
+import pytest
+
+import control
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = str(tmp_path / 'control.sock')
+    server = control.ControlServer(path=path)
+    server.start()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(5.0)
+    sock.connect(path)
+    lines = sock.makefile('r')
+
+    def request(msg):
+        sock.sendall((json.dumps(msg) + '\n').encode('utf-8'))
+        return json.loads(lines.readline())
+
+    yield request
+    sock.close()
+    server.stop()
+
+
+@pytest.mark.parametrize('msg', [
+    {'id': 1, 'cmd': 'subscribe', 'every': 'x'},
+    {'id': 1, 'cmd': 'subscribe', 'topics': 3},
+    {'id': 1, 'cmd': 'subscribe', 'topics': [['segments']]},
+    {'id': 1, 'cmd': 'unsubscribe', 'topics': None},
+    {'id': 1, 'cmd': 'unsubscribe', 'topics': [{}]},
+], ids=['every', 'topics-int', 'topic-list', 'unsubscribe-none', 'unsubscribe-dict'])
+def test_bad_subscription_gets_an_error_and_keeps_the_client(client, msg):
+    reply = client(msg)
+    assert reply['id'] == 1 and not reply['ok'] and 'bad request' in reply['error']
+    assert client({'id': 2, 'cmd': 'stats'}) == {'id': 2, 'ok': True, 'result': {'dropped': 0}}
+
+
+def test_subscribe_and_unsubscribe(client):
+    assert client({'id': 1, 'cmd': 'subscribe', 'topics': ['timing'], 'every': '5'})['result'] == {'timing': 5}
+    assert client({'id': 2, 'cmd': 'unsubscribe'})['result'] == {}
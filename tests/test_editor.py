@@ -0,0 +1,47 @@
+import pytest
+
+import editor
+import sim
+
+
+def signal_config():
+    segs = [{'id': 'a', 'start': [0, 0], 'end': [200, 0], 'speed_limit': 13.9},
+            {'id': 'b', 'start': [200, 0], 'end': [400, 0], 'speed_limit': 13.9},
+            {'id': 'c', 'start': [0, 50], 'end': [200, 50], 'speed_limit': 13.9},
+            {'id': 'd', 'start': [200, 50], 'end': [400, 50], 'speed_limit': 13.9}]
+    signal = {'plans': [{'phases': [{'green': ['a'], 'duration': 20, 'amber': 3}]}]}
+    juncs = [{'id': 'ab', 'inputs': ['a'], 'outputs': ['b'], 'signal': signal},
+             {'id': 'cd', 'inputs': ['c'], 'outputs': ['d']}]
+    return {'current_state': {'segments': segs, 'junctions': juncs, 'seed': 1, 'spawn_rate': 0}}
+
+
+def wiring():
+    return {j.id: ([s.id for s in j.inputs], [s.id for s in j.outputs]) for j in sim.junctions}
+
+
+def test_rewire_that_orphans_a_signal_changes_nothing():
+    sim.reset_clock()
+    sim.build_from_config(signal_config())
+    ed = editor.Editor()
+    before = wiring()
+    # 'c' would be taken from cd before the signalised junction is found to lose its outputs
+    with pytest.raises(ValueError):
+        ed.apply(editor.Rewire('ab', ['a', 'c'], []))
+    assert wiring() == before
+    assert sim.segments['c'].outputs == [sim.segments['d']]
+    assert not ed.undo_stack
+
+
+def test_split_does_not_edit_the_config_plans():
+    config = signal_config()
+    sim.reset_clock()
+    sim.build_from_config(config)
+    ed = editor.Editor()
+    ed.split_segment('a', (100, 0))
+    new_id = ed.undo_stack[-1].new_id
+    signal = editor.find_junction('ab').signal
+    assert signal.plans[0]['phases'][0]['green'] == [new_id]
+    assert signal.config['plans'][0]['phases'][0]['green'] == [new_id]
+    assert config['current_state']['junctions'][0]['signal']['plans'][0]['phases'][0]['green'] == ['a']
+    ed.undo()
+    assert editor.find_junction('ab').signal.plans[0]['phases'][0]['green'] == ['a']
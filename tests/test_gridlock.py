@@ -0,0 +1,112 @@
+import csv
+
+import gridlock
+import sim
+
+LINK = 100.0
+
+
+def ring_config(tmp_path, resolve, feeder=False, n_segments=4):
+    segs = [{'id': f's{i}', 'start': [i * LINK, 0], 'end': [(i + 1) * LINK, 0], 'speed_limit': 13.9}
+            for i in range(n_segments)]
+    juncs = [{'id': f'j{i}', 'inputs': [f's{i}'], 'outputs': [f's{(i + 1) % n_segments}']}
+             for i in range(n_segments)]
+    state = {'segments': segs, 'junctions': juncs, 'seed': 1, 'spawn_rate': 0,
+             'gridlock': {'enabled': True, 'path': str(tmp_path / 'gridlock.csv'), 'resolve': resolve}}
+    if feeder:
+        # a long entry into s0 with OD demand, upstream of the ring
+        segs.append({'id': 'in', 'start': [-1000, 100], 'end': [0, 0], 'speed_limit': 13.9})
+        juncs[-1]['inputs'].append('in')
+        state['demand'] = [{'origin': 'in', 'destination': 's2', 'rate': 0.2}]
+    return {'current_state': state}
+
+
+def saturate():
+    """13 cars per 100 m segment: more than the junctions let through, so the ring locks up."""
+    for seg in [s for s in sim.segments.values() if s.id != 'in']:
+        for k in range(13):
+            car = sim.spawn_into(seg.id)
+            car.pos = LINK - 1 - k * LINK / 13
+            car.v = 8.0
+
+
+def run(seconds):
+    for _ in range(int(round(seconds / sim.STEP))):
+        sim.step()
+
+
+def build(tmp_path, resolve, feeder=False):
+    sim.reset_clock()
+    sim.build_from_config(ring_config(tmp_path, resolve, feeder))
+    saturate()
+    return sim.gridlock
+
+
+def rows(tmp_path):
+    sim.gridlock.close()
+    with open(tmp_path / 'gridlock.csv', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def test_ring_is_confirmed_after_confirm_seconds(tmp_path):
+    monitor = build(tmp_path, 'none')
+    run(60.0)
+    (lock,) = monitor.active()
+    assert {s.id for s in lock.segments} == {'s0', 's1', 's2', 's3'}
+    assert lock.start - lock.found >= gridlock.CONFIRM
+    assert lock.cars == 52 and monitor.reported == 1
+    start, end = rows(tmp_path)   # closing the monitor ends the active gridlock
+    assert (start['event'], end['event']) == ('start', 'end')
+    assert sorted(start['segments'].split()) == ['s0', 's1', 's2', 's3']
+
+
+def test_blocked_segments_sleep_and_wake_when_the_output_moves_on(tmp_path):
+    monitor = build(tmp_path, 'none')
+    run(60.0)
+    segs = [sim.segments[f's{i}'] for i in range(4)]
+    assert all(s.asleep for s in segs)
+    assert all(c.v == 0.0 for s in segs for c in s.cars)
+    positions = [c.pos for s in segs for c in s.cars]
+    run(5.0)
+    assert [c.pos for s in segs for c in s.cars] == positions   # asleep: not updated at all
+
+    # the front car leaves s1 (as in a teleport): its count changes and it wakes; s0 sleeps on
+    s1 = segs[1]
+    s1.remove_car(max(s1.cars, key=lambda c: c.pos))
+    monitor.clear(s1)
+    sim.step()
+    assert not s1.asleep and segs[0].asleep
+    # until the rear of s1 has moved on by WAKE_MOVE
+    rear = min(c.pos - c.length for c in s1.cars)
+    for _ in range(1000):
+        sim.step()
+        if not segs[0].asleep:
+            break
+    assert not segs[0].asleep
+    assert min(c.pos - c.length for c in s1.cars) > rear + gridlock.WAKE_MOVE
+    assert segs[2].asleep
+    monitor.close()
+
+
+def test_teleport_ends_the_gridlock(tmp_path):
+    monitor = build(tmp_path, 'teleport')
+    run(60.0)
+    # no room outside the ring: the front car is taken out, which frees the cycle
+    assert monitor.removed >= 1 and monitor.teleported == 0
+    assert not monitor.active()
+    assert sum(len(s.cars) for s in sim.segments.values()) < 52
+    events = [r['event'] for r in rows(tmp_path)]
+    assert events[:2] == ['start', 'end']
+
+
+def test_hold_stops_demand_upstream_of_the_gridlock(tmp_path):
+    monitor = build(tmp_path, 'hold', feeder=True)
+    run(60.0)
+    assert monitor.active()
+    assert monitor.holds(sim.segments['in']) and monitor.holds(sim.segments['s0'])
+    spawned = sim.next_car_id
+    backlog = sim.demand[0]['backlog']
+    run(20.0)
+    assert sim.next_car_id == spawned   # 'in' has room, but spawns into it are held
+    assert sim.demand[0]['backlog'] >= backlog + 3
+    monitor.close()
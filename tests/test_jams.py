@@ -0,0 +1,31 @@
+import sim
+
+LINK = 100.0
+
+
+def ring_config(n_segments):
+    segs, juncs = [], []
+    for i in range(n_segments):
+        segs.append({'id': f's{i}', 'start': [i * LINK, 0], 'end': [(i + 1) * LINK, 0], 'speed_limit': 13.9})
+        juncs.append({'id': f'j{i}', 'inputs': [f's{i}'], 'outputs': [f's{(i + 1) % n_segments}'], 'mode': 'priority'})
+    return {'current_state': {'segments': segs, 'junctions': juncs, 'seed': 1, 'spawn_rate': 0,
+                              'jams': {'enabled': True, 'path': None}}}
+
+
+def test_queue_around_a_saturated_ring():
+    sim.reset_clock()
+    sim.build_from_config(ring_config(6))
+    for seg in sim.segments.values():
+        for k in range(13):
+            car = sim.spawn_into(seg.id)
+            car.pos = LINK - 1 - k * LINK / 13
+            car.v = 8.0
+    for _ in range(800):
+        sim.step()
+    shown = sim.jam_detector.shown()
+    assert len(shown) == 1
+    jam = shown[0]
+    assert jam.segments == set(sim.segments)
+    assert jam.tail is not None and jam.tail_speed is None and jam.head_speed is None
+    sim.jam_detector.close()
+    sim.jam_detector = None
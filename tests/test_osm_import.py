@@ -0,0 +1,127 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+import osm_import
+
+# node id -> (lat, lon), 7 decimals like OSM; lon crosses 0 so deltas and zigzag change sign
+NODES = {1000005: (51.5010000, -0.0020000), 1000001: (51.5000000, -0.0020000), 1000003: (51.5000000, 0.0010000),
+         1000002: (51.5000000, -0.0005000), 1000004: (51.5010000, 0.0010000), 1000009: (51.5020000, 0.0030000)}
+PLAIN_NODE = 1000009   # stored as a plain Node message, the others as DenseNodes
+WAYS = [
+    (17, [1000001, 1000002, 1000003], {'highway': 'residential', 'name': 'A'}),
+    (12, [1000003, 1000004, 1000005], {'highway': 'primary', 'oneway': 'yes', 'maxspeed': '30 mph'}),
+    (15, [1000005, 1000001], {'highway': 'service', 'service': 'driveway'}),   # skipped
+    (16, [1000004, 1000009, 1000005, 1000004], {'building': 'yes'}),            # skipped
+    (20, [1000004, 1000009], {'highway': 'tertiary', 'junction': 'roundabout'}),
+]
+
+
+# --- a minimal protobuf / PBF writer ---
+
+def varint(v):
+    out = bytearray()
+    while True:
+        b = v & 0x7f
+        v >>= 7
+        if v:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def zigzag(v):
+    return (v << 1) ^ (v >> 63)
+
+
+def field(number, value):
+    if isinstance(value, int):
+        return varint(number << 3) + varint(value)
+    return varint(number << 3 | 2) + varint(len(value)) + value
+
+
+def packed(values, signed=False, delta=False):
+    prev, out = 0, b''
+    for v in values:
+        d = v - prev if delta else v
+        prev = v
+        out += varint(zigzag(d) if signed else d)
+    return out
+
+
+def fileblock(kind, payload):
+    blob = field(2, len(payload)) + field(3, zlib.compress(payload))
+    header = field(1, kind.encode()) + field(3, len(blob))
+    return struct.pack('>I', len(header)) + header + blob
+
+
+def write_pbf(path):
+    strings = ['']
+    for _, _, tags in WAYS:
+        for s in [s for kv in tags.items() for s in kv]:
+            if s not in strings:
+                strings.append(s)
+    table = field(1, b''.join(field(1, s.encode()) for s in strings))
+
+    def coord(deg):
+        return round(deg * 1e7)   # nanodegrees / granularity 100
+
+    dense_ids = [i for i in NODES if i != PLAIN_NODE]
+    dense = (field(1, packed(dense_ids, signed=True, delta=True))
+             + field(8, packed([coord(NODES[i][0]) for i in dense_ids], signed=True, delta=True))
+             + field(9, packed([coord(NODES[i][1]) for i in dense_ids], signed=True, delta=True)))
+    lat, lon = NODES[PLAIN_NODE]
+    plain = field(1, zigzag(PLAIN_NODE)) + field(8, zigzag(coord(lat))) + field(9, zigzag(coord(lon)))
+    nodes_block = table + field(2, field(1, plain) + field(2, dense))
+
+    group = b''
+    for wid, refs, tags in WAYS:
+        group += field(3, field(1, wid)
+                       + field(2, packed([strings.index(k) for k in tags]))
+                       + field(3, packed([strings.index(v) for v in tags.values()]))
+                       + field(8, packed(refs, signed=True, delta=True)))
+    ways_block = table + field(2, group)
+
+    header = field(4, b'OsmSchema-V0.6') + field(4, b'DenseNodes')
+    with open(path, 'wb') as f:
+        f.write(fileblock('OSMHeader', header))
+        f.write(fileblock('OSMData', nodes_block))
+        f.write(fileblock('OSMData', ways_block))
+
+
+def write_xml(path):
+    with open(path, 'w') as f:
+        f.write("<?xml version='1.0' encoding='UTF-8'?>\n<osm version='0.6'>\n")
+        for i, (lat, lon) in NODES.items():
+            f.write(f'  <node id="{i}" lat="{lat:.7f}" lon="{lon:.7f}"/>\n')
+        for wid, refs, tags in WAYS:
+            f.write(f'  <way id="{wid}">\n')
+            f.writelines(f'    <nd ref="{r}"/>\n' for r in refs)
+            f.writelines(f'    <tag k="{k}" v="{v}"/>\n' for k, v in tags.items())
+            f.write('  </way>\n')
+        f.write('</osm>\n')
+
+
+def test_pbf_reads_like_the_same_xml(tmp_path):
+    write_pbf(tmp_path / 'net.osm.pbf')
+    write_xml(tmp_path / 'net.osm')
+    pbf_ways, pbf_nodes = osm_import.read_network(str(tmp_path / 'net.osm.pbf'), jobs=1, log=lambda *a: None)
+    xml_ways, xml_nodes = osm_import.read_network(str(tmp_path / 'net.osm'), jobs=1, log=lambda *a: None)
+
+    assert [(w, list(refs), tags) for w, refs, tags in pbf_ways] == \
+        [(w, list(refs), tags) for w, refs, tags in xml_ways]
+    assert [w for w, _, _ in pbf_ways] == [17, 12, 20]
+    np.testing.assert_array_equal(pbf_nodes[0], xml_nodes[0])
+    np.testing.assert_allclose(pbf_nodes[1], xml_nodes[1], rtol=0, atol=1e-9)
+    np.testing.assert_allclose(pbf_nodes[2], xml_nodes[2], rtol=0, atol=1e-9)
+
+    pbf = osm_import.build_state(pbf_ways, pbf_nodes)
+    xml = osm_import.build_state(xml_ways, xml_nodes)
+    assert pbf['junctions'] == xml['junctions']
+    assert [s['id'] for s in pbf['segments']] == [s['id'] for s in xml['segments']]
+    for a, b in zip(pbf['segments'], xml['segments']):
+        assert a['speed_limit'] == b['speed_limit']
+        assert a['start'] == pytest.approx(b['start'], abs=0.11) and a['end'] == pytest.approx(b['end'], abs=0.11)
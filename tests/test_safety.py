@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import sim
+
+
+def chain_config(tmp_path):
+    segs = [{'id': 'a', 'start': [0, 0], 'end': [200, 0], 'speed_limit': 13.9},
+            {'id': 'b', 'start': [200, 0], 'end': [230, 0], 'speed_limit': 13.9},
+            {'id': 'c', 'start': [230, 0], 'end': [400, 0], 'speed_limit': 13.9}]
+    juncs = [{'id': 'ab', 'inputs': ['a'], 'outputs': ['b']}, {'id': 'bc', 'inputs': ['b'], 'outputs': ['c']}]
+    return {'current_state': {'segments': segs, 'junctions': juncs, 'seed': 1, 'spawn_rate': 0,
+                              'safety': {'enabled': True, 'path': str(tmp_path / 'safety.csv')}}}
+
+
+@pytest.fixture(params=[False, True], ids=['python', 'kernel'])
+def use_kernel(request):
+    sim.USE_KERNEL = request.param
+    yield request.param
+    sim.USE_KERNEL = True
+
+
+def test_downstream_closed_exit_is_not_a_conflict(tmp_path, use_kernel):
+    sim.reset_clock()
+    sim.build_from_config(chain_config(tmp_path))
+    sim.set_closed(sim.segments['c'], True)   # b's end becomes a stop line, seen from a through the lookahead
+    car = sim.spawn_into('a')
+    car.pos, car.v = 150.0, 13.0
+    for _ in range(200):
+        sim.step()
+    assert not sim.segments['a'].leader_real[0] or not sim.segments['a'].cars
+    assert sim.safety.ttc_ticks.sum() == 0 and sim.safety.drac_ticks.sum() == 0
+    sim.safety.close()
+    sim.safety = None
+
+
+def test_closing_pair_is_a_conflict(tmp_path, use_kernel):
+    sim.reset_clock()
+    sim.build_from_config(chain_config(tmp_path))
+    leader = sim.spawn_into('a')
+    leader.pos, leader.v = 60.0, 0.0
+    follower = sim.spawn_into('a')
+    follower.pos, follower.v = 40.0, 13.0
+    sim.step()
+    assert list(np.asarray(sim.segments['a'].leader_real, bool)) == [False, True]
+    assert sim.safety.ttc_ticks[sim.safety.index['a']] == 1
+    sim.safety.close()
+    sim.safety = None
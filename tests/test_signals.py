@@ -0,0 +1,34 @@
+import pytest
+
+import sim
+
+
+def signal_config(plan):
+    segs = [{'id': 'a', 'start': [0, 0], 'end': [200, 0], 'speed_limit': 13.9},
+            {'id': 'b', 'start': [200, 0], 'end': [400, 0], 'speed_limit': 13.9}]
+    juncs = [{'id': 'ab', 'inputs': ['a'], 'outputs': ['b'], 'signal': {'plans': [plan]}}]
+    return {'current_state': {'segments': segs, 'junctions': juncs, 'seed': 1, 'spawn_rate': 0}}
+
+
+@pytest.mark.parametrize('plan', [
+    {'phases': [{'green': ['a'], 'duration': 0, 'amber': 0}]},
+    {'phases': [{'green': ['a'], 'duration': 30, 'min_green': 0, 'max_green': 40}]},
+    {'phases': [{'green': ['a'], 'duration': 30, 'max_green': 40, 'extension': 0}]},
+    {'phases': [{'green': ['a'], 'duration': 30, 'amber': -1}]},
+    {'cycle': 0, 'phases': [{'green': ['a'], 'duration': 30}]},
+], ids=['zero-green', 'zero-min-green', 'zero-extension', 'negative-amber', 'zero-cycle'])
+def test_plans_that_never_advance_are_rejected(plan):
+    sim.reset_clock()
+    with pytest.raises(ValueError):
+        sim.build_from_config(signal_config(plan))
+
+
+def test_zero_amber_plan_cycles():
+    sim.reset_clock()
+    sim.build_from_config(signal_config({'phases': [{'green': ['a'], 'duration': 5, 'amber': 0},
+                                                    {'green': [], 'duration': 5, 'amber': 0}]}))
+    states = set()
+    for _ in range(int(20 / sim.STEP)):
+        sim.step()
+        states.add(sim.segments['a'].signal_state)
+    assert states == {'green', 'red'}
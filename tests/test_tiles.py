@@ -0,0 +1,40 @@
+import pygame
+
+import sim
+import tiles
+
+
+def test_minimap_skipped_in_a_small_window():
+    pygame.init()
+    sim.reset_clock()
+    sim.build_from_config({'current_state': {
+        'segments': [{'id': 'a', 'start': [0, 0], 'end': [100, 0], 'speed_limit': 13.9}],
+        'junctions': [], 'seed': 1, 'spawn_rate': 0}})
+    minimap = tiles.Minimap()
+    minimap.update(sim.segments, 0.0)
+    minimap.draw(pygame.Surface((100, 100)), lambda pt: pt)
+    assert minimap.hit((5, 5)) is None
+    minimap.draw(pygame.Surface((800, 600)), lambda pt: pt)
+    assert minimap.hit(minimap.rect.center) is not None
+
+
+def test_congestion_grid_colours_each_segment_by_its_mean_speed():
+    pygame.init()
+    sim.reset_clock()
+    sim.build_from_config({'current_state': {
+        'segments': [{'id': 'fast', 'start': [0, 0], 'end': [1000, 0], 'speed_limit': 10.0},
+                     {'id': 'slow', 'start': [0, 1000], 'end': [1000, 1000], 'speed_limit': 10.0},
+                     {'id': 'empty', 'start': [0, 500], 'end': [1000, 500], 'speed_limit': 10.0}],
+        'junctions': [], 'seed': 1, 'spawn_rate': 0}})
+    for sid, v in (('fast', 10.0), ('slow', 0.0)):
+        for pos in (100.0, 600.0):
+            car = sim.spawn_into(sid)
+            car.pos, car.v = pos, v
+    grid = tiles.CongestionGrid(cells=10)
+    grid.set_bounds((0, 0, 1000, 1000))
+    grid.update(sim.segments, 0.0)
+    rgb = [grid.image.get_at((x, y))[:3] for y in (0, 5, 9) for x in (0, 9)]
+    fast, empty, slow = rgb[0:2], rgb[2:4], rgb[4:6]
+    palette = [tuple(c) for c in tiles.heatmap.PALETTE]
+    assert fast == [palette[0]] * 2 and slow == [palette[255]] * 2
+    assert empty == [(0, 0, 0)] * 2